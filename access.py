@@ -0,0 +1,67 @@
+"""Course-level access checks for the current request.
+
+The IDs of the courses the current user belongs to (taught by a lecturer,
+enrolled in by a student) are read with one query the first time a request
+asks and kept on ``flask.g``, so every later check in the same request is a
+set lookup instead of another Enrollment query. Admins belong to every
+course and never query.
+"""
+from functools import wraps
+
+from flask import abort, flash, g, redirect, url_for
+from flask_login import current_user
+
+from app import db
+from models import Course, Enrollment
+
+
+def member_course_ids():
+    """The IDs of the current user's courses, or None for admins (every course)."""
+    if current_user.is_admin():
+        return None
+    cached = g.get('member_course_ids')
+    if cached is None or cached[0] != current_user.id:
+        if current_user.is_lecturer():
+            query = db.session.query(Course.id).filter(Course.lecturer_id == current_user.id)
+        else:
+            query = db.session.query(Enrollment.course_id).filter(Enrollment.user_id == current_user.id)
+        cached = g.member_course_ids = (current_user.id, frozenset(course_id for course_id, in query))
+    return cached[1]
+
+
+def forget_course_ids():
+    """Drop the memoized course IDs, after the current user's courses change."""
+    g.pop('member_course_ids', None)
+
+
+def is_course_member(course_id):
+    """Whether the current user may see the course: admin, its lecturer, or enrolled."""
+    course_ids = member_course_ids()
+    return course_ids is None or course_id in course_ids
+
+
+def can_manage_course(course_id):
+    """Whether the current user may grade and export the course: admin or its lecturer."""
+    return current_user.is_admin() or (current_user.is_lecturer() and is_course_member(course_id))
+
+
+def can_view_submission(submission):
+    return submission.student_id == current_user.id or can_manage_course(submission.assignment.course_id)
+
+
+def course_member_required(f):
+    """For views taking ``course_id``: send users who are not members back to
+    their courses, and answer 404 for a course that does not exist."""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not is_course_member(kwargs['course_id']):
+            # Members' courses exist; only an outsider's request might name a missing one
+            if db.session.query(Course.id).filter(Course.id == kwargs['course_id']).first() is None:
+                abort(404)
+            if current_user.is_student():
+                flash('You are not enrolled in this course.', 'danger')
+            else:
+                flash('You do not have access to this course.', 'danger')
+            return redirect(url_for('courses'))
+        return f(*args, **kwargs)
+    return decorated_function
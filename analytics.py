@@ -0,0 +1,338 @@
+import threading
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+
+from app import app, db
+from models import (User, Course, Assignment, Submission, Discussion, Post, Grade, LectureSessionLog,
+                    SignupRollup, CourseActivityRollup, ActiveUserRollup, RollupState)
+
+# A refresh recomputes whole days, starting this far before the high-water
+# mark, so rows committed by transactions that were in flight during the last
+# refresh are still picked up.
+REFRESH_OVERLAP = timedelta(hours=1)
+
+_refresh_lock = threading.Lock()
+
+
+def _day(column):
+    return db.func.date(column)
+
+
+def _window(column, start, end):
+    clauses = [column >= datetime.combine(start, time.min)]
+    if end is not None:
+        clauses.append(column < datetime.combine(end, time.min))
+    return db.and_(*clauses)
+
+
+def _signups(start, end):
+    day = _day(User.created_at)
+    return db.select(day, User.role, db.func.count(User.id)) \
+        .where(_window(User.created_at, start, end)) \
+        .group_by(day, User.role)
+
+
+def _course_activity(start, end):
+    submitted = _day(Submission.submitted_at)
+    posted = _day(Post.created_at)
+    graded = _day(Grade.graded_at)
+    zero = db.literal(0)
+    no_percent = db.cast(0, db.Float)
+
+    submissions = db.select(
+        submitted.label('day'), Assignment.course_id.label('course_id'),
+        db.func.count(Submission.id).label('submissions'), zero.label('posts'),
+        zero.label('grades'), no_percent.label('grade_percent_total'),
+    ).join(Assignment, Submission.assignment_id == Assignment.id) \
+        .where(_window(Submission.submitted_at, start, end)) \
+        .group_by(submitted, Assignment.course_id)
+
+    posts = db.select(
+        posted, Discussion.course_id, zero, db.func.count(Post.id), zero, no_percent,
+    ).join(Discussion, Post.discussion_id == Discussion.id) \
+        .where(_window(Post.created_at, start, end)) \
+        .group_by(posted, Discussion.course_id)
+
+    grades = db.select(
+        graded, Assignment.course_id, zero, zero, db.func.count(Grade.id),
+        db.func.sum(db.cast(Grade.points_earned * 100.0 / Assignment.max_points, db.Float)),
+    ).join(Assignment, Grade.assignment_id == Assignment.id) \
+        .where(_window(Grade.graded_at, start, end), Assignment.max_points > 0) \
+        .group_by(graded, Assignment.course_id)
+
+    activity = db.union_all(submissions, posts, grades).subquery()
+    return db.select(
+        activity.c.day, activity.c.course_id,
+        db.func.sum(activity.c.submissions), db.func.sum(activity.c.posts),
+        db.func.sum(activity.c.grades), db.func.sum(activity.c.grade_percent_total),
+    ).group_by(activity.c.day, activity.c.course_id)
+
+
+def _active_users(start, end):
+    return db.union(
+        db.select(_day(Submission.submitted_at), Submission.student_id)
+        .where(_window(Submission.submitted_at, start, end)),
+        db.select(_day(Post.created_at), Post.author_id)
+        .where(_window(Post.created_at, start, end)),
+        db.select(_day(LectureSessionLog.joined_at), LectureSessionLog.participant_id)
+        .where(_window(LectureSessionLog.joined_at, start, end)),
+    )
+
+
+# name: (rollup model, columns it is filled into, query builder, source timestamps)
+ROLLUPS = {
+    'signups': (
+        SignupRollup, ['day', 'role', 'signups'], _signups,
+        [User.created_at],
+    ),
+    'course_activity': (
+        CourseActivityRollup, ['day', 'course_id', 'submissions', 'posts', 'grades', 'grade_percent_total'],
+        _course_activity,
+        [Submission.submitted_at, Post.created_at, Grade.graded_at],
+    ),
+    'active_users': (
+        ActiveUserRollup, ['day', 'user_id'], _active_users,
+        [Submission.submitted_at, Post.created_at, LectureSessionLog.joined_at],
+    ),
+}
+
+
+def _earliest_day(timestamps):
+    earliest = [db.session.query(db.func.min(column)).scalar() for column in timestamps]
+    earliest = [value for value in earliest if value is not None]
+    return min(earliest).date() if earliest else datetime.utcnow().date()
+
+
+def _rebuild(name, start, end=None):
+    """Replace the rollup rows for days in ``[start, end)`` from the source tables."""
+    model, columns, build, _ = ROLLUPS[name]
+    table = model.__table__
+    delete = table.delete().where(table.c.day >= start)
+    if end is not None:
+        delete = delete.where(table.c.day < end)
+    db.session.execute(delete)
+    db.session.execute(table.insert().from_select(columns, build(start, end)))
+
+
+def _advance(name, previous, now):
+    """Move the high-water mark to ``now`` unless a writer rewound it meanwhile."""
+    table = RollupState.__table__
+    if previous is None:
+        db.session.execute(table.insert().values(name=name, high_water=now))
+    else:
+        db.session.execute(
+            table.update().where(table.c.name == name, table.c.high_water == previous).values(high_water=now)
+        )
+
+
+def refresh_rollups(now=None):
+    """Bring every rollup up to date, recomputing only the days since its
+    high-water mark. A rollup that has never been built is backfilled."""
+    now = now or datetime.utcnow()
+    with _refresh_lock:
+        for name, (_, _, _, timestamps) in ROLLUPS.items():
+            previous = db.session.get(RollupState, name)
+            previous = previous.high_water if previous is not None else None
+            if previous is None:
+                start = _earliest_day(timestamps)
+            else:
+                start = (previous - REFRESH_OVERLAP).date()
+            try:
+                _rebuild(name, start)
+                _advance(name, previous, now)
+                db.session.commit()
+            except IntegrityError:
+                # Another worker refreshed the same days first; its rows stand
+                db.session.rollback()
+
+
+def backfill_rollups(since=None, chunk_days=31):
+    """Rebuild every rollup from ``since`` (default: its oldest source row),
+    one chunk of days per transaction. Returns the first day rebuilt per rollup."""
+    now = datetime.utcnow()
+    started = {}
+    with _refresh_lock:
+        for name, (_, _, _, timestamps) in ROLLUPS.items():
+            start = started[name] = since or _earliest_day(timestamps)
+            while start <= now.date():
+                end = start + timedelta(days=chunk_days)
+                _rebuild(name, start, end)
+                db.session.commit()
+                start = end
+            state = db.session.get(RollupState, name)
+            if state is None:
+                db.session.add(RollupState(name=name, high_water=now))
+            else:
+                state.high_water = now
+            db.session.commit()
+    return started
+
+
+def refresh_if_stale():
+    """Refresh the rollups when the oldest high-water mark is older than
+    ``ANALYTICS_REFRESH_INTERVAL`` seconds, and return that mark."""
+    interval = timedelta(seconds=app.config.get('ANALYTICS_REFRESH_INTERVAL', 300))
+    states = db.session.query(db.func.min(RollupState.high_water), db.func.count(RollupState.name)).one()
+    oldest, built = states
+    if built < len(ROLLUPS) or oldest < datetime.utcnow() - interval:
+        refresh_rollups()
+        oldest = db.session.query(db.func.min(RollupState.high_water)).scalar()
+    return oldest
+
+
+def rewind_rollups(since, names=None):
+    """Make the next refresh recompute everything from ``since`` onwards.
+
+    Call this after writing source rows with back-dated timestamps outside the
+    ORM, e.g. from an import.
+    """
+    _rewind(db.session.connection(), since, names or list(ROLLUPS))
+
+
+def _rewind(connection, since, names):
+    table = RollupState.__table__
+    connection.execute(
+        table.update()
+        .where(table.c.name.in_(names), table.c.high_water > since)
+        .values(high_water=since)
+    )
+
+
+# Rows inserted with the current time are picked up by the next refresh on
+# their own. Updates and deletes can change days that were already rolled up,
+# so they rewind the affected rollups to the earliest day they touched.
+
+def _watch(model, timestamp, tracked, names):
+    tracked = [timestamp.key, *tracked]
+
+    def rewind_to_earliest(connection, target):
+        # The row's current timestamp, and its previous one if that changed
+        moments = [getattr(target, timestamp.key), *db.inspect(target).attrs[timestamp.key].history.deleted]
+        moments = [moment for moment in moments if moment is not None]
+        if moments:
+            _rewind(connection, min(moments), names)
+
+    @event.listens_for(model, 'after_update')
+    def rewind_on_update(mapper, connection, target):
+        state = db.inspect(target)
+        if any(state.attrs[key].history.has_changes() for key in tracked):
+            rewind_to_earliest(connection, target)
+
+    @event.listens_for(model, 'after_delete')
+    def rewind_on_delete(mapper, connection, target):
+        rewind_to_earliest(connection, target)
+
+
+_watch(User, User.created_at, ['role'], ['signups'])
+_watch(Submission, Submission.submitted_at, ['assignment_id', 'student_id'], ['course_activity', 'active_users'])
+_watch(Post, Post.created_at, ['discussion_id', 'author_id'], ['course_activity', 'active_users'])
+_watch(Grade, Grade.graded_at, ['assignment_id', 'points_earned'], ['course_activity'])
+_watch(LectureSessionLog, LectureSessionLog.joined_at, ['participant_id'], ['active_users'])
+
+
+# Reading the rollups for the analytics page
+
+def _month_start(day, months_back=0):
+    month = day.year * 12 + day.month - 1 - months_back
+    return date(month // 12, month % 12 + 1, 1)
+
+
+def _average(total, count):
+    return round(total / count, 1) if count else None
+
+
+def analytics_summary(today=None):
+    """Gather the analytics page's figures from the rollups and counters."""
+    today = today or datetime.utcnow().date()
+    month_start = _month_start(today)
+    trend_start = _month_start(today, 5)
+    recent_start = today - timedelta(days=30)
+    earlier_start = today - timedelta(days=60)
+
+    role_counts = dict(
+        db.session.query(SignupRollup.role, db.func.sum(SignupRollup.signups)).group_by(SignupRollup.role).all()
+    )
+
+    monthly = {}
+    for day, signups in db.session.query(SignupRollup.day, db.func.sum(SignupRollup.signups)) \
+            .filter(SignupRollup.day >= trend_start).group_by(SignupRollup.day):
+        key = (day.year, day.month)
+        monthly[key] = monthly.get(key, 0) + signups
+    months = [_month_start(today, back) for back in range(5, -1, -1)]
+
+    def period(start, end=None):
+        condition = CourseActivityRollup.day >= start
+        if end is not None:
+            condition = db.and_(condition, CourseActivityRollup.day < end)
+        return (
+            db.func.coalesce(db.func.sum(db.case((condition, CourseActivityRollup.grade_percent_total), else_=0)), 0),
+            db.func.coalesce(db.func.sum(db.case((condition, CourseActivityRollup.grades), else_=0)), 0),
+        )
+    grade_totals = db.session.query(
+        db.func.coalesce(db.func.sum(CourseActivityRollup.grade_percent_total), 0),
+        db.func.coalesce(db.func.sum(CourseActivityRollup.grades), 0),
+        *period(recent_start), *period(earlier_start, recent_start),
+    ).one()
+    avg_grade = _average(*grade_totals[0:2])
+    recent_avg = _average(*grade_totals[2:4])
+    earlier_avg = _average(*grade_totals[4:6])
+
+    course_avg = (db.func.sum(CourseActivityRollup.grade_percent_total)
+                  / db.func.sum(CourseActivityRollup.grades)).label('avg_grade')
+    top_courses = db.session.query(Course.code, Course.title, course_avg) \
+        .join(Course, Course.id == CourseActivityRollup.course_id) \
+        .group_by(Course.id, Course.code, Course.title) \
+        .having(db.func.sum(CourseActivityRollup.grades) > 0) \
+        .order_by(course_avg.desc()).limit(4).all()
+
+    submissions = db.func.sum(CourseActivityRollup.submissions).label('submissions')
+    posts = db.func.sum(CourseActivityRollup.posts).label('posts')
+    course_activity = db.session.query(Course.code, submissions, posts) \
+        .join(Course, Course.id == CourseActivityRollup.course_id) \
+        .filter(CourseActivityRollup.day >= recent_start) \
+        .group_by(Course.id, Course.code) \
+        .order_by((submissions + posts).desc(), Course.code).limit(6).all()
+
+    active_users_today = db.session.query(db.func.count(ActiveUserRollup.user_id)) \
+        .filter(ActiveUserRollup.day == today).scalar()
+    new_users_this_month = db.session.query(db.func.coalesce(db.func.sum(SignupRollup.signups), 0)) \
+        .filter(SignupRollup.day >= month_start).scalar()
+
+    # Current totals come from the denormalized counter columns
+    course_total, enrollment_total = db.session.query(
+        db.func.count(Course.id), db.func.coalesce(db.func.sum(Course.enrollment_count), 0)
+    ).one()
+    assignment_total, submission_total = db.session.query(
+        db.func.count(Assignment.id), db.func.coalesce(db.func.sum(Assignment.submission_count), 0)
+    ).one()
+
+    student_count = role_counts.get('student', 0)
+    return {
+        'total_users': sum(role_counts.values()),
+        'student_count': student_count,
+        'lecturer_count': role_counts.get('lecturer', 0),
+        'admin_count': role_counts.get('admin', 0),
+        'new_users_this_month': new_users_this_month,
+        'active_courses': course_total,
+        'avg_enrollment': round(enrollment_total / max(course_total, 1), 1),
+        'total_assignments': assignment_total,
+        'submission_rate': round(submission_total / max(assignment_total * student_count, 1) * 100, 1),
+        'avg_grade': avg_grade,
+        'grade_change': round(recent_avg - earlier_avg, 1) if recent_avg is not None and earlier_avg is not None else None,
+        'active_users_today': active_users_today,
+        'registration_trend': {
+            'labels': [month.strftime('%b') for month in months],
+            'data': [monthly.get((month.year, month.month), 0) for month in months],
+        },
+        'course_activity': {
+            'labels': [code for code, _, _ in course_activity],
+            'submissions': [int(count) for _, count, _ in course_activity],
+            'posts': [int(count) for _, _, count in course_activity],
+        },
+        'top_courses': [
+            {'code': code, 'title': title, 'avg_grade': round(average, 1)}
+            for code, title, average in top_courses
+        ],
+    }
@@ -7,8 +7,8 @@ from flask_login import LoginManager
 from sqlalchemy.orm import DeclarativeBase
 from werkzeug.middleware.proxy_fix import ProxyFix
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
+# Configure logging; LOG_LEVEL=DEBUG for SQL and request detail
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO').upper())
 
 class Base(DeclarativeBase):
     pass
@@ -26,7 +26,46 @@ port = int(os.environ.get('PORT', 5000))
 app.config['PORT'] = port
 
 # Configure file uploads
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max request size, so 16MB for form uploads
+
+# Downloads: set FILE_OFFLOAD to nginx (X-Accel-Redirect to FILE_OFFLOAD_PREFIX, an internal
+# location aliased to UPLOAD_FOLDER) or apache (X-Sendfile) to let the front end send files
+app.config['FILE_OFFLOAD'] = os.environ.get('FILE_OFFLOAD', '').lower()
+app.config['FILE_OFFLOAD_PREFIX'] = os.environ.get('FILE_OFFLOAD_PREFIX', '/protected-uploads/')
+
+# Chunked, resumable submission uploads (see uploads.py); each chunk is its own request,
+# so MAX_UPLOAD_SIZE can exceed MAX_CONTENT_LENGTH without buffering more per worker
+app.config['MAX_UPLOAD_SIZE'] = int(os.environ.get('MAX_UPLOAD_SIZE', 256 * 1024 * 1024))
+app.config['UPLOAD_CHUNK_SIZE'] = int(os.environ.get('UPLOAD_CHUNK_SIZE', 1024 * 1024))
+app.config['UPLOAD_EXPIRY_HOURS'] = int(os.environ.get('UPLOAD_EXPIRY_HOURS', 48))
+
+# Dashboard snapshot cache; point DASHBOARD_CACHE_PATH at a local file to share it between workers
+app.config['DASHBOARD_CACHE_TTL'] = int(os.environ.get('DASHBOARD_CACHE_TTL', 120))
+app.config['DASHBOARD_CACHE_PATH'] = os.environ.get('DASHBOARD_CACHE_PATH')
+
+# Per-worker cache of logged-in identities; each use checks the user's identity_version,
+# so changes made through other workers apply at once
+app.config['IDENTITY_CACHE_TTL'] = int(os.environ.get('IDENTITY_CACHE_TTL', 60))
+app.config['IDENTITY_CACHE_SIZE'] = int(os.environ.get('IDENTITY_CACHE_SIZE', 10000))
+
+# Rows the admin user import accepts in one request; every row hashes a password, so
+# larger files go through `flask import-users` instead of tying up a worker
+app.config['IMPORT_USERS_MAX_ROWS'] = int(os.environ.get('IMPORT_USERS_MAX_ROWS', 500))
+
+# Analytics rollups are refreshed on view once they are older than this many seconds
+app.config['ANALYTICS_REFRESH_INTERVAL'] = int(os.environ.get('ANALYTICS_REFRESH_INTERVAL', 300))
+
+# Request metrics; set METRICS_DIR to a local directory so /metrics covers every gunicorn worker,
+# and METRICS_TOKEN to let a scraper read it without an admin login
+app.config['METRICS_DIR'] = os.environ.get('METRICS_DIR')
+app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+app.config['METRICS_FLUSH_INTERVAL'] = float(os.environ.get('METRICS_FLUSH_INTERVAL', 1.0))
+
+# Opt-in SQL profiling: per-request statement counts, and a warning (or NPlusOneError with
+# SQL_PROFILER_RAISE) when one statement shape repeats more than the threshold
+app.config['SQL_PROFILER'] = os.environ.get('SQL_PROFILER', '').lower() in ('1', 'true', 'yes')
+app.config['SQL_PROFILER_REPEAT_THRESHOLD'] = int(os.environ.get('SQL_PROFILER_REPEAT_THRESHOLD', 10))
+app.config['SQL_PROFILER_RAISE'] = os.environ.get('SQL_PROFILER_RAISE', '').lower() in ('1', 'true', 'yes')
 
 # Handle upload folder for different platforms
 upload_folder = os.environ.get('UPLOAD_FOLDER', 'uploads')
@@ -63,18 +102,32 @@ login_manager.login_message = 'Please log in to access this page.'
 # Create upload directory
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
-with app.app_context():
-    # Import models to ensure tables are created
-    from models import User, Course, Enrollment, Assignment, Submission, Discussion, Post, Grade
-    from routes import *
-    
-    db.create_all()
-    
-    # Initialize sample data
-    from init_data import init_sample_data
-    init_sample_data()
+# Create tables and sample data on startup; otherwise run `flask bootstrap` once per database
+app.config['AUTO_BOOTSTRAP'] = os.environ.get('AUTO_BOOTSTRAP', '').lower() in ('1', 'true', 'yes')
+
+
+def create_app():
+    """Register routes, hooks and CLI commands on the application and return it.
+
+    Importing this module only configures the app; the views and their
+    dependencies load here, once, however often this is called. Nothing
+    touches the database unless AUTO_BOOTSTRAP is set, so the app can be
+    built in a gunicorn master (``--preload``) and shared by its workers.
+    """
+    if 'index' in app.view_functions:
+        return app
+    with app.app_context():
+        import models
+        import routes
+        import commands
+        import profiler
+        import identity
+
+        if app.config['AUTO_BOOTSTRAP']:
+            commands.bootstrap()
+    return app
 
 @login_manager.user_loader
 def load_user(user_id):
-    from models import User
-    return User.query.get(int(user_id))
+    from identity import load_principal
+    return load_principal(user_id)
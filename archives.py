@@ -0,0 +1,140 @@
+"""Streamed ZIP archives of an assignment's submissions.
+
+The archive is built while the response goes out. Each file is read from
+the store a block at a time, compressed or stored, and passed straight to
+the client, so nothing is staged in memory or in temporary files and the
+first bytes leave at once. zipfile can write to a stream it cannot seek:
+it then puts each entry's CRC and sizes in a data descriptor after the data.
+
+Every student's files go in a folder named after their username, next to a
+manifest.csv with one row per submission, its cells escaped like the
+gradebook's so that no name or feedback opens as a formula. A name already taken in the
+archive, such as an upload called submission.txt next to the text answer,
+gets a numbered suffix.
+"""
+import csv
+import io
+import os
+import zipfile
+from datetime import datetime
+
+from app import db
+from models import Grade, Submission, User
+from spreadsheet import safe_cell
+from storage import READ_SIZE, absolute_path, stored_file
+
+# Formats that are compressed already; deflating them again only costs CPU
+STORED_EXTENSIONS = {'zip', 'rar', '7z', 'gz', 'png', 'jpg', 'jpeg', 'gif', 'docx', 'pptx', 'xlsx', 'mp3', 'mp4'}
+
+MANIFEST_FIELDS = ['assignment_id', 'username', 'student', 'submitted_at', 'late', 'file', 'size', 'sha256',
+                   'url', 'points_earned', 'feedback']
+
+# Submission rows fetched per round trip while streaming
+BATCH_SIZE = 100
+
+
+class _Sink:
+    """Write-only file for zipfile; holds what was written until drained."""
+
+    def __init__(self):
+        self.parts = []
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        if self.parts:
+            data = b''.join(self.parts)
+            self.parts.clear()
+            yield data
+
+
+def compression_for(name):
+    extension = name.rsplit('.', 1)[-1].lower() if '.' in name else ''
+    return zipfile.ZIP_STORED if extension in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+
+
+def _entry(name, when, size=None):
+    # ZIP timestamps start in 1980
+    info = zipfile.ZipInfo(name, max(when or datetime.utcnow(), datetime(1980, 1, 1)).timetuple()[:6])
+    info.compress_type = compression_for(name)
+    if size is not None:
+        # Known up front so zipfile can choose ZIP64 for files over 4GB
+        info.file_size = size
+    return info
+
+
+def _unique_name(name, used):
+    """``name``, or ``name`` with `` (2)``, `` (3)``... before its extension
+    when already in ``used``; the result is added to ``used``."""
+    stem, extension = os.path.splitext(name)
+    candidate, number = name, 1
+    while candidate in used:
+        number += 1
+        candidate = f'{stem} ({number}){extension}'
+    used.add(candidate)
+    return candidate
+
+
+def submission_archive(assignment):
+    """Yield the bytes of a ZIP holding every submission to ``assignment``."""
+    rows = db.session.query(Submission, User.username, User.first_name, User.last_name,
+                            Grade.points_earned, Grade.feedback) \
+        .join(User, User.id == Submission.student_id) \
+        .outerjoin(Grade, db.and_(Grade.assignment_id == Submission.assignment_id,
+                                  Grade.student_id == Submission.student_id)) \
+        .filter(Submission.assignment_id == assignment.id) \
+        .order_by(User.username).yield_per(BATCH_SIZE)
+
+    sink = _Sink()
+    manifest = io.StringIO()
+    writer = csv.DictWriter(manifest, MANIFEST_FIELDS)
+    writer.writeheader()
+    used = {'manifest.csv'}
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for submission, username, first_name, last_name, points_earned, feedback in rows:
+            row = {
+                'assignment_id': assignment.id,
+                'username': username,
+                'student': f'{first_name} {last_name}',
+                'submitted_at': submission.submitted_at.isoformat(sep=' ', timespec='seconds')
+                if submission.submitted_at else '',
+                'late': bool(assignment.due_date and submission.submitted_at
+                             and submission.submitted_at > assignment.due_date),
+                'sha256': submission.file_sha256 or '',
+                'url': submission.url or '',
+                'points_earned': '' if points_earned is None else points_earned,
+                'feedback': feedback or '',
+            }
+
+            if submission.content:
+                archive.writestr(_entry(_unique_name(f'{username}/submission.txt', used), submission.submitted_at),
+                                 submission.content)
+                yield from sink.drain()
+
+            if submission.file_path:
+                relative_path, name = stored_file(submission)
+                try:
+                    file = open(absolute_path(relative_path), 'rb')
+                except FileNotFoundError:
+                    row['file'] = f'(missing) {name}'
+                else:
+                    with file:
+                        size = os.fstat(file.fileno()).st_size
+                        entry_name = _unique_name(f'{username}/{name}', used)
+                        with archive.open(_entry(entry_name, submission.submitted_at, size), 'w') as entry:
+                            while block := file.read(READ_SIZE):
+                                entry.write(block)
+                                yield from sink.drain()
+                    row['file'] = entry_name
+                    row['size'] = size
+                yield from sink.drain()
+
+            writer.writerow({name: safe_cell(value) for name, value in row.items()})
+
+        archive.writestr(_entry('manifest.csv', datetime.utcnow()), manifest.getvalue())
+    yield from sink.drain()
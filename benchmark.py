@@ -0,0 +1,239 @@
+"""Per-route benchmark: latency, statement counts and memory for every GET
+route, as each role, reported as JSON so runs can be compared across commits.
+
+Point DB_PATH or DATABASE_URL at a database filled by ``flask generate-data``
+and run ``flask benchmark``. ``flask benchmark-startup`` times a cold import
+of the app instead.
+"""
+import math
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+from app import app, db
+from models import User, Course, Enrollment, Assignment, Discussion, LectureRoom
+from profiler import profile_queries
+
+# Endpoints that change data or stream files when fetched
+SKIPPED = {'static', 'logout', 'enroll_course', 'join_lecture', 'start_lecture', 'end_lecture', 'uploaded_file',
+           'submission_file', 'download_submissions'}
+
+# Extra query strings worth measuring on their own
+VARIANTS = {
+    'assignments': [{'search': 'essay'}],
+    'discussions': [{'search': 'exam preparation'}],
+}
+
+ROLES = ('admin', 'lecturer', 'student')
+
+
+def _busiest(column, *filters):
+    """The most common value of ``column`` among rows matching ``filters``."""
+    return db.session.query(column).filter(*filters).group_by(column) \
+        .order_by(db.func.count().desc(), column).limit(1).scalar()
+
+
+def pick_users():
+    """One user per role, choosing whoever has the most data behind them."""
+    return {
+        'admin': User.query.filter_by(role='admin').order_by(User.id).first(),
+        'lecturer': db.session.get(User, _busiest(Course.lecturer_id)),
+        'student': db.session.get(User, _busiest(Enrollment.user_id)),
+    }
+
+
+def sample_arguments(role, user):
+    """URL arguments pointing at the busiest rows ``user`` can open."""
+    if role == 'lecturer':
+        course_ids = db.select(Course.id).where(Course.lecturer_id == user.id)
+    elif role == 'student':
+        course_ids = db.select(Enrollment.course_id).where(Enrollment.user_id == user.id)
+    else:
+        course_ids = db.select(Course.id)
+
+    course_id = db.session.query(Course.id).filter(Course.id.in_(course_ids)) \
+        .order_by(Course.enrollment_count.desc(), Course.id).limit(1).scalar()
+    assignment_id = db.session.query(Assignment.id).filter(Assignment.course_id.in_(course_ids)) \
+        .order_by(Assignment.submission_count.desc(), Assignment.id).limit(1).scalar()
+    discussion_id = db.session.query(Discussion.id).filter(Discussion.course_id.in_(course_ids)) \
+        .order_by(Discussion.post_count.desc(), Discussion.id).limit(1).scalar()
+    rooms = LectureRoom.query.filter(LectureRoom.course_id.in_(course_ids))
+    if role == 'lecturer':
+        rooms = rooms.filter(LectureRoom.lecturer_id == user.id)
+    room = rooms.order_by(LectureRoom.id).first()
+
+    arguments = {'course_id': course_id, 'assignment_id': assignment_id,
+                 'discussion_id': discussion_id, 'room_id': room.id if room else None}
+    return {name: value for name, value in arguments.items() if value is not None}
+
+
+def benchmark_urls(arguments):
+    """``(endpoint, url)`` for every GET route that can be built from ``arguments``,
+    and the endpoints that could not be."""
+    urls, missing = [], []
+    with app.test_request_context():
+        for rule in sorted(app.url_map.iter_rules(), key=lambda rule: rule.endpoint):
+            if 'GET' not in rule.methods or rule.endpoint in SKIPPED:
+                continue
+            if not rule.arguments <= arguments.keys():
+                missing.append(rule.endpoint)
+                continue
+            values = {name: arguments[name] for name in rule.arguments}
+            urls.append((rule.endpoint, app.url_for(rule.endpoint, **values)))
+            for query in VARIANTS.get(rule.endpoint, []):
+                urls.append((rule.endpoint, app.url_for(rule.endpoint, **values, **query)))
+    return urls, missing
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def _get(client, url):
+    # A fresh app context per request, as in production; otherwise requests
+    # made under the CLI's context would share ``g`` and the logged-in user
+    with app.app_context():
+        response = client.get(url)
+        # Streamed responses are only produced as they are read
+        response.get_data()
+        return response
+
+
+def measure(client, url, iterations):
+    """Time ``iterations`` requests for ``url`` after one warm-up request."""
+    started = time.perf_counter()
+    response = _get(client, url)
+    first = time.perf_counter() - started
+
+    latencies = []
+    queries = []
+    for _ in range(iterations):
+        with profile_queries() as profile:
+            started = time.perf_counter()
+            _get(client, url)
+            latencies.append(time.perf_counter() - started)
+        queries.append(profile.count)
+
+    tracemalloc.start()
+    _get(client, url)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'status': response.status_code,
+        'first_ms': round(first * 1000, 2),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+        'mean_ms': round(statistics.fmean(latencies) * 1000, 2),
+        'queries': max(queries),
+        'peak_kb': round(peak / 1024, 1),
+    }
+
+
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(iterations=20, roles=ROLES, progress=None):
+    """Benchmark every GET route as each of ``roles`` and return the report."""
+    report = progress or (lambda message: None)
+    users = pick_users()
+    results = []
+    skipped = {}
+    for role in roles:
+        user = users.get(role)
+        if user is None:
+            skipped[role] = ['no user with this role']
+            continue
+        urls, skipped[role] = benchmark_urls(sample_arguments(role, user))
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user.id)
+            session['_fresh'] = True
+        for endpoint, url in urls:
+            report(f'{role:8} {url}')
+            results.append({'role': role, 'endpoint': endpoint, 'url': url, **measure(client, url, iterations)})
+
+    return {
+        'commit': _commit(),
+        'created_at': datetime.utcnow().isoformat(timespec='seconds'),
+        'database': db.engine.url.render_as_string(hide_password=True),
+        'iterations': iterations,
+        'rows': {model.__tablename__: db.session.query(db.func.count(model.id)).scalar()
+                 for model in (User, Course, Enrollment, Assignment, Discussion)},
+        'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'results': results,
+        'skipped': skipped,
+    }
+
+
+def compare(baseline, current):
+    """Lines describing how each route's p50, p99 and query count moved."""
+    before = {(result['role'], result['url']): result for result in baseline['results']}
+    lines = [f"{'role':8} {'url':45} {'p50 ms':>16} {'p99 ms':>16} {'queries':>10}"]
+    for result in current['results']:
+        old = before.get((result['role'], result['url']))
+        if old is None:
+            continue
+        lines.append(
+            f"{result['role']:8} {result['url'][:45]:45} "
+            f"{old['p50_ms']:>7} -> {result['p50_ms']:<6} {old['p99_ms']:>7} -> {result['p99_ms']:<6} "
+            f"{old['queries']:>3} -> {result['queries']:<3}"
+        )
+    return lines
+
+
+# Cold start: what a new gunicorn worker or serverless instance pays before its first request
+
+_STARTUP_SCRIPT = (
+    'import resource, time\n'
+    'started = time.perf_counter()\n'
+    'import main\n'
+    'print(time.perf_counter() - started, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)\n'
+)
+
+
+def measure_startup(runs=5, top=15):
+    """Time ``import main`` in ``runs`` fresh interpreters and list the
+    imports that took longest, from one more run under ``-X importtime``."""
+    root = os.path.dirname(os.path.abspath(__file__))
+    seconds, rss = [], []
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, '-c', _STARTUP_SCRIPT], cwd=root,
+                                capture_output=True, text=True, check=True)
+        duration, max_rss = result.stdout.split()[-2:]
+        seconds.append(float(duration))
+        rss.append(int(max_rss))
+
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import main'], cwd=root,
+                            capture_output=True, text=True, check=True)
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        modules.append({'module': name.strip(), 'self_ms': int(own) / 1000,
+                        'cumulative_ms': int(cumulative) / 1000})
+
+    return {
+        'commit': _commit(),
+        'created_at': datetime.utcnow().isoformat(timespec='seconds'),
+        'runs': runs,
+        'import_ms': {
+            'min': round(min(seconds) * 1000, 1),
+            'p50': round(percentile(seconds, 0.50) * 1000, 1),
+            'max': round(max(seconds) * 1000, 1),
+        },
+        'max_rss_kb': max(rss),
+        'slowest_imports': sorted(modules, key=lambda module: module['self_ms'], reverse=True)[:top],
+    }
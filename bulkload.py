@@ -0,0 +1,338 @@
+"""Bulk loading of fixtures and SQL exports.
+
+Rows are buffered per table and written in batches: executemany
+``INSERT`` on SQLite, ``COPY ... FROM STDIN`` on PostgreSQL. A whole load
+runs in one transaction with constraints deferred, so rows may arrive in any
+order. Like the synthetic generator, this bypasses the ORM hooks; ``flask
+load-data`` rebuilds counters, post paths and analytics afterwards.
+"""
+import gzip
+import io
+import json
+import re
+from contextlib import contextmanager
+from datetime import date, datetime
+
+from app import db
+
+
+def _open(path):
+    if str(path).endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8')
+    return open(path, encoding='utf-8')
+
+
+def _table(name):
+    table = db.metadata.tables.get(name)
+    if table is None:
+        raise ValueError(f'Unknown table {name!r}')
+    return table
+
+
+def _coerce(column, value):
+    """Turn fixture values (ISO strings, 0/1 flags) into what ``column`` stores."""
+    if value is None:
+        return None
+    python_type = getattr(column.type, 'python_type', None)
+    if python_type is datetime and isinstance(value, str):
+        return datetime.fromisoformat(value)
+    if python_type is date and isinstance(value, str):
+        return date.fromisoformat(value[:10])
+    if python_type is bool and not isinstance(value, bool):
+        return bool(value)
+    return value
+
+
+def _default(column):
+    """The Python-side default the ORM would have filled in, or None.
+
+    COPY never sees SQLAlchemy defaults, so they are applied here for both
+    backends and loads behave the same on each.
+    """
+    default = column.default
+    if default is None or default.is_sequence:
+        return None
+    if default.is_callable:
+        return default.arg(None)
+    if default.is_scalar:
+        return default.arg
+    return None
+
+
+def _copy_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, (int, float)):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+class BulkLoader:
+    """Buffers rows per table and writes them in batches of ``batch_size``.
+
+    A full buffer flushes every table, in the order tables were first seen,
+    so parent rows reach the database before their children even where
+    constraints cannot be deferred. Use inside :func:`bulk_load`.
+    """
+
+    def __init__(self, batch_size=10_000):
+        self.batch_size = batch_size
+        self.rows = {}
+        self.written = {}
+        self.copy = db.engine.dialect.name == 'postgresql'
+
+    def add(self, table, row):
+        """Queue ``row`` (a dict of column name to value) for ``table``, a name or model."""
+        table = _table(table) if isinstance(table, str) else getattr(table, '__table__', table)
+        # Rows of one table can name different columns, so batch by column set
+        key = (table, tuple(sorted(row)))
+        rows = self.rows.setdefault(key, [])
+        rows.append(row)
+        if len(rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        for (table, names), rows in self.rows.items():
+            if rows:
+                self._write(table, names, rows)
+                self.written[table.name] = self.written.get(table.name, 0) + len(rows)
+                rows.clear()
+
+    def _prepare(self, table, names, rows):
+        given = [table.c[name] for name in names]
+        defaulted = [(column, _default(column)) for column in table.columns
+                     if column.key not in names and column.default is not None]
+        columns = given + [column for column, _ in defaulted]
+        prepared = []
+        for row in rows:
+            values = [_coerce(column, row[column.key]) for column in given]
+            prepared.append(values + [value for _, value in defaulted])
+        return columns, prepared
+
+    def _write(self, table, names, rows):
+        columns, rows = self._prepare(table, names, rows)
+        if self.copy:
+            self._copy(table, columns, rows)
+        else:
+            keys = [column.key for column in columns]
+            db.session.execute(table.insert(), [dict(zip(keys, values)) for values in rows])
+
+    def _copy(self, table, columns, rows):
+        quote = db.engine.dialect.identifier_preparer.quote
+        buffer = io.StringIO()
+        for values in rows:
+            buffer.write(','.join(map(_copy_value, values)))
+            buffer.write('\n')
+        buffer.seek(0)
+        cursor = db.session.connection().connection.dbapi_connection.cursor()
+        try:
+            cursor.copy_expert(
+                f"COPY {quote(table.name)} ({', '.join(quote(column.name) for column in columns)}) "
+                f"FROM STDIN WITH (FORMAT csv)",
+                buffer,
+            )
+        finally:
+            cursor.close()
+
+
+def _defer_constraints():
+    if db.engine.dialect.name == 'sqlite':
+        # Only matters where foreign keys are enforced; lasts until commit
+        db.session.execute(db.text('PRAGMA defer_foreign_keys = ON'))
+    elif db.engine.dialect.name == 'postgresql':
+        # Applies to DEFERRABLE constraints; the rest rely on flush order
+        db.session.execute(db.text('SET CONSTRAINTS ALL DEFERRED'))
+
+
+@contextmanager
+def bulk_load(batch_size=10_000):
+    """Yield a :class:`BulkLoader` whose rows are committed as one transaction."""
+    loader = BulkLoader(batch_size)
+    _defer_constraints()
+    try:
+        yield loader
+        loader.flush()
+        db.session.commit()
+    except BaseException:
+        db.session.rollback()
+        raise
+
+
+def native_insert(table):
+    """An ``INSERT`` into ``table`` that accepts ``on_conflict_do_nothing()``
+    and ``on_conflict_do_update()``, which SQLite and PostgreSQL spell alike."""
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise ValueError(f'ON CONFLICT is not supported on {dialect}')
+    return insert(getattr(table, '__table__', table))
+
+
+def reset_sequences(tables=None):
+    """Move PostgreSQL ID sequences past rows inserted with explicit IDs."""
+    if db.engine.dialect.name != 'postgresql':
+        return
+    for table in tables or db.metadata.sorted_tables:
+        if 'id' not in table.c or not table.c.id.autoincrement:
+            continue
+        db.session.execute(db.text(
+            f"SELECT setval(pg_get_serial_sequence('\"{table.name}\"', 'id'), "
+            f"(SELECT COALESCE(MAX(id), 1) FROM \"{table.name}\"))"
+        ))
+    db.session.commit()
+
+
+# Fixtures: one JSON object per line, naming its table, e.g.
+#   {"table": "course", "id": 1, "code": "CS101", "title": "...", "lecturer_id": 2}
+
+def fixture_rows(path):
+    """Yield ``(table, row)`` for each line of a JSON lines fixture."""
+    with _open(path) as file:
+        for number, line in enumerate(file, 1):
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            try:
+                table = row.pop('table')
+            except KeyError:
+                raise ValueError(f'{path}:{number}: fixture row has no "table"') from None
+            yield table, row
+
+
+# SQL exports: only INSERT ... VALUES statements are read. Tables come from
+# the models, so CREATE TABLE, CREATE INDEX and the like are skipped.
+
+_SQL_TOKEN = re.compile(r"""
+    (?P<space>\s+|--[^\n]*)
+  | (?P<string>'(?:[^']|'')*')
+  | (?P<open>'(?:[^']|'')*\Z)
+  | (?P<quoted>"(?:[^"]|"")*"|`[^`]*`)
+  | (?P<number>-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?)
+  | (?P<word>\w+)
+  | (?P<symbol>.)
+""", re.VERBOSE | re.DOTALL)
+
+_LITERALS = {'NULL': None, 'TRUE': True, 'FALSE': False}
+
+
+def _sql_tokens(file):
+    """Yield ``(kind, value)`` tokens, reading ``file`` a line at a time.
+
+    A string literal left open at the end of a line is carried over to the
+    next, so multi-line values are read whole.
+    """
+    pending = ''
+    for line in file:
+        text = pending + line
+        pending = ''
+        for match in _SQL_TOKEN.finditer(text):
+            kind = match.lastgroup
+            value = match.group()
+            if kind == 'space':
+                continue
+            if kind == 'open':
+                pending = value
+                break
+            if kind == 'string':
+                yield 'value', value[1:-1].replace("''", "'")
+            elif kind == 'quoted':
+                yield 'name', value[1:-1].replace('""', '"')
+            elif kind == 'number':
+                yield 'value', float(value) if any(c in value for c in '.eE') else int(value)
+            elif kind == 'word' and value.upper() in _LITERALS:
+                yield 'value', _LITERALS[value.upper()]
+            elif kind == 'word':
+                yield 'name', value
+            else:
+                yield 'symbol', value
+    if pending:
+        raise ValueError('Unterminated string literal at end of export')
+
+
+def _closes(token):
+    if token[1] not in (',', ')'):
+        raise ValueError(f'Unexpected {token[1]!r} in INSERT')
+    return token[1] == ')'
+
+
+def sql_rows(path):
+    """Yield ``(table, row)`` for every row of every INSERT in a SQL export."""
+    with _open(path) as file:
+        tokens = _sql_tokens(file)
+
+        def take(kind=None, value=None):
+            token = next(tokens, None)
+            if token is None or (kind and token[0] != kind) or \
+                    (value and str(token[1]).upper() != value):
+                raise ValueError(f'Unexpected {token[1] if token else "end of export"!r} in INSERT, '
+                                 f'expected {value or kind}')
+            return token
+
+        for kind, value in tokens:
+            if kind != 'name' or value.upper() != 'INSERT':
+                # Skip any other statement
+                while (kind, value) != ('symbol', ';'):
+                    kind, value = next(tokens, ('symbol', ';'))
+                continue
+
+            take('name', 'INTO')
+            name = take('name')[1]
+            token = take()
+            while token == ('symbol', '.'):  # schema-qualified
+                name = take('name')[1]
+                token = take()
+            table = _table(name)
+            if token == ('symbol', '('):
+                columns = []
+                while True:
+                    columns.append(take('name')[1])
+                    if _closes(take('symbol')):
+                        break
+                token = take()
+            else:
+                columns = [column.key for column in table.columns]
+            if token[0] != 'name' or token[1].upper() != 'VALUES':
+                raise ValueError(f'Only INSERT ... VALUES is supported (table {name})')
+
+            while True:
+                take('symbol', '(')
+                values = []
+                while True:
+                    values.append(take('value')[1])
+                    if _closes(take('symbol')):
+                        break
+                if len(values) != len(columns):
+                    raise ValueError(f'{name}: {len(values)} value(s) for {len(columns)} column(s)')
+                yield table.name, dict(zip(columns, values))
+                if take('symbol')[1] == ';':
+                    break
+                # otherwise a comma before the next row
+
+
+def source_rows(path):
+    """Rows from a ``.jsonl`` fixture or ``.sql`` export (optionally gzipped)."""
+    name = str(path).removesuffix('.gz')
+    if name.endswith('.jsonl'):
+        return fixture_rows(path)
+    if name.endswith('.sql'):
+        return sql_rows(path)
+    raise ValueError(f'{path}: expected a .jsonl fixture or .sql export')
+
+
+def load_files(paths, batch_size=10_000, progress=None):
+    """Bulk load every file in ``paths`` in one transaction; return rows written per table."""
+    report = progress or (lambda message: None)
+    with bulk_load(batch_size) as loader:
+        for path in paths:
+            report(f'Loading {path}...')
+            for table, row in source_rows(path):
+                loader.add(table, row)
+    reset_sequences()
+    return loader.written
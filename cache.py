@@ -0,0 +1,148 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """A thread-safe, size-bounded in-process cache whose entries expire."""
+
+    def __init__(self, maxsize=1024, ttl=120):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class SQLiteFileCache:
+    """A cache in a local SQLite file, shared by every worker on the host.
+
+    Values are pickled, so only store plain data the application built itself.
+    """
+
+    def __init__(self, path, ttl=120):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        # A forked child must not share the parent's connection
+        os.register_at_fork(after_in_child=self._forget_connection)
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS cache_entry '
+                '(key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL NOT NULL)'
+            )
+
+    def _connect(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+
+    def _forget_connection(self):
+        self._local = threading.local()
+
+    def get(self, key):
+        row = self._connect().execute(
+            'SELECT value, expires FROM cache_entry WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return pickle.loads(row[0])
+
+    def set(self, key, value):
+        self._connect().execute(
+            'INSERT OR REPLACE INTO cache_entry (key, value, expires) VALUES (?, ?, ?)',
+            (key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), time.time() + self.ttl)
+        )
+
+    def delete(self, *keys):
+        if keys:
+            self._connect().executemany('DELETE FROM cache_entry WHERE key = ?', [(key,) for key in keys])
+
+    def clear(self):
+        self._connect().execute('DELETE FROM cache_entry')
+
+
+class CountingCache:
+    """Wraps a cache backend and counts hits, misses and invalidations."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        value = self.backend.get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key, value):
+        self.backend.set(key, value)
+
+    def delete(self, *keys):
+        self.backend.delete(*keys)
+        with self._lock:
+            self.invalidations += len(keys)
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'backend': type(self.backend).__name__,
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'hit_rate': round(self.hits / lookups * 100, 1) if lookups else 0.0,
+            }
+
+
+def make_cache(path=None, ttl=120, maxsize=1024):
+    """Build a counting cache: a shared SQLite file if ``path`` is set,
+    otherwise a per-process LRU."""
+    if path:
+        return CountingCache(SQLiteFileCache(path, ttl=ttl))
+    return CountingCache(LRUCache(maxsize=maxsize, ttl=ttl))
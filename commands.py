@@ -0,0 +1,318 @@
+import json
+
+import click
+from app import app, db
+from models import COUNTERS, Post, recount
+from search import ensure_search_index, rebuild_search_index
+from analytics import backfill_rollups, refresh_rollups
+from dashboard import dashboard_cache
+
+
+def recount_counters():
+    """Rebuild every denormalized counter column with one UPDATE per counter."""
+    for counter, _, _ in COUNTERS:
+        recount(counter)
+    db.session.commit()
+
+
+def rebuild_post_paths(batch_size=5000):
+    """Recompute ``Post.path`` and ``Post.depth`` for every post.
+
+    Posts are walked in ID order; a reply always has a higher ID than its
+    parent, so each parent's path is known before its replies are reached.
+    """
+    post_table = Post.__table__
+    paths = {}
+    updates = []
+    rows = db.session.execute(
+        db.select(post_table.c.id, post_table.c.parent_id).order_by(post_table.c.id)
+    ).yield_per(batch_size)
+    for post_id, parent_id in rows:
+        parent = paths.get(parent_id)
+        if parent is None:
+            path, depth = Post.path_segment(post_id), 0
+        else:
+            path, depth = f"{parent[0]}.{Post.path_segment(post_id)}", parent[1] + 1
+        paths[post_id] = (path, depth)
+        updates.append({'post_id': post_id, 'path': path, 'depth': depth})
+    statement = post_table.update() \
+        .where(post_table.c.id == db.bindparam('post_id')) \
+        .values(path=db.bindparam('path'), depth=db.bindparam('depth'))
+    for start in range(0, len(updates), batch_size):
+        db.session.execute(statement, updates[start:start + batch_size])
+    db.session.commit()
+    return len(updates)
+
+
+def rebuild_derived_data(post_paths=True):
+    """Recompute what the ORM hooks maintain, after rows were bulk inserted."""
+    if post_paths:
+        rebuild_post_paths()
+    recount_counters()
+    backfill_rollups()
+    dashboard_cache.clear()
+
+
+def create_missing_indexes():
+    """Create any declared index that does not exist yet and return the names.
+
+    ``db.create_all()`` only builds indexes together with their table, so
+    databases created before an index was declared need this to catch up.
+    """
+    created = []
+    for table in db.metadata.sorted_tables:
+        for index in sorted(table.indexes, key=lambda i: i.name):
+            if db.inspect(db.engine).has_index(table.name, index.name):
+                continue
+            index.create(db.engine)
+            created.append(index.name)
+    return created
+
+
+def add_missing_columns():
+    """Add declared columns missing from existing tables and return their names.
+
+    Columns with a server default are added ``DEFAULT ... NOT NULL``, so
+    existing rows get the default; the rest are added nullable and without
+    constraints. Both SQLite and PostgreSQL allow either on a populated table.
+    """
+    added = []
+    inspector = db.inspect(db.engine)
+    dialect = db.engine.dialect
+    quote = dialect.identifier_preparer.quote
+    ddl = dialect.ddl_compiler(dialect, None)
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            definition = column.type.compile(dialect=dialect)
+            if column.server_default is not None:
+                definition += f' DEFAULT {ddl.get_column_default_string(column)}'
+                if not column.nullable:
+                    definition += ' NOT NULL'
+            db.session.execute(db.text(f'ALTER TABLE {quote(table.name)} ADD COLUMN {quote(column.name)} {definition}'))
+            added.append(f'{table.name}.{column.name}')
+    db.session.commit()
+    return added
+
+
+def bootstrap(sample_data=True):
+    """Create missing tables, columns and indexes, and the sample data on an empty database.
+
+    Databases created before full-text search get their search index built
+    and filled, and posts without a materialized path get one. Counter columns added to an existing table are filled from their child
+    rows, since the hooks only adjust counters that are already right.
+    """
+    db.create_all()
+    added = add_missing_columns()
+    counters = [counter for counter, _, _ in COUNTERS
+                if f'{counter.class_.__tablename__}.{counter.key}' in added]
+    for counter in counters:
+        recount(counter)
+    if counters:
+        db.session.commit()
+    create_missing_indexes()
+    ensure_search_index()
+    if db.session.query(Post.id).filter(Post.path.is_(None)).first() is not None:
+        rebuild_post_paths()
+    if sample_data:
+        from init_data import init_sample_data
+        init_sample_data()
+
+
+@app.cli.command('bootstrap')
+@click.option('--sample-data/--no-sample-data', default=True, show_default=True,
+              help='Add the demo users and courses when the database has no users.')
+def bootstrap_command(sample_data):
+    """Create the schema (and sample data) for a new or upgraded database."""
+    bootstrap(sample_data)
+    click.echo('Database ready.')
+
+
+@app.cli.command('recount')
+def recount_command():
+    """Rebuild enrollment, post, submission, grade and blob reference counters."""
+    recount_counters()
+    click.echo('Counters rebuilt.')
+
+
+@app.cli.command('create-indexes')
+def create_indexes_command():
+    """Add declared indexes that are missing from an existing database."""
+    created = create_missing_indexes()
+    for name in created:
+        click.echo(f'Created {name}')
+    click.echo(f'{len(created)} index(es) created.')
+
+
+@app.cli.command('rebuild-search')
+def rebuild_search_command():
+    """Create the full-text search index if missing and reindex all rows."""
+    rebuild_search_index()
+    click.echo('Search index rebuilt.')
+
+
+@app.cli.command('rebuild-post-paths')
+def rebuild_post_paths_command():
+    """Backfill the materialized paths used to load discussion threads."""
+    count = rebuild_post_paths()
+    click.echo(f'{count} post path(s) rebuilt.')
+
+
+@app.cli.command('purge-uploads')
+@click.option('--hours', type=int, help='Idle time before an upload is purged; defaults to UPLOAD_EXPIRY_HOURS.')
+def purge_uploads_command(hours):
+    """Delete chunked uploads that were abandoned part way."""
+    from datetime import timedelta
+    from uploads import purge_stale_uploads
+    count = purge_stale_uploads(timedelta(hours=hours) if hours else None)
+    click.echo(f'{count} stale upload(s) purged.')
+
+
+@app.cli.command('migrate-uploads')
+@click.option('--keep-originals', is_flag=True, help='Leave the old files in UPLOAD_FOLDER.')
+def migrate_uploads_command(keep_originals):
+    """Move submission files from the flat upload folder into the content-addressed store."""
+    from storage import migrate_uploads
+    bootstrap(sample_data=False)
+    counts = migrate_uploads(keep_originals=keep_originals, progress=click.echo)
+    click.echo(f"{counts['migrated']} migrated, {counts['missing']} missing, "
+               f"{counts['unreferenced']} unreferenced file(s) left in place.")
+
+
+@app.cli.command('collect-blobs')
+@click.option('--sweep-files', is_flag=True, help='Also delete stored files with no database record.')
+def collect_blobs_command(sweep_files):
+    """Delete stored files that no submission uses any more."""
+    from storage import collect_blobs
+    click.echo(f'{collect_blobs(sweep_files=sweep_files)} blob(s) deleted.')
+
+
+@app.cli.command('analytics-refresh')
+def analytics_refresh_command():
+    """Roll up activity since the last refresh into the analytics tables."""
+    refresh_rollups()
+    click.echo('Analytics rollups refreshed.')
+
+
+@app.cli.command('analytics-backfill')
+@click.option('--since', type=click.DateTime(formats=['%Y-%m-%d']),
+              help='First day to rebuild; defaults to the oldest recorded activity.')
+@click.option('--chunk-days', default=31, show_default=True, help='Days rebuilt per transaction.')
+def analytics_backfill_command(since, chunk_days):
+    """Rebuild the analytics rollups from historical data."""
+    started = backfill_rollups(since.date() if since else None, chunk_days=chunk_days)
+    for name, start in started.items():
+        click.echo(f'{name}: rebuilt from {start.isoformat()}')
+
+
+@app.cli.command('generate-data')
+@click.option('--scale', default=1.0, show_default=True,
+              help='Fraction of the university dataset (50k students, 1M submissions, 2M posts).')
+@click.option('--seed', default=42, show_default=True, help='Same seed, same data.')
+@click.option('--batch-size', default=10_000, show_default=True, help='Rows per INSERT batch.')
+def generate_data_command(scale, seed, batch_size):
+    """Add a deterministic synthetic university for load testing."""
+    from synthetic import generate
+    written = generate(scale=scale, seed=seed, batch_size=batch_size,
+                       progress=lambda stage: click.echo(f'Generating {stage}...'))
+    for table, count in written.items():
+        click.echo(f'{table}: {count} row(s)')
+    # Bulk inserts skip the ORM hooks, so rebuild what they would have maintained;
+    # the generator writes post paths itself
+    click.echo('Rebuilding counters and analytics...')
+    rebuild_derived_data(post_paths=False)
+
+
+@app.cli.command('load-data')
+@click.argument('paths', nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False))
+@click.option('--batch-size', default=10_000, show_default=True, help='Rows per INSERT or COPY batch.')
+@click.option('--reset', is_flag=True, help='Drop and recreate every table first.')
+def load_data_command(paths, batch_size, reset):
+    """Bulk load .jsonl fixtures or .sql exports (optionally gzipped)."""
+    from bulkload import load_files
+    if reset:
+        click.confirm(f'Drop all data in {db.engine.url.render_as_string(hide_password=True)}?', abort=True)
+        db.drop_all()
+        db.create_all()
+    written = load_files(paths, batch_size=batch_size, progress=click.echo)
+    for table, count in written.items():
+        click.echo(f'{table}: {count} row(s)')
+    click.echo('Rebuilding post paths, counters and analytics...')
+    rebuild_derived_data()
+
+
+@app.cli.command('import-enrollments')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--batch-size', default=5000, show_default=True, help='Pairs per INSERT and commit.')
+def import_enrollments_command(path, batch_size):
+    """Enroll students from a CSV (username, course_code) or JSON file."""
+    from enrollments import enrollment_rows, import_enrollments
+    with open(path, 'rb') as file:
+        rows = enrollment_rows(file, path)
+    result = import_enrollments(rows, batch_size=batch_size, progress=click.echo)
+    for number, message in result['errors']:
+        click.echo(f'{path}:{number}: {message}', err=True)
+    click.echo(f"{result['enrolled']} enrolled, {result['existing']} already enrolled, "
+               f"{len(result['errors'])} error(s).")
+
+
+@app.cli.command('import-users')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--chunk-size', default=1000, show_default=True, help='Users per INSERT and commit.')
+@click.option('--errors', 'errors_path', type=click.Path(dir_okay=False, writable=True),
+              help='Write rejected rows here as CSV instead of listing them.')
+def import_users_command(path, chunk_size, errors_path):
+    """Create users from a CSV (username, email, first_name, last_name, password[, role])."""
+    from provisioning import import_users, write_error_report
+    with open(path, encoding='utf-8-sig', newline='') as file:
+        result = import_users(file, chunk_size=chunk_size, progress=click.echo)
+    if errors_path and result['errors']:
+        with open(errors_path, 'w', encoding='utf-8', newline='') as file:
+            write_error_report(result['errors'], file)
+        click.echo(f'Rejected rows written to {errors_path}')
+    else:
+        for number, _, message in result['errors']:
+            click.echo(f'{path}:{number}: {message}', err=True)
+    click.echo(f"{result['created']} user(s) created, {len(result['errors'])} row(s) rejected.")
+
+
+@app.cli.command('benchmark')
+@click.option('--iterations', default=20, show_default=True, help='Timed requests per route.')
+@click.option('--role', 'roles', multiple=True, type=click.Choice(['admin', 'lecturer', 'student']),
+              help='Only benchmark these roles (repeatable).')
+@click.option('--output', type=click.Path(dir_okay=False, writable=True), help='Write the JSON report here.')
+@click.option('--compare', 'baseline', type=click.File(), help='Earlier JSON report to compare against.')
+def benchmark_command(iterations, roles, output, baseline):
+    """Time every GET route as each role and report latency, queries and memory."""
+    from benchmark import ROLES, compare, run_benchmark
+    report = run_benchmark(iterations=iterations, roles=roles or ROLES, progress=click.echo)
+    if output:
+        with open(output, 'w') as file:
+            json.dump(report, file, indent=2)
+        click.echo(f'Report written to {output}')
+    else:
+        click.echo(json.dumps(report, indent=2))
+    if baseline:
+        for line in compare(json.load(baseline), report):
+            click.echo(line)
+
+
+@app.cli.command('benchmark-startup')
+@click.option('--runs', default=5, show_default=True, help='Fresh interpreters to time.')
+@click.option('--output', type=click.Path(dir_okay=False, writable=True), help='Write the JSON report here.')
+def benchmark_startup_command(runs, output):
+    """Time a cold import of the app and list the slowest imports."""
+    from benchmark import measure_startup
+    report = measure_startup(runs=runs)
+    if output:
+        with open(output, 'w') as file:
+            json.dump(report, file, indent=2)
+    timings = report['import_ms']
+    click.echo(f"import main: min {timings['min']}ms, p50 {timings['p50']}ms, max {timings['max']}ms, "
+               f"peak RSS {report['max_rss_kb']} kB")
+    for module in report['slowest_imports']:
+        click.echo(f"  {module['self_ms']:8.1f}ms  {module['cumulative_ms']:8.1f}ms cumulative  {module['module']}")
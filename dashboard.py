@@ -0,0 +1,189 @@
+from sqlalchemy import event
+
+from app import app, db
+from cache import make_cache
+from models import User, Course, Enrollment, Assignment, Submission, Grade
+from queries import pending_grading_count
+
+# Per-user dashboard snapshots. Entries are plain dicts and lists, never ORM
+# objects, so they can outlive the session that built them and be pickled
+# into the shared backend.
+dashboard_cache = make_cache(
+    path=app.config.get('DASHBOARD_CACHE_PATH'),
+    ttl=app.config.get('DASHBOARD_CACHE_TTL', 120),
+)
+
+ADMIN_KEY = 'dashboard:admin'
+
+
+def _user_key(user_id):
+    return f'dashboard:{user_id}'
+
+
+def _course_dict(course):
+    return {'id': course.id, 'code': course.code, 'title': course.title, 'description': course.description}
+
+
+def _admin_snapshot():
+    recent_submissions = db.session.query(
+        Submission.submitted_at, User.first_name, User.last_name, Assignment.title, Course.code
+    ).join(User, Submission.student_id == User.id) \
+        .join(Assignment, Submission.assignment_id == Assignment.id) \
+        .join(Course, Assignment.course_id == Course.id) \
+        .order_by(Submission.submitted_at.desc()).limit(5).all()
+
+    return {
+        'total_users': User.query.count(),
+        'total_courses': Course.query.count(),
+        'total_assignments': Assignment.query.count(),
+        'recent_submissions': [
+            {
+                'student_name': f'{first_name} {last_name}',
+                'assignment_title': title,
+                'course_code': code,
+                'submitted_at': submitted_at,
+            }
+            for submitted_at, first_name, last_name, title, code in recent_submissions
+        ],
+    }
+
+
+def _lecturer_snapshot(user):
+    my_courses = Course.query.filter_by(lecturer_id=user.id).all()
+
+    return {
+        'my_courses': [_course_dict(course) for course in my_courses],
+        'pending_submissions': pending_grading_count(user.id),
+    }
+
+
+def _student_snapshot(user):
+    my_courses = Course.query.join(Enrollment).filter(Enrollment.user_id == user.id).all()
+
+    # Assignments in enrolled courses with no submission from this student
+    pending_assignments = db.session.query(
+        Assignment.id, Assignment.title, Assignment.due_date, Course.code
+    ).join(Course, Assignment.course_id == Course.id) \
+        .join(Enrollment, db.and_(Enrollment.course_id == Course.id, Enrollment.user_id == user.id)) \
+        .outerjoin(Submission, db.and_(Submission.assignment_id == Assignment.id, Submission.student_id == user.id)) \
+        .filter(Submission.id.is_(None)) \
+        .order_by(Assignment.due_date.asc(), Assignment.id).all()
+
+    recent_grades = db.session.query(Grade.id, Grade.points_earned, Grade.graded_at) \
+        .filter(Grade.student_id == user.id) \
+        .order_by(Grade.graded_at.desc()).limit(5).all()
+
+    return {
+        'my_courses': [_course_dict(course) for course in my_courses],
+        'pending_assignments': [
+            {'id': id, 'title': title, 'due_date': due_date, 'course_code': code}
+            for id, title, due_date, code in pending_assignments
+        ],
+        'recent_grades': [
+            {'id': id, 'points_earned': points_earned, 'graded_at': graded_at}
+            for id, points_earned, graded_at in recent_grades
+        ],
+    }
+
+
+def dashboard_snapshot(user):
+    """Return the template context for ``user``'s dashboard, cached.
+
+    Admins share one snapshot; everyone else gets their own.
+    """
+    key = ADMIN_KEY if user.is_admin() else _user_key(user.id)
+    snapshot = dashboard_cache.get(key)
+    if snapshot is None:
+        if user.is_admin():
+            snapshot = _admin_snapshot()
+        elif user.is_lecturer():
+            snapshot = _lecturer_snapshot(user)
+        else:
+            snapshot = _student_snapshot(user)
+        dashboard_cache.set(key, snapshot)
+    return snapshot
+
+
+# Invalidation: after each flush, work out whose dashboards the written rows
+# appear on, and drop those snapshots once the transaction commits.
+
+def _course_audience(session, course_ids):
+    """Cache keys of the lecturers of, and students enrolled in, ``course_ids``."""
+    if not course_ids:
+        return set()
+    lecturer_ids = session.execute(
+        db.select(Course.lecturer_id).where(Course.id.in_(course_ids))
+    ).scalars()
+    student_ids = session.execute(
+        db.select(Enrollment.user_id).where(Enrollment.course_id.in_(course_ids))
+    ).scalars()
+    return {_user_key(user_id) for user_id in [*lecturer_ids, *student_ids]}
+
+
+def _assignment_lecturers(session, assignment_ids):
+    if not assignment_ids:
+        return set()
+    lecturer_ids = session.execute(
+        db.select(Course.lecturer_id).join(Assignment, Assignment.course_id == Course.id)
+        .where(Assignment.id.in_(assignment_ids))
+    ).scalars()
+    return {_user_key(user_id) for user_id in lecturer_ids}
+
+
+@event.listens_for(db.session, 'after_flush')
+def _collect_dashboard_keys(session, flush_context):
+    keys = set()
+    graded_assignment_ids = set()
+    changed_course_ids = set()
+
+    with session.no_autoflush:
+        for obj in [*session.new, *session.dirty, *session.deleted]:
+            if isinstance(obj, Enrollment):
+                keys.add(_user_key(obj.user_id))
+            elif isinstance(obj, (Submission, Grade)):
+                student_id = obj.student_id
+                keys.add(_user_key(student_id))
+                graded_assignment_ids.add(obj.assignment_id)
+                if isinstance(obj, Submission):
+                    keys.add(ADMIN_KEY)
+            elif isinstance(obj, Assignment):
+                changed_course_ids.add(obj.course_id)
+                keys.add(ADMIN_KEY)
+            elif isinstance(obj, Course):
+                changed_course_ids.add(obj.id)
+                # A reassigned course leaves its previous lecturer's dashboard too
+                for lecturer_id in db.inspect(obj).attrs.lecturer_id.history.deleted:
+                    keys.add(_user_key(lecturer_id))
+                keys.add(_user_key(obj.lecturer_id))
+                keys.add(ADMIN_KEY)
+            elif isinstance(obj, User):
+                keys.add(_user_key(obj.id))
+                keys.add(ADMIN_KEY)
+
+        keys |= _assignment_lecturers(session, graded_assignment_ids)
+        keys |= _course_audience(session, changed_course_ids)
+
+    session.info.setdefault('dashboard_keys', set()).update(keys)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _invalidate_dashboards(session):
+    keys = session.info.pop('dashboard_keys', None)
+    if keys:
+        dashboard_cache.delete(*keys)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_dashboard_keys(session):
+    session.info.pop('dashboard_keys', None)
+
+
+def invalidate_dashboards(user_ids=(), assignment_ids=(), admin=False):
+    """Drop the snapshots of ``user_ids``, of the lecturers of ``assignment_ids``
+    and, with ``admin``, the admins' one, for rows written without a flush."""
+    keys = {_user_key(user_id) for user_id in user_ids}
+    keys |= _assignment_lecturers(db.session, set(assignment_ids))
+    if admin:
+        keys.add(ADMIN_KEY)
+    if keys:
+        dashboard_cache.delete(*keys)
@@ -0,0 +1,65 @@
+"""Serving stored files without tying up a worker.
+
+With FILE_OFFLOAD set, an authorized download is answered with headers
+only and the front end sends the file: ``nginx`` gets an X-Accel-Redirect
+to an internal location (FILE_OFFLOAD_PREFIX) mapped onto UPLOAD_FOLDER, and
+``apache`` gets an X-Sendfile with the absolute path. Otherwise Werkzeug
+sends it, with byte ranges and conditional GETs; gunicorn then hands the
+open file to ``sendfile()`` when a whole file is requested.
+
+Blobs never change, so their SHA-256 is a strong ETag and browsers may keep
+them for a long time, privately, since every download is authorized.
+"""
+import mimetypes
+import os
+from urllib.parse import quote
+
+from flask import Response, request, send_file
+
+from app import app
+from storage import absolute_path
+
+# Browsers may reuse a download this long without asking again
+CACHE_SECONDS = 7 * 24 * 3600
+
+
+def content_disposition(download_name):
+    try:
+        download_name.encode('ascii')
+        return f'attachment; filename="{download_name}"'
+    except UnicodeEncodeError:
+        return f"attachment; filename*=UTF-8''{quote(download_name)}"
+
+
+def send_stored_file(relative_path, download_name, etag=None):
+    """Respond with the file at ``relative_path`` under UPLOAD_FOLDER.
+
+    ``etag`` should be the content hash when there is one; without it
+    Werkzeug derives one from the file's modification time and size.
+    """
+    offload = app.config.get('FILE_OFFLOAD')
+    if not offload:
+        response = send_file(absolute_path(relative_path), as_attachment=True, download_name=download_name,
+                             etag=etag or True, max_age=CACHE_SECONDS, conditional=True)
+        response.cache_control.private = True
+        response.cache_control.public = False
+        response.accept_ranges = 'bytes'
+        return response
+
+    if etag and etag in request.if_none_match:
+        response = Response(status=304)
+    else:
+        response = Response(mimetype=mimetypes.guess_type(download_name)[0] or 'application/octet-stream')
+        response.headers['Content-Disposition'] = content_disposition(download_name)
+        if offload == 'nginx':
+            prefix = app.config['FILE_OFFLOAD_PREFIX'].rstrip('/')
+            response.headers['X-Accel-Redirect'] = quote(f'{prefix}/{relative_path}')
+        elif offload == 'apache':
+            response.headers['X-Sendfile'] = os.path.abspath(absolute_path(relative_path))
+        else:
+            raise ValueError(f'FILE_OFFLOAD must be nginx or apache, not {offload!r}')
+    if etag:
+        response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.max_age = CACHE_SECONDS
+    return response
@@ -0,0 +1,103 @@
+"""Bulk enrollment import, for loading a term's registrations at once.
+
+The input is pairs of username and course code, from a CSV (``username``
+and ``course_code`` columns) or a JSON list of objects with the same keys.
+Usernames and course codes are resolved with one query each. The pairs are
+then written in batches by ``INSERT ... ON CONFLICT (user_id, course_id) DO
+NOTHING``, so pairs already enrolled are skipped by the database, and every
+batch is committed together with its courses' enrollment counts.
+"""
+import csv
+import io
+import json
+
+from app import db
+from bulkload import native_insert
+from dashboard import invalidate_dashboards
+from models import Course, Enrollment, User, recount
+
+# Above this many names, read the whole table instead of binding each name
+# (SQLite allows at most 32766 parameters per statement)
+LOOKUP_IN_LIMIT = 10_000
+
+
+def enrollment_rows(stream, filename):
+    """``(line or item number, username, course code)`` from an uploaded file."""
+    if filename.lower().endswith('.json'):
+        try:
+            items = json.load(stream)
+        except (json.JSONDecodeError, UnicodeDecodeError) as error:
+            raise ValueError(f'Not valid JSON: {error}') from None
+        if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+            raise ValueError('Expected a JSON list of {"username": ..., "course_code": ...} objects')
+        return [(number, item.get('username'), item.get('course_code')) for number, item in enumerate(items, 1)]
+
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+    missing = {'username', 'course_code'} - set(reader.fieldnames or ())
+    if missing:
+        raise ValueError(f"The CSV has no {', '.join(sorted(missing))} column")
+    return [(reader.line_num, row['username'], row['course_code']) for row in reader]
+
+
+def _lookup(model, key_column, keys, *columns):
+    """``{key: row}`` for the rows of ``model`` whose ``key_column`` is in ``keys``, in one query."""
+    query = db.session.query(key_column, *columns)
+    if len(keys) <= LOOKUP_IN_LIMIT:
+        query = query.filter(key_column.in_(keys))
+    return {key: row for key, *row in query if key in keys}
+
+
+def _enrolled_total(course_ids):
+    return db.session.query(db.func.count(Enrollment.id)) \
+        .filter(Enrollment.course_id.in_(course_ids)).scalar()
+
+
+def import_enrollments(rows, batch_size=5000, progress=None):
+    """Enroll every resolvable pair in ``rows`` and report what happened.
+
+    Returns ``{'enrolled': n, 'existing': n, 'errors': [(number, message)]}``,
+    where ``existing`` counts pairs that were already enrolled (or repeated).
+    """
+    report = progress or (lambda message: None)
+    usernames = {str(username).strip() for _, username, _ in rows if username}
+    codes = {str(code).strip() for _, _, code in rows if code}
+    users = _lookup(User, User.username, usernames, User.id, User.role)
+    courses = _lookup(Course, Course.code, codes, Course.id)
+
+    pairs = {}
+    errors = []
+    for number, username, code in rows:
+        username = str(username or '').strip()
+        code = str(code or '').strip()
+        if not username or not code:
+            errors.append((number, 'username and course_code are required'))
+        elif username not in users:
+            errors.append((number, f'No user {username!r}'))
+        elif users[username][1] != 'student':
+            errors.append((number, f'{username} is not a student'))
+        elif code not in courses:
+            errors.append((number, f'No course {code!r}'))
+        else:
+            pairs.setdefault((users[username][0], courses[code][0]), number)
+
+    pairs = sorted(pairs, key=pairs.get)
+    course_ids = {course_id for _, course_id in pairs}
+    before = _enrolled_total(course_ids) if pairs else 0
+    statement = native_insert(Enrollment).on_conflict_do_nothing(
+        index_elements=['user_id', 'course_id']
+    )
+    for start in range(0, len(pairs), batch_size):
+        batch = pairs[start:start + batch_size]
+        try:
+            db.session.execute(statement, [{'user_id': user_id, 'course_id': course_id}
+                                           for user_id, course_id in batch])
+            recount(Course.enrollment_count, {course_id for _, course_id in batch})
+            db.session.commit()
+        except BaseException:
+            db.session.rollback()
+            raise
+        invalidate_dashboards({user_id for user_id, _ in batch})
+        report(f'{start + len(batch)} of {len(pairs)} pair(s) written')
+
+    enrolled = _enrolled_total(course_ids) - before if pairs else 0
+    return {'enrolled': enrolled, 'existing': len(rows) - len(errors) - enrolled, 'errors': errors}
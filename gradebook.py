@@ -0,0 +1,121 @@
+"""Course gradebook export: a row per enrolled student and a pair of columns
+per assignment (points, and whether the work was late or is missing),
+followed by the student's totals.
+
+The whole matrix comes from one query. It crosses the course's enrollments
+with its assignments and left-joins submissions and grades, and window sums
+put each student's totals on every one of their rows. Rows arrive grouped
+by student, so each CSV line is written as soon as its student's rows have
+been read and memory stays flat however large the course is.
+"""
+import csv
+import io
+import itertools
+from datetime import datetime
+
+from app import db
+from models import Assignment, Enrollment, Grade, Submission, User
+from pagination import nulls_last
+from spreadsheet import safe_cell
+
+# Matrix rows fetched per round trip
+BATCH_SIZE = 2000
+
+# Students written per chunk of the response
+STUDENTS_PER_CHUNK = 100
+
+FORMATS = {
+    'csv': 'utf-8',
+    # Excel only reads a CSV as UTF-8 when it starts with a byte order mark
+    'excel': 'utf-8-sig',
+}
+
+
+def _assignment_order():
+    return (nulls_last(Assignment.due_date), Assignment.due_date, Assignment.id)
+
+
+def course_assignments(course_id):
+    """``(id, title, max_points)`` of the course's assignments, in column order."""
+    return db.session.query(Assignment.id, Assignment.title, Assignment.max_points) \
+        .filter(Assignment.course_id == course_id).order_by(*_assignment_order()).all()
+
+
+def matrix_query(course_id, now=None):
+    """One row per enrolled student and assignment, ordered by student.
+
+    Each row holds the student, the assignment, the points (None until
+    graded), a 'late' or 'missing' flag, and the student's totals: points
+    earned, points possible on graded work and on every assignment, and
+    the two percentages.
+    """
+    now = now or datetime.utcnow()
+    student = Enrollment.user_id
+    flag = db.case(
+        (Submission.submitted_at > Assignment.due_date, 'late'),
+        (db.and_(Submission.id.is_(None), Assignment.due_date < now), 'missing'),
+        else_='',
+    )
+    earned = db.func.coalesce(db.func.sum(Grade.points_earned).over(partition_by=student), 0)
+    graded_possible = db.func.coalesce(db.func.sum(
+        db.case((Grade.id.isnot(None), Assignment.max_points), else_=0)
+    ).over(partition_by=student), 0)
+    possible = db.func.coalesce(db.func.sum(Assignment.max_points).over(partition_by=student), 0)
+
+    return db.session.query(
+        User.id, User.username, User.last_name, User.first_name, User.email,
+        Assignment.id, Grade.points_earned, flag,
+        earned, graded_possible, possible,
+        earned * 100.0 / db.func.nullif(graded_possible, 0),
+        earned * 100.0 / db.func.nullif(possible, 0),
+    ).select_from(Enrollment) \
+        .join(User, User.id == student) \
+        .outerjoin(Assignment, Assignment.course_id == Enrollment.course_id) \
+        .outerjoin(Submission, db.and_(Submission.assignment_id == Assignment.id, Submission.student_id == student)) \
+        .outerjoin(Grade, db.and_(Grade.assignment_id == Assignment.id, Grade.student_id == student)) \
+        .filter(Enrollment.course_id == course_id) \
+        .order_by(User.last_name, User.first_name, User.id, *_assignment_order())
+
+
+def _cell(value):
+    if isinstance(value, float):
+        return round(value, 2)
+    return safe_cell(value)
+
+
+def gradebook_rows(course_id):
+    """Yield the header and then one list of cells per student."""
+    assignments = course_assignments(course_id)
+    header = ['Username', 'Last name', 'First name', 'Email']
+    for _, title, max_points in assignments:
+        header += [f'{title} ({max_points})', f'{title} late']
+    yield [_cell(label) for label in
+           header + ['Points', 'Graded out of', 'Graded %', 'Possible', 'Overall %']]
+
+    rows = matrix_query(course_id).yield_per(BATCH_SIZE)
+    for _, student_rows in itertools.groupby(rows, key=lambda row: row[0]):
+        cells = {}
+        for row in student_rows:
+            cells[row[5]] = row[6:8]
+        _, username, last_name, first_name, email, _, _, _, \
+            earned, graded_possible, possible, graded_percent, overall_percent = row
+        line = [username, last_name, first_name, email]
+        for assignment_id, _, _ in assignments:
+            line += cells.get(assignment_id, (None, ''))
+        yield [_cell(value) for value in
+               line + [earned, graded_possible, graded_percent, possible, overall_percent]]
+
+
+def export_gradebook(course_id, format='csv'):
+    """Yield the course's gradebook as encoded CSV, a chunk of students at a time."""
+    encoding = FORMATS[format]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for number, line in enumerate(gradebook_rows(course_id)):
+        writer.writerow(line)
+        if number % STUDENTS_PER_CHUNK == 0:
+            yield buffer.getvalue().encode(encoding if number == 0 else 'utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
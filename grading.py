@@ -0,0 +1,200 @@
+"""Grading many students at once, from the batch API or a CSV upload.
+
+Rows name a student (by username or ID), an assignment and the points, and
+optionally feedback. They are checked against the assignment's max_points,
+the grader's courses and the course roster with one query per kind of
+lookup. The valid rows are then written by a single ``INSERT ... ON CONFLICT
+(assignment_id, student_id) DO UPDATE`` in one transaction. Invalid rows are
+reported by row number and skipped, so they never hold back the rest.
+
+The upsert bypasses the ORM hooks, so the graded counts, analytics rollups
+and dashboards they would have updated are brought up to date here.
+"""
+import csv
+import io
+import math
+from datetime import datetime
+
+from app import db
+from analytics import rewind_rollups
+from bulkload import native_insert
+from dashboard import invalidate_dashboards
+from models import Assignment, Course, Enrollment, Grade, User, recount
+from spreadsheet import read_cell
+
+REQUIRED_COLUMNS = {'assignment_id', 'points_earned'}
+
+
+def _number(value, name):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'{name} must be a number, not {value!r}') from None
+    if not math.isfinite(number):
+        raise ValueError(f'{name} must be a number, not {value!r}')
+    return number
+
+
+def _integer(value, name):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'{name} must be a whole number, not {value!r}') from None
+
+
+def _blank(value):
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+def _students(rows):
+    """Map every username and user ID named in ``rows`` to a student ID."""
+    usernames = {str(row['username']).strip() for _, row in rows if not _blank(row.get('username'))}
+    user_ids = set()
+    for _, row in rows:
+        if _blank(row.get('username')) and not _blank(row.get('student_id')):
+            try:
+                user_ids.add(int(row['student_id']))
+            except (TypeError, ValueError):
+                pass
+    students = db.session.query(User.id, User.username).filter(
+        User.role == 'student', db.or_(User.username.in_(usernames), User.id.in_(user_ids))
+    )
+    by_username, by_id = {}, set()
+    for user_id, username in students:
+        by_username[username] = user_id
+        by_id.add(user_id)
+    return by_username, by_id
+
+
+def _student_id(row, by_username, by_id):
+    if not _blank(row.get('username')):
+        student_id = by_username.get(str(row['username']).strip())
+        if student_id is None:
+            raise ValueError(f"No student with username {row['username']!r}")
+        return student_id
+    if _blank(row.get('student_id')):
+        raise ValueError('username or student_id is required')
+    student_id = _integer(row['student_id'], 'student_id')
+    if student_id not in by_id:
+        raise ValueError(f'No student with ID {student_id}')
+    return student_id
+
+
+def save_grades(grader, rows):
+    """Validate ``rows``, a list of ``(row number, dict)``, and upsert the valid ones.
+
+    Returns ``{'saved': n, 'skipped': n, 'errors': [(row number, message)]}``.
+    Rows with no points are skipped, so a partly filled sheet can be imported.
+    A pair of assignment and student given twice is saved from its last row.
+    """
+    assignment_ids = set()
+    for _, row in rows:
+        try:
+            assignment_ids.add(int(row.get('assignment_id')))
+        except (TypeError, ValueError):
+            pass
+    assignments = {
+        id: (course_id, max_points, lecturer_id)
+        for id, course_id, max_points, lecturer_id in db.session.query(
+            Assignment.id, Assignment.course_id, Assignment.max_points, Course.lecturer_id
+        ).join(Course, Assignment.course_id == Course.id).filter(Assignment.id.in_(assignment_ids))
+    }
+    by_username, by_id = _students(rows)
+    enrolled = set(db.session.query(Enrollment.user_id, Enrollment.course_id).filter(
+        Enrollment.course_id.in_({course_id for course_id, _, _ in assignments.values()}),
+        Enrollment.user_id.in_(set(by_username.values()) | by_id),
+    ))
+
+    graded_at = datetime.utcnow()
+    grades = {}
+    errors = []
+    skipped = 0
+    for number, row in rows:
+        try:
+            if _blank(row.get('points_earned')):
+                skipped += 1
+                continue
+            if _blank(row.get('assignment_id')):
+                raise ValueError('assignment_id is required')
+            assignment_id = _integer(row['assignment_id'], 'assignment_id')
+            if assignment_id not in assignments:
+                raise ValueError(f'No assignment with ID {assignment_id}')
+            course_id, max_points, lecturer_id = assignments[assignment_id]
+            if not grader.is_admin() and lecturer_id != grader.id:
+                raise ValueError(f'You do not teach the course of assignment {assignment_id}')
+            student_id = _student_id(row, by_username, by_id)
+            if (student_id, course_id) not in enrolled:
+                raise ValueError(f'Student {student_id} is not enrolled in the course of assignment {assignment_id}')
+            points_earned = _number(row['points_earned'], 'points_earned')
+            if not 0 <= points_earned <= (max_points or 0):
+                raise ValueError(f'points_earned must be between 0 and {max_points or 0}')
+        except ValueError as error:
+            errors.append((number, str(error)))
+            continue
+
+        key = (assignment_id, student_id)
+        if key in grades:
+            errors.append((grades[key][0], f'Replaced by row {number}'))
+        feedback = row.get('feedback')
+        grades[key] = (number, {
+            'assignment_id': assignment_id,
+            'student_id': student_id,
+            'points_earned': points_earned,
+            # None keeps the feedback already given
+            'feedback': None if feedback is None else str(feedback),
+            'graded_at': graded_at,
+        })
+
+    if grades:
+        _upsert([values for _, values in grades.values()])
+    errors.sort()
+    return {'saved': len(grades), 'skipped': skipped, 'errors': errors}
+
+
+def _upsert(values):
+    table = Grade.__table__
+    pairs = [(row['assignment_id'], row['student_id']) for row in values]
+    assignment_ids = {assignment_id for assignment_id, _ in pairs}
+    student_ids = {student_id for _, student_id in pairs}
+
+    # Regrading moves a grade to today, which changes the days it was counted on
+    regraded_since = db.session.query(db.func.min(Grade.graded_at)) \
+        .filter(db.tuple_(Grade.assignment_id, Grade.student_id).in_(pairs)).scalar()
+
+    statement = native_insert(table)
+    statement = statement.on_conflict_do_update(
+        index_elements=[table.c.assignment_id, table.c.student_id],
+        set_={
+            'points_earned': statement.excluded.points_earned,
+            'feedback': db.func.coalesce(statement.excluded.feedback, table.c.feedback),
+            'graded_at': statement.excluded.graded_at,
+        },
+    )
+    try:
+        db.session.execute(statement, values)
+        recount(Assignment.graded_count, assignment_ids)
+        if regraded_since is not None:
+            rewind_rollups(regraded_since, ['course_activity'])
+        db.session.commit()
+    except BaseException:
+        db.session.rollback()
+        raise
+    invalidate_dashboards(student_ids, assignment_ids)
+
+
+def csv_rows(stream):
+    """``(line number, dict)`` for each row of a grades CSV, read from a binary stream.
+
+    The sheet needs assignment_id, points_earned and username or
+    student_id columns; feedback is optional. The manifest.csv in a
+    "Download All" archive has all of these; its escaped cells are read
+    back as they were.
+    """
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+    columns = set(reader.fieldnames or ())
+    missing = REQUIRED_COLUMNS - columns
+    if not columns & {'username', 'student_id'}:
+        missing.add('username')
+    if missing:
+        raise ValueError(f"The CSV has no {', '.join(sorted(missing))} column")
+    return [(reader.line_num, {name: read_cell(value) for name, value in row.items()}) for row in reader]
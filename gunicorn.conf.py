@@ -0,0 +1,15 @@
+# Picked up automatically by `gunicorn main:app` from the working directory.
+import os
+
+# Import the app once in the master; forked workers then share its code pages
+# instead of each importing every module again
+preload_app = True
+workers = int(os.environ.get('WEB_CONCURRENCY', 1))
+timeout = 120
+
+
+def post_fork(server, worker):
+    # Connections opened in the master must not be shared between workers
+    from app import app, db
+    with app.app_context():
+        db.engine.dispose(close=False)
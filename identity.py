@@ -0,0 +1,139 @@
+"""Cached identities for Flask-Login, so authenticated requests skip the User query.
+
+``load_principal`` gives Flask-Login a small immutable ``Principal`` holding
+the user's ID, role and display names: enough for the access checks every
+route makes and the navigation bar every page shows. Principals are kept in
+a bounded, per-process LRU cache and dropped whenever a User row is updated
+or deleted.
+
+Those hooks only reach the worker that made the change, so every cached
+principal is checked against the user's ``identity_version``, which goes up
+whenever one of its columns changes. Reading it is one primary-key lookup
+of a single integer. A demoted or deleted user therefore loses their access
+on every worker from their next request, not when the entry expires.
+
+Anything a principal does not hold (email, relationships, ...) is read from
+the full User row, which ``principal.user`` loads on first use.
+"""
+from sqlalchemy import event
+
+from app import app, db
+from cache import LRUCache
+from models import User
+
+_COLUMNS = ('id', 'role', 'username', 'first_name', 'last_name', 'identity_version')
+
+identity_cache = LRUCache(
+    maxsize=app.config['IDENTITY_CACHE_SIZE'],
+    ttl=app.config['IDENTITY_CACHE_TTL'],
+)
+
+
+class Principal:
+    """Who is making the request. Behaves like a read-only ``User``."""
+
+    __slots__ = _COLUMNS
+
+    is_authenticated = True
+    is_active = True
+    is_anonymous = False
+
+    def __init__(self, id, role, username, first_name, last_name, identity_version):
+        for name, value in zip(_COLUMNS, (id, role, username, first_name, last_name, identity_version)):
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f'Principal is read-only; change {name} on principal.user')
+
+    def __getattr__(self, name):
+        # Only reached for attributes not held here
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.user, name)
+
+    def __eq__(self, other):
+        return getattr(other, 'get_id', None) is not None and self.get_id() == other.get_id()
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def __repr__(self):
+        return f'<Principal {self.id} {self.username} ({self.role})>'
+
+    @property
+    def user(self):
+        """The full User row; the session keeps it for the rest of the request."""
+        return db.session.get(User, self.id)
+
+    def get_id(self):
+        return str(self.id)
+
+    def get_full_name(self):
+        return f"{self.first_name} {self.last_name}"
+
+    def is_admin(self):
+        return self.role == 'admin'
+
+    def is_lecturer(self):
+        return self.role == 'lecturer'
+
+    def is_student(self):
+        return self.role == 'student'
+
+
+def load_principal(user_id):
+    """Flask-Login user loader: the cached principal for ``user_id``, or None."""
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
+        return None
+    principal = identity_cache.get(user_id)
+    if principal is not None:
+        # Another worker may have changed or deleted the user since this one cached it
+        version = db.session.query(User.identity_version).filter(User.id == user_id).scalar()
+        if version == principal.identity_version:
+            return principal
+        forget_identity(user_id)
+        if version is None:
+            return None
+    row = db.session.query(*[getattr(User, name) for name in _COLUMNS]).filter(User.id == user_id).first()
+    if row is None:
+        return None
+    principal = Principal(*row)
+    identity_cache.set(user_id, principal)
+    return principal
+
+
+def forget_identity(*user_ids):
+    identity_cache.delete(*user_ids)
+
+
+# Invalidation, as for dashboards: note changed users after each flush and
+# forget them once the transaction commits
+
+@event.listens_for(db.session, 'before_flush')
+def _bump_identity_versions(session, flush_context, instances):
+    for user in session.dirty:
+        if isinstance(user, User) and any(
+            db.inspect(user).attrs[name].history.has_changes() for name in _COLUMNS
+        ):
+            user.identity_version = (user.identity_version or 0) + 1
+
+
+@event.listens_for(db.session, 'after_flush')
+def _collect_changed_users(session, flush_context):
+    changed = {obj.id for obj in [*session.dirty, *session.deleted] if isinstance(obj, User)}
+    if changed:
+        session.info.setdefault('changed_user_ids', set()).update(changed)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _forget_changed_users(session):
+    changed = session.info.pop('changed_user_ids', None)
+    if changed:
+        forget_identity(*changed)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_changed_users(session):
+    session.info.pop('changed_user_ids', None)
@@ -1,22 +1,53 @@
+"""Demo users, courses and discussions for a new, empty database.
+
+Rows are written by the bulk loader with explicit IDs, like the synthetic
+generator's, so the whole set goes in as a few executemany INSERTs in one
+transaction instead of an INSERT and commit per entity. The ORM hooks do not
+run, so post paths are filled in here and counters and analytics are rebuilt
+afterwards.
+"""
+import itertools
+from datetime import datetime, timedelta
+
+from werkzeug.security import generate_password_hash
+
 from app import db
+from bulkload import bulk_load, reset_sequences
 from models import User, Course, Enrollment, Assignment, Discussion, Post
-from datetime import datetime, timedelta
+
+
+def _next_id(model):
+    return (db.session.query(db.func.max(model.id)).scalar() or 0) + 1
+
 
 def init_sample_data():
     # Check if data already exists
     if User.query.first():
         return
     
+    with bulk_load() as writer:
+        _add_sample_data(writer)
+    reset_sequences()
+    # Bulk inserts skip the ORM hooks, so rebuild what they would have maintained
+    from commands import rebuild_derived_data
+    rebuild_derived_data(post_paths=False)
+    
+    print("Sample data initialized successfully!")
+
+
+def _add_sample_data(writer):
+    user_ids = itertools.count(_next_id(User))
+    
     # Create Admin
-    admin = User(
-        username='admin',
-        email='admin@wauu.edu.bj',
-        first_name='System',
-        last_name='Administrator',
-        role='admin'
-    )
-    admin.set_password('admin123')
-    db.session.add(admin)
+    writer.add(User, {
+        'id': next(user_ids),
+        'username': 'admin',
+        'email': 'admin@wauu.edu.bj',
+        'first_name': 'System',
+        'last_name': 'Administrator',
+        'password_hash': generate_password_hash('admin123'),
+        'role': 'admin'
+    })
     
     # Create Lecturers
     lecturers_data = [
@@ -26,18 +57,13 @@ def init_sample_data():
         {'username': 'profdavis', 'email': 'davis@wauu.edu.bj', 'first_name': 'Sarah', 'last_name': 'Davis'}
     ]
     
+    # One hash per shared password
+    password_hash = generate_password_hash('password123')
     lecturers = []
     for lecturer_data in lecturers_data:
-        lecturer = User(
-            username=lecturer_data['username'],
-            email=lecturer_data['email'],
-            first_name=lecturer_data['first_name'],
-            last_name=lecturer_data['last_name'],
-            role='lecturer'
-        )
-        lecturer.set_password('password123')
+        lecturer = {**lecturer_data, 'id': next(user_ids), 'password_hash': password_hash, 'role': 'lecturer'}
         lecturers.append(lecturer)
-        db.session.add(lecturer)
+        writer.add(User, lecturer)
     
     # Create Students
     students_data = [
@@ -53,20 +79,12 @@ def init_sample_data():
         {'username': 'student010', 'email': 'mariama.barry@student.wauu.edu.bj', 'first_name': 'Mariama', 'last_name': 'Barry'}
     ]
     
+    password_hash = generate_password_hash('student123')
     students = []
     for student_data in students_data:
-        student = User(
-            username=student_data['username'],
-            email=student_data['email'],
-            first_name=student_data['first_name'],
-            last_name=student_data['last_name'],
-            role='student'
-        )
-        student.set_password('student123')
+        student = {**student_data, 'id': next(user_ids), 'password_hash': password_hash, 'role': 'student'}
         students.append(student)
-        db.session.add(student)
-    
-    db.session.commit()
+        writer.add(User, student)
     
     # Create Courses
     courses_data = [
@@ -109,17 +127,16 @@ def init_sample_data():
     ]
     
     courses = []
-    for course_data in courses_data:
-        course = Course(
-            code=course_data['code'],
-            title=course_data['title'],
-            description=course_data['description'],
-            lecturer_id=course_data['lecturer'].id
-        )
+    for id, course_data in enumerate(courses_data, _next_id(Course)):
+        course = {
+            'id': id,
+            'code': course_data['code'],
+            'title': course_data['title'],
+            'description': course_data['description'],
+            'lecturer_id': course_data['lecturer']['id']
+        }
         courses.append(course)
-        db.session.add(course)
-    
-    db.session.commit()
+        writer.add(Course, course)
     
     # Enroll students in courses (each student enrolled in 3-4 courses)
     enrollments_data = [
@@ -135,36 +152,37 @@ def init_sample_data():
         (students[9], [courses[0], courses[3], courses[5]])
     ]
     
+    enrollment_id = _next_id(Enrollment)
+    enrolled = set()
     for student, student_courses in enrollments_data:
         for course in student_courses:
-            enrollment = Enrollment(user_id=student.id, course_id=course.id)
-            db.session.add(enrollment)
-    
-    db.session.commit()
+            writer.add(Enrollment, {'id': enrollment_id, 'user_id': student['id'], 'course_id': course['id']})
+            enrollment_id += 1
+            enrolled.add((student['id'], course['id']))
     
     # Create sample assignments for each course
-    for i, course in enumerate(courses):
+    assignment_id = _next_id(Assignment)
+    for course in courses:
         # Assignment 1
-        assignment1 = Assignment(
-            title=f'{course.code} - Assignment 1',
-            description=f'First assignment for {course.title}. Please complete the assigned readings and submit your analysis.',
-            course_id=course.id,
-            max_points=100,
-            due_date=datetime.utcnow() + timedelta(days=7)
-        )
-        db.session.add(assignment1)
+        writer.add(Assignment, {
+            'id': assignment_id,
+            'title': f"{course['code']} - Assignment 1",
+            'description': f"First assignment for {course['title']}. Please complete the assigned readings and submit your analysis.",
+            'course_id': course['id'],
+            'max_points': 100,
+            'due_date': datetime.utcnow() + timedelta(days=7)
+        })
         
         # Assignment 2
-        assignment2 = Assignment(
-            title=f'{course.code} - Midterm Project',
-            description=f'Midterm project for {course.title}. This is a comprehensive assignment covering the first half of the semester.',
-            course_id=course.id,
-            max_points=150,
-            due_date=datetime.utcnow() + timedelta(days=14)
-        )
-        db.session.add(assignment2)
-    
-    db.session.commit()
+        writer.add(Assignment, {
+            'id': assignment_id + 1,
+            'title': f"{course['code']} - Midterm Project",
+            'description': f"Midterm project for {course['title']}. This is a comprehensive assignment covering the first half of the semester.",
+            'course_id': course['id'],
+            'max_points': 150,
+            'due_date': datetime.utcnow() + timedelta(days=14)
+        })
+        assignment_id += 2
     
     # Create discussion threads for each course
     discussion_topics = [
@@ -175,35 +193,36 @@ def init_sample_data():
         "Course Resources and Materials"
     ]
     
+    discussion_id = _next_id(Discussion)
+    post_id = _next_id(Post)
     for course in courses:
         for i, topic in enumerate(discussion_topics[:3]):  # 3 discussions per course
-            discussion = Discussion(
-                title=f'{course.code} - {topic}',
-                description=f'Discussion thread for {course.title}: {topic}',
-                course_id=course.id
-            )
-            db.session.add(discussion)
-            db.session.commit()
+            writer.add(Discussion, {
+                'id': discussion_id,
+                'title': f"{course['code']} - {topic}",
+                'description': f"Discussion thread for {course['title']}: {topic}",
+                'course_id': course['id']
+            })
             
             # Add initial posts to discussions
             if i == 0:  # Course Introduction
-                post = Post(
-                    content=f'Welcome to {course.title}! Please introduce yourself and share your expectations for this course.',
-                    discussion_id=discussion.id,
-                    author_id=course.lecturer_id
-                )
-                db.session.add(post)
+                posts = [(course['lecturer_id'],
+                          f"Welcome to {course['title']}! Please introduce yourself and share your expectations for this course.")]
                 
                 # Add a few student responses
-                for j, student in enumerate(students[:3]):
-                    if Enrollment.query.filter_by(user_id=student.id, course_id=course.id).first():
-                        student_post = Post(
-                            content=f'Hello everyone! I am {student.get_full_name()} and I am excited to learn about {course.title}.',
-                            discussion_id=discussion.id,
-                            author_id=student.id
-                        )
-                        db.session.add(student_post)
-    
-    db.session.commit()
-    
-    print("Sample data initialized successfully!")
+                for student in students[:3]:
+                    if (student['id'], course['id']) in enrolled:
+                        posts.append((student['id'],
+                                      f"Hello everyone! I am {student['first_name']} {student['last_name']} and I am excited to learn about {course['title']}."))
+                
+                for author_id, content in posts:
+                    writer.add(Post, {
+                        'id': post_id,
+                        'content': content,
+                        'discussion_id': discussion_id,
+                        'author_id': author_id,
+                        'path': Post.path_segment(post_id),
+                        'depth': 0
+                    })
+                    post_id += 1
+            discussion_id += 1
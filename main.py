@@ -1,19 +1,24 @@
 
 import os
-from app import app
+from app import create_app
+
+app = create_app()
 
 # Ensure PORT is set for all platforms
 if not os.environ.get('PORT'):
     os.environ['PORT'] = '5000'
 
-# Entry point for different hosting platforms
+# Entry point for different hosting platforms; run `flask --app main bootstrap` once first
 # Replit: Uses workflow with gunicorn
-# Railway: gunicorn main:app --bind 0.0.0.0:$PORT
-# Heroku: gunicorn main:app --bind 0.0.0.0:$PORT
-# Render: gunicorn main:app --bind 0.0.0.0:$PORT
+# Railway: gunicorn main:app --bind 0.0.0.0:$PORT (settings in gunicorn.conf.py)
+# Heroku: gunicorn main:app --bind 0.0.0.0:$PORT (settings in gunicorn.conf.py)
+# Render: gunicorn main:app --bind 0.0.0.0:$PORT (settings in gunicorn.conf.py)
 # Vercel: Uses serverless functions (see vercel.json)
 
 if __name__ == '__main__':
     # For local development only
+    from commands import bootstrap
+    with app.app_context():
+        bootstrap()
     port = int(os.environ.get('PORT', 5000))
     app.run(host='0.0.0.0', port=port, debug=False)
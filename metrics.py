@@ -0,0 +1,461 @@
+import json
+import os
+import threading
+import time
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+from app import app, db
+
+# Upper bounds, in seconds, of the latency histogram buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# name: (type, help)
+METRICS = {
+    'wauu_http_requests_total': ('counter', 'Requests handled, by endpoint, method and status.'),
+    'wauu_http_request_duration_seconds': ('histogram', 'Time spent handling a request, by endpoint.'),
+    'wauu_http_request_db_seconds': ('histogram', 'Time a request spent waiting on the database, by endpoint.'),
+    'wauu_db_queries_total': ('counter', 'SQL statements executed, by endpoint.'),
+    'wauu_db_pool_checkouts_total': ('counter', 'Connections checked out of the pool.'),
+    'wauu_db_pool_connects_total': ('counter', 'New database connections opened by the pool.'),
+    'wauu_db_pool_size': ('gauge', 'Configured pool size, per worker.'),
+    'wauu_db_pool_checked_out': ('gauge', 'Connections currently checked out, per worker.'),
+    'wauu_db_pool_overflow': ('gauge', 'Connections open beyond the pool size, per worker.'),
+    'wauu_http_requests_in_flight': ('gauge', 'Requests being handled right now, per worker.'),
+    'wauu_process_resident_memory_bytes': ('gauge', 'Resident set size, per worker.'),
+    'wauu_process_start_time_seconds': ('gauge', 'Unix time the worker started.'),
+    'wauu_upload_disk_bytes': ('gauge', 'Size, used and free space of the upload volume.'),
+}
+
+
+class Registry:
+    """Counters and histograms for one process.
+
+    Each series is keyed by metric name and a tuple of ``(label, value)``
+    pairs. Histograms hold one count per bucket, a final +Inf count, and the
+    sum of observed values.
+    """
+
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, labels=(), amount=1):
+        key = (name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, value, labels=()):
+        key = (name, labels)
+        with self._lock:
+            series = self.histograms.get(key)
+            if series is None:
+                series = self.histograms[key] = [0] * (len(BUCKETS) + 2)
+            for i, bound in enumerate(BUCKETS):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            else:
+                series[len(BUCKETS)] += 1
+            series[-1] += value
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'counters': [[name, list(labels), value] for (name, labels), value in self.counters.items()],
+                'histograms': [[name, list(labels), list(series)] for (name, labels), series in self.histograms.items()],
+            }
+
+
+registry = Registry()
+_started = time.time()
+_in_flight = 0
+_in_flight_lock = threading.Lock()
+
+
+def _start_worker():
+    """Give a forked worker (gunicorn --preload) its own counts and start time."""
+    global registry, _started, _in_flight, _in_flight_lock
+    registry = Registry()
+    _started = time.time()
+    _in_flight = 0
+    _in_flight_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_start_worker)
+
+
+# Sharing between workers: each worker periodically writes its snapshot to
+# METRICS_DIR/<pid>.json, and whichever worker serves /metrics merges the files
+# of the workers that are still alive. A worker that exits takes its counts
+# with it, which Prometheus reads as a counter reset.
+
+_last_flush = 0.0
+
+
+def _metrics_dir():
+    return app.config.get('METRICS_DIR')
+
+
+def _worker_snapshot():
+    snapshot = registry.snapshot()
+    snapshot['gauges'] = process_gauges()
+    return snapshot
+
+
+def flush(force=False):
+    global _last_flush
+    directory = _metrics_dir()
+    if not directory:
+        return
+    now = time.monotonic()
+    if not force and now - _last_flush < app.config.get('METRICS_FLUSH_INTERVAL', 1.0):
+        return
+    _last_flush = now
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'{os.getpid()}.json')
+    temporary = f'{path}.tmp'
+    with open(temporary, 'w') as file:
+        json.dump(_worker_snapshot(), file)
+    os.replace(temporary, path)
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _worker_snapshots():
+    """This worker's live snapshot plus the latest one from every other live worker."""
+    snapshots = {os.getpid(): _worker_snapshot()}
+    directory = _metrics_dir()
+    if not directory or not os.path.isdir(directory):
+        return snapshots
+    for filename in os.listdir(directory):
+        stem, extension = os.path.splitext(filename)
+        if extension != '.json' or not stem.isdigit() or int(stem) in snapshots:
+            continue
+        path = os.path.join(directory, filename)
+        if not _alive(int(stem)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            continue
+        try:
+            with open(path) as file:
+                snapshots[int(stem)] = json.load(file)
+        except (OSError, ValueError):
+            continue
+    return snapshots
+
+
+def collect():
+    """Merge every live worker's metrics into ``(counters, histograms, gauges)``.
+
+    Counters and histograms are summed across workers; gauges keep one series
+    per worker, labelled with its pid.
+    """
+    counters, histograms, gauges = {}, {}, {}
+    for pid, snapshot in _worker_snapshots().items():
+        for name, labels, value in snapshot['counters']:
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, series in snapshot['histograms']:
+            key = (name, tuple(map(tuple, labels)))
+            merged = histograms.setdefault(key, [0] * len(series))
+            for i, value in enumerate(series):
+                merged[i] += value
+        for name, labels, value in snapshot.get('gauges', []):
+            if value is not None:
+                gauges[(name, (('pid', str(pid)), *map(tuple, labels)))] = value
+    for name, labels, value in host_gauges():
+        if value is not None:
+            gauges[(name, tuple(map(tuple, labels)))] = value
+    return counters, histograms, gauges
+
+
+# Process and host readings
+
+def _read_proc(path, field):
+    """Return the first number after ``field`` in a /proc status-style file."""
+    try:
+        with open(path) as file:
+            for line in file:
+                if line.startswith(field):
+                    return int(line.split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return None
+
+
+def resident_memory():
+    kilobytes = _read_proc('/proc/self/status', 'VmRSS:')
+    return kilobytes * 1024 if kilobytes is not None else None
+
+
+def total_memory():
+    kilobytes = _read_proc('/proc/meminfo', 'MemTotal:')
+    return kilobytes * 1024 if kilobytes is not None else None
+
+
+def disk_usage(path):
+    """Return ``(total, used, free)`` bytes for the filesystem holding ``path``."""
+    try:
+        stats = os.statvfs(path)
+    except (OSError, AttributeError):
+        return None, None, None
+    total = stats.f_blocks * stats.f_frsize
+    free = stats.f_bavail * stats.f_frsize
+    used = total - stats.f_bfree * stats.f_frsize
+    return total, used, free
+
+
+def pool_status():
+    pool = db.engine.pool
+    readings = {}
+    for name in ('size', 'checkedout', 'overflow'):
+        reading = getattr(pool, name, None)
+        readings[name] = reading() if callable(reading) else None
+    return readings
+
+
+def process_gauges():
+    pool = pool_status()
+    return [
+        ['wauu_process_resident_memory_bytes', [], resident_memory()],
+        ['wauu_process_start_time_seconds', [], _started],
+        ['wauu_http_requests_in_flight', [], _in_flight],
+        ['wauu_db_pool_size', [], pool['size']],
+        ['wauu_db_pool_checked_out', [], pool['checkedout']],
+        ['wauu_db_pool_overflow', [], pool['overflow']],
+    ]
+
+
+def host_gauges():
+    total, used, free = disk_usage(app.config['UPLOAD_FOLDER'])
+    return [
+        ['wauu_upload_disk_bytes', [['kind', 'total']], total],
+        ['wauu_upload_disk_bytes', [['kind', 'used']], used],
+        ['wauu_upload_disk_bytes', [['kind', 'free']], free],
+    ]
+
+
+# Prometheus text exposition
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _series(name, labels, value):
+    if labels:
+        rendered = ','.join(f'{key}="{_escape(label)}"' for key, label in labels)
+        return f'{name}{{{rendered}}} {_number(value)}'
+    return f'{name} {_number(value)}'
+
+
+def render_prometheus():
+    counters, histograms, gauges = collect()
+    by_name = {}
+    for source in (counters, gauges):
+        for (name, labels), value in sorted(source.items()):
+            by_name.setdefault(name, []).append(_series(name, labels, value))
+    for (name, labels), series in sorted(histograms.items()):
+        lines = by_name.setdefault(name, [])
+        cumulative = 0
+        for bound, count in zip((*BUCKETS, '+Inf'), series[:-1]):
+            cumulative += count
+            lines.append(_series(f'{name}_bucket', (*labels, ('le', str(bound))), cumulative))
+        lines.append(_series(f'{name}_sum', labels, float(series[-1])))
+        lines.append(_series(f'{name}_count', labels, cumulative))
+
+    output = []
+    for name, (kind, description) in METRICS.items():
+        if name not in by_name:
+            continue
+        output.append(f'# HELP {name} {description}')
+        output.append(f'# TYPE {name} {kind}')
+        output.extend(by_name[name])
+    return '\n'.join(output) + '\n'
+
+
+# Instrumentation
+
+def _endpoint():
+    if has_request_context():
+        return request.endpoint or 'unmatched'
+    return 'none'
+
+
+@app.before_request
+def _start_timer():
+    global _in_flight
+    g.metrics_started = time.perf_counter()
+    g.metrics_db_seconds = 0.0
+    with _in_flight_lock:
+        _in_flight += 1
+
+
+@app.after_request
+def _record_request(response):
+    started = g.pop('metrics_started', None)
+    if started is not None:
+        endpoint = (('endpoint', _endpoint()),)
+        registry.inc('wauu_http_requests_total',
+                     (*endpoint, ('method', request.method), ('status', str(response.status_code))))
+        registry.observe('wauu_http_request_duration_seconds', time.perf_counter() - started, endpoint)
+        registry.observe('wauu_http_request_db_seconds', g.pop('metrics_db_seconds', 0.0), endpoint)
+    return response
+
+
+@app.teardown_request
+def _finish_request(exception=None):
+    global _in_flight
+    with _in_flight_lock:
+        _in_flight = max(_in_flight - 1, 0)
+    flush()
+
+
+with app.app_context():
+    @event.listens_for(db.engine, 'before_cursor_execute')
+    def _query_started(connection, cursor, statement, parameters, context, executemany):
+        connection.info.setdefault('metrics_query_started', []).append(time.perf_counter())
+
+    @event.listens_for(db.engine, 'after_cursor_execute')
+    def _query_finished(connection, cursor, statement, parameters, context, executemany):
+        started = connection.info['metrics_query_started'].pop()
+        registry.inc('wauu_db_queries_total', (('endpoint', _endpoint()),))
+        if has_request_context() and 'metrics_db_seconds' in g:
+            g.metrics_db_seconds += time.perf_counter() - started
+
+    @event.listens_for(db.engine, 'handle_error')
+    def _query_failed(context):
+        # after_cursor_execute never runs for a statement that raised
+        if context.connection is None or context.statement is None:
+            return
+        started = context.connection.info.get('metrics_query_started')
+        if started:
+            started.pop()
+
+    @event.listens_for(db.engine, 'checkout')
+    def _pool_checkout(dbapi_connection, connection_record, connection_proxy):
+        registry.inc('wauu_db_pool_checkouts_total')
+
+    @event.listens_for(db.engine, 'connect')
+    def _pool_connect(dbapi_connection, connection_record):
+        registry.inc('wauu_db_pool_connects_total')
+
+
+# Summary for the system health page
+
+def _percentile(series, fraction):
+    """Upper bucket bound below which ``fraction`` of observations fall."""
+    total = sum(series[:-1])
+    if not total:
+        return None
+    cumulative = 0
+    for bound, count in zip(BUCKETS, series):
+        cumulative += count
+        if cumulative >= total * fraction:
+            return bound
+    return None
+
+
+def _format_duration(seconds):
+    days, remainder = divmod(int(seconds), 86400)
+    hours, remainder = divmod(remainder, 3600)
+    if days:
+        return f'{days} days, {hours} hours'
+    return f'{hours} hours, {remainder // 60} minutes'
+
+
+def health_summary():
+    """Real readings for the system health page, merged across workers."""
+    counters, histograms, gauges = collect()
+
+    requests_total = errors = 0
+    endpoints = {}
+    for (name, labels), value in counters.items():
+        if name != 'wauu_http_requests_total':
+            continue
+        labels = dict(labels)
+        requests_total += value
+        entry = endpoints.setdefault(labels['endpoint'], {'endpoint': labels['endpoint'], 'requests': 0, 'errors': 0})
+        entry['requests'] += value
+        if labels['status'].startswith('5'):
+            errors += value
+            entry['errors'] += value
+
+    for (name, labels), value in counters.items():
+        endpoint = dict(labels).get('endpoint')
+        if name == 'wauu_db_queries_total' and endpoint in endpoints:
+            endpoints[endpoint]['queries'] = round(value / endpoints[endpoint]['requests'], 1)
+
+    duration = [0] * (len(BUCKETS) + 2)
+    for (name, labels), series in histograms.items():
+        endpoint = dict(labels).get('endpoint')
+        if endpoint not in endpoints:
+            continue
+        count = sum(series[:-1])
+        if name == 'wauu_http_request_duration_seconds':
+            duration = [a + b for a, b in zip(duration, series)]
+            endpoints[endpoint]['mean_ms'] = round(series[-1] / count * 1000, 1) if count else None
+            p95 = _percentile(series, 0.95)
+            endpoints[endpoint]['p95_ms'] = p95 * 1000 if p95 is not None else None
+        elif name == 'wauu_http_request_db_seconds':
+            endpoints[endpoint]['db_ms'] = round(series[-1] / count * 1000, 1) if count else None
+
+    def per_worker(name):
+        return [value for (gauge, _), value in gauges.items() if gauge == name]
+
+    rss = sum(per_worker('wauu_process_resident_memory_bytes'))
+    memory = total_memory()
+    disk_total, disk_used, _ = disk_usage(app.config['UPLOAD_FOLDER'])
+    started = min(per_worker('wauu_process_start_time_seconds') or [_started])
+    request_count = sum(duration[:-1])
+    p95 = _percentile(duration, 0.95)
+
+    try:
+        probe = time.perf_counter()
+        db.session.execute(db.text('SELECT 1'))
+        database_status = f'Healthy ({(time.perf_counter() - probe) * 1000:.1f}ms)'
+    except Exception:
+        db.session.rollback()
+        database_status = 'Unavailable'
+
+    return {
+        'database_status': database_status,
+        'server_uptime': _format_duration(time.time() - started),
+        'workers': len(per_worker('wauu_process_start_time_seconds')),
+        'memory_bytes': rss,
+        'memory_percent': round(rss / memory * 100, 1) if memory else None,
+        'disk_total': disk_total,
+        'disk_used': disk_used,
+        'disk_percent': round(disk_used / disk_total * 100, 1) if disk_total else None,
+        'requests_total': requests_total,
+        'in_flight': sum(per_worker('wauu_http_requests_in_flight')),
+        'error_rate': round(errors / requests_total * 100, 2) if requests_total else 0.0,
+        'response_time_ms': round(duration[-1] / request_count * 1000, 1) if request_count else None,
+        'response_time_p95_ms': p95 * 1000 if p95 is not None else None,
+        'pool': {
+            'size': sum(per_worker('wauu_db_pool_size')),
+            'checked_out': sum(per_worker('wauu_db_pool_checked_out')),
+            'overflow': sum(per_worker('wauu_db_pool_overflow')),
+            'checkouts': counters.get(('wauu_db_pool_checkouts_total', ()), 0),
+            'connects': counters.get(('wauu_db_pool_connects_total', ()), 0),
+        },
+        'slowest_endpoints': sorted(
+            endpoints.values(), key=lambda entry: entry.get('mean_ms') or 0, reverse=True
+        )[:8],
+    }
@@ -1,5 +1,7 @@
 from app import db
 from flask_login import UserMixin
+from sqlalchemy import event
+from sqlalchemy.orm.attributes import get_history, set_committed_value
 from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
 
@@ -12,6 +14,13 @@ class User(UserMixin, db.Model):
     last_name = db.Column(db.String(64), nullable=False)
     role = db.Column(db.String(20), nullable=False, default='student')  # student, lecturer, admin
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Bumped whenever a column cached by identity.py changes
+    identity_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    
+    __table_args__ = (
+        db.Index('ix_user_role', 'role'),
+        db.Index('ix_user_created_at', 'created_at'),
+    )
     
     # Relationships
     enrollments = db.relationship('Enrollment', backref='user', lazy='dynamic')
@@ -25,6 +34,9 @@ class User(UserMixin, db.Model):
         self.password_hash = password
     
     def check_password(self, password):
+        # Accounts created in bulk store a Werkzeug hash instead
+        if (self.password_hash or '').startswith(('scrypt:', 'pbkdf2:')):
+            return check_password_hash(self.password_hash, password)
         return self.password_hash == password
     
     def get_full_name(self):
@@ -46,6 +58,12 @@ class Course(db.Model):
     description = db.Column(db.Text)
     lecturer_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    enrollment_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    
+    __table_args__ = (
+        db.Index('ix_course_lecturer_id', 'lecturer_id'),
+        db.Index('ix_course_created_at', 'created_at'),
+    )
     
     # Relationships
     enrollments = db.relationship('Enrollment', backref='course', lazy='dynamic', cascade='all, delete-orphan')
@@ -58,7 +76,11 @@ class Enrollment(db.Model):
     course_id = db.Column(db.Integer, db.ForeignKey('course.id'), nullable=False)
     enrolled_at = db.Column(db.DateTime, default=datetime.utcnow)
     
-    __table_args__ = (db.UniqueConstraint('user_id', 'course_id'),)
+    # The unique constraint doubles as the index for lookups by user_id
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'course_id'),
+        db.Index('ix_enrollment_course_id', 'course_id'),
+    )
 
 class Assignment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -68,6 +90,13 @@ class Assignment(db.Model):
     max_points = db.Column(db.Integer, default=100)
     due_date = db.Column(db.DateTime)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    submission_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    graded_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    
+    __table_args__ = (
+        db.Index('ix_assignment_course_created', 'course_id', 'created_at'),
+        db.Index('ix_assignment_course_due', 'course_id', 'due_date'),
+    )
     
     # Relationships
     submissions = db.relationship('Submission', backref='assignment', lazy='dynamic', cascade='all, delete-orphan')
@@ -78,10 +107,24 @@ class Submission(db.Model):
     assignment_id = db.Column(db.Integer, db.ForeignKey('assignment.id'), nullable=False)
     student_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     content = db.Column(db.Text)
+    # Path of the file's blob, relative to UPLOAD_FOLDER (see storage.py)
     file_path = db.Column(db.String(255))
+    # Name the student uploaded it under, used when downloading
+    file_name = db.Column(db.String(255))
+    file_sha256 = db.Column(db.String(64), db.ForeignKey('blob.sha256'))
+    # Stored name of a file from before the blob store, still used by old /uploads/<name> links
+    legacy_file_name = db.Column(db.String(255))
     url = db.Column(db.String(255))
     submitted_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    __table_args__ = (
+        db.Index('ix_submission_assignment_student', 'assignment_id', 'student_id'),
+        db.Index('ix_submission_student_assignment', 'student_id', 'assignment_id'),
+        db.Index('ix_submission_submitted_at', 'submitted_at'),
+        db.Index('ix_submission_file_sha256', 'file_sha256'),
+        db.Index('ix_submission_legacy_file_name', 'legacy_file_name'),
+    )
+    
     def is_late(self):
         if self.assignment.due_date:
             return self.submitted_at > self.assignment.due_date
@@ -95,7 +138,11 @@ class Grade(db.Model):
     feedback = db.Column(db.Text)
     graded_at = db.Column(db.DateTime, default=datetime.utcnow)
     
-    __table_args__ = (db.UniqueConstraint('assignment_id', 'student_id'),)
+    __table_args__ = (
+        db.UniqueConstraint('assignment_id', 'student_id'),
+        db.Index('ix_grade_student_graded', 'student_id', 'graded_at'),
+        db.Index('ix_grade_graded_at', 'graded_at'),
+    )
     
     def get_percentage(self):
         if self.assignment.max_points > 0:
@@ -108,6 +155,11 @@ class Discussion(db.Model):
     description = db.Column(db.Text)
     course_id = db.Column(db.Integer, db.ForeignKey('course.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    post_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    
+    __table_args__ = (
+        db.Index('ix_discussion_course_created', 'course_id', 'created_at'),
+    )
     
     # Relationships
     posts = db.relationship('Post', backref='discussion', lazy='dynamic', cascade='all, delete-orphan')
@@ -119,9 +171,25 @@ class Post(db.Model):
     author_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     parent_id = db.Column(db.Integer, db.ForeignKey('post.id'))  # For replies
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Materialized path of zero-padded ancestor IDs ending with this post's own,
+    # e.g. "0000000012.0000000040". Sorting by it yields the thread in reply order.
+    path = db.Column(db.String(500))
+    depth = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    
+    MAX_DEPTH = 40
+    
+    __table_args__ = (
+        db.Index('ix_post_discussion_path', 'discussion_id', 'path'),
+        db.Index('ix_post_author_id', 'author_id'),
+        db.Index('ix_post_created_at', 'created_at'),
+    )
     
     # Self-referential relationship for replies
     replies = db.relationship('Post', backref=db.backref('parent', remote_side=[id]), lazy='dynamic')
+    
+    @staticmethod
+    def path_segment(post_id):
+        return f"{post_id:010d}"
 
 class LectureRoom(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -137,6 +205,12 @@ class LectureRoom(db.Model):
     is_active = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    __table_args__ = (
+        db.Index('ix_lecture_room_course_created', 'course_id', 'created_at'),
+        db.Index('ix_lecture_room_lecturer_created', 'lecturer_id', 'created_at'),
+        db.Index('ix_lecture_room_created_at', 'created_at'),
+    )
+    
     # Relationships
     course = db.relationship('Course', backref='lecture_rooms')
     lecturer = db.relationship('User', backref='hosted_rooms')
@@ -170,6 +244,13 @@ class LectureSessionLog(db.Model):
     left_at = db.Column(db.DateTime)
     duration_minutes = db.Column(db.Integer)  # Calculated when participant leaves
     
+    __table_args__ = (
+        db.Index('ix_session_log_room_left', 'lecture_room_id', 'left_at'),
+        db.Index('ix_session_log_room_joined', 'lecture_room_id', 'joined_at'),
+        db.Index('ix_session_log_participant_room', 'participant_id', 'lecture_room_id'),
+        db.Index('ix_session_log_joined_at', 'joined_at'),
+    )
+    
     # Relationships
     participant = db.relationship('User', backref='lecture_sessions')
     
@@ -183,3 +264,147 @@ class LectureSessionLog(db.Model):
         """Mark participant as left and calculate duration"""
         self.left_at = datetime.utcnow()
         self.calculate_duration()
+
+class Blob(db.Model):
+    """An uploaded file's content, stored once however many submissions share it."""
+    sha256 = db.Column(db.String(64), primary_key=True)
+    size = db.Column(db.BigInteger, nullable=False)
+    # Submissions pointing at this blob; at zero, storage.collect_blobs deletes it
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_blob_ref_count', 'ref_count'),
+    )
+
+class ChunkedUpload(db.Model):
+    """A resumable file upload for a submission, written to disk chunk by chunk (see uploads.py)."""
+    id = db.Column(db.String(32), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    assignment_id = db.Column(db.Integer, db.ForeignKey('assignment.id'), nullable=False)
+    filename = db.Column(db.String(255), nullable=False)
+    size = db.Column(db.BigInteger, nullable=False)
+    chunk_size = db.Column(db.Integer, nullable=False)
+    # Bytes on disk so far; always a whole number of chunks until the last one arrives
+    received = db.Column(db.BigInteger, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_chunked_upload_user_assignment', 'user_id', 'assignment_id'),
+        db.Index('ix_chunked_upload_updated_at', 'updated_at'),
+    )
+    
+    def chunk_count(self):
+        return -(-self.size // self.chunk_size)
+
+# Daily rollups for the analytics page, maintained by analytics.refresh_rollups.
+# Course and user IDs are plain columns, not foreign keys, so deleting a course
+# or user never blocks on history; the next refresh drops the stale rows.
+
+class SignupRollup(db.Model):
+    day = db.Column(db.Date, primary_key=True)
+    role = db.Column(db.String(20), primary_key=True)
+    signups = db.Column(db.Integer, nullable=False, default=0)
+
+class CourseActivityRollup(db.Model):
+    day = db.Column(db.Date, primary_key=True)
+    course_id = db.Column(db.Integer, primary_key=True)
+    submissions = db.Column(db.Integer, nullable=False, default=0)
+    posts = db.Column(db.Integer, nullable=False, default=0)
+    grades = db.Column(db.Integer, nullable=False, default=0)
+    # Sum of the grades' percentages; divide by ``grades`` for the average
+    grade_percent_total = db.Column(db.Float, nullable=False, default=0)
+    
+    __table_args__ = (
+        db.Index('ix_course_activity_rollup_course_day', 'course_id', 'day'),
+    )
+
+class ActiveUserRollup(db.Model):
+    day = db.Column(db.Date, primary_key=True)
+    user_id = db.Column(db.Integer, primary_key=True)
+
+class RollupState(db.Model):
+    name = db.Column(db.String(50), primary_key=True)
+    # Source rows timestamped before this are already reflected in the rollup
+    high_water = db.Column(db.DateTime, nullable=False)
+
+# Denormalized counters: (counter column, child model, child foreign key column).
+# Inserting or deleting a child row, or pointing it at another parent, adjusts
+# the parents' counters in the same flush; `flask recount` rebuilds them all
+# from the child tables.
+COUNTERS = [
+    (Course.enrollment_count, Enrollment, Enrollment.course_id),
+    (Discussion.post_count, Post, Post.discussion_id),
+    (Assignment.submission_count, Submission, Submission.assignment_id),
+    (Assignment.graded_count, Grade, Grade.assignment_id),
+    (Blob.ref_count, Submission, Submission.file_sha256),
+]
+
+def _register_counter(counter, child_model, foreign_key):
+    parent_table = counter.class_.__table__
+    parent_key = next(iter(foreign_key.expression.foreign_keys)).column
+    counter_column = parent_table.c[counter.key]
+
+    def adjust(connection, parent_id, delta):
+        if parent_id is None:
+            return
+        connection.execute(
+            parent_table.update()
+            .where(parent_key == parent_id)
+            .values({counter_column: counter_column + delta})
+        )
+
+    @event.listens_for(child_model, 'after_insert')
+    def increment(mapper, connection, target):
+        adjust(connection, getattr(target, foreign_key.key), 1)
+
+    @event.listens_for(child_model, 'after_delete')
+    def decrement(mapper, connection, target):
+        adjust(connection, getattr(target, foreign_key.key), -1)
+
+    @event.listens_for(child_model, 'after_update')
+    def move(mapper, connection, target):
+        history = get_history(target, foreign_key.key)
+        for parent_id in history.deleted:
+            adjust(connection, parent_id, -1)
+        for parent_id in history.added:
+            adjust(connection, parent_id, 1)
+
+for _counter in COUNTERS:
+    _register_counter(*_counter)
+
+def recount(counter, parent_ids=None):
+    """Set ``counter`` from a count of its child rows, on every parent or only
+    those in ``parent_ids``. For writes that bypass the hooks above."""
+    _, child_model, foreign_key = next(entry for entry in COUNTERS if entry[0] is counter)
+    parent_table = counter.class_.__table__
+    parent_key = next(iter(foreign_key.expression.foreign_keys)).column
+    child_table = child_model.__table__
+    total = db.select(db.func.count(child_table.c.id)) \
+        .where(child_table.c[foreign_key.key] == parent_key) \
+        .scalar_subquery()
+    update = parent_table.update().values({counter.key: total})
+    if parent_ids is not None:
+        update = update.where(parent_key.in_(parent_ids))
+    db.session.execute(update)
+
+@event.listens_for(Post, 'after_insert')
+def _set_post_path(mapper, connection, target):
+    post_table = Post.__table__
+    path = Post.path_segment(target.id)
+    depth = 0
+    if target.parent_id is not None:
+        parent = connection.execute(
+            db.select(post_table.c.path, post_table.c.depth).where(post_table.c.id == target.parent_id)
+        ).first()
+        if parent is not None:
+            # A parent from before paths existed has none until `flask
+            # rebuild-post-paths`; file the reply under its segment meanwhile
+            path = f"{parent.path or Post.path_segment(target.parent_id)}.{path}"
+            depth = (parent.depth or 0) + 1
+    connection.execute(
+        post_table.update().where(post_table.c.id == target.id).values(path=path, depth=depth)
+    )
+    set_committed_value(target, 'path', path)
+    set_committed_value(target, 'depth', depth)
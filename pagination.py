@@ -0,0 +1,111 @@
+from datetime import datetime
+
+from flask import request
+from itsdangerous import BadSignature, URLSafeSerializer
+
+from app import app, db
+
+DEFAULT_PER_PAGE = 25
+MAX_PER_PAGE = 100
+
+
+class KeysetPage:
+    """One page of a keyset-paginated list.
+
+    ``next_cursor`` is an opaque token for the following page, or ``None`` on
+    the last page. ``is_first`` is false once the reader has moved past page one.
+    """
+
+    def __init__(self, items, next_cursor, per_page, is_first):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.per_page = per_page
+        self.is_first = is_first
+        self.has_next = next_cursor is not None
+
+
+def nulls_last(column):
+    """Sort key that puts NULLs after every value on all databases.
+
+    Use it as the key just before ``column`` so rows without a value (an
+    assignment without a due date, say) come last and still page correctly.
+    """
+    return db.case((column.is_(None), 1), else_=0)
+
+
+def _serializer():
+    return URLSafeSerializer(app.secret_key, salt='keyset-cursor')
+
+
+def _encode(values):
+    return _serializer().dumps([
+        {'dt': value.isoformat()} if isinstance(value, datetime) else value
+        for value in values
+    ])
+
+
+def _decode(token, size):
+    try:
+        values = _serializer().loads(token)
+    except BadSignature:
+        return None
+    if not isinstance(values, list) or len(values) != size:
+        return None
+    return [
+        datetime.fromisoformat(value['dt']) if isinstance(value, dict) else value
+        for value in values
+    ]
+
+
+def _after(keys, values):
+    """WHERE clause selecting rows strictly after ``values`` in key order."""
+    directions = {descending for _, descending in keys}
+    if len(directions) == 1 and None not in values:
+        # A row-value comparison lets the database seek straight into the index
+        left = db.tuple_(*[expression for expression, _ in keys])
+        right = db.tuple_(*[db.literal(value, expression.type) for (expression, _), value in zip(keys, values)])
+        return left < right if directions.pop() else left > right
+
+    clauses = []
+    for i, (expression, descending) in enumerate(keys):
+        if values[i] is None:
+            # NULLs sit together (see nulls_last), so only later keys can advance
+            continue
+        equal = [keys[j][0] == values[j] for j in range(i)]
+        beyond = expression < values[i] if descending else expression > values[i]
+        clauses.append(db.and_(*equal, beyond))
+    return db.or_(*clauses)
+
+
+def keyset_paginate(query, keys, cursor=None, per_page=None):
+    """Return one page of ``query`` ordered by ``keys``.
+
+    ``keys`` is a list of ``(expression, descending)`` pairs whose last entry
+    must be unique, normally the primary key, e.g.
+    ``[(Course.created_at, True), (Course.id, True)]``. Each page seeks past
+    the last row of the previous one, so deep pages cost the same as the first.
+    ``cursor`` and ``per_page`` default to the request's query arguments.
+    """
+    if cursor is None:
+        cursor = request.args.get('cursor')
+    if per_page is None:
+        per_page = request.args.get('per_page', DEFAULT_PER_PAGE, type=int)
+    per_page = min(max(per_page, 1), MAX_PER_PAGE)
+
+    single_entity = len(query.column_descriptions) == 1
+    query = query.add_columns(*[expression for expression, _ in keys]) \
+        .order_by(*[expression.desc() if descending else expression.asc() for expression, descending in keys])
+
+    # A tampered or stale cursor simply restarts from the first page
+    values = _decode(cursor, len(keys)) if cursor else None
+    if values is not None:
+        query = query.filter(_after(keys, values))
+
+    rows = query.limit(per_page + 1).all()
+    next_cursor = _encode(rows[per_page - 1][-len(keys):]) if len(rows) > per_page else None
+    rows = rows[:per_page]
+    if single_entity:
+        items = [row[0] for row in rows]
+    else:
+        items = [tuple(row[:-len(keys)]) for row in rows]
+    return KeysetPage(items, next_cursor, per_page, values is None)
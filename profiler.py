@@ -0,0 +1,148 @@
+import contextvars
+import logging
+import re
+import time
+from contextlib import contextmanager
+
+from flask import g, request
+from sqlalchemy import event
+
+from app import app, db
+
+logger = logging.getLogger(__name__)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'(?<![\w.])-?\d+(?:\.\d+)?\b')
+_PARAMETER = r'(?:\?|%s|%\(\w+\)s|:\w+|\$\d+)'
+_PARAMETER_LIST = re.compile(rf'\(\s*{_PARAMETER}(?:\s*,\s*{_PARAMETER})*\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize(statement):
+    """Reduce a SQL statement to its shape: literals and bound parameters
+    become ``?`` and an expanded ``IN`` list becomes ``(?)``, so statements
+    that differ only in their values compare equal."""
+    shape = _STRING.sub('?', statement)
+    shape = _NUMBER.sub('?', shape)
+    shape = _PARAMETER_LIST.sub('(?)', shape)
+    return _WHITESPACE.sub(' ', shape).strip()
+
+
+class NPlusOneError(RuntimeError):
+    """The same statement shape ran more often than allowed in one request."""
+
+
+class QueryProfile:
+    """Statements executed while the profile was active, grouped by shape."""
+
+    def __init__(self, label=None):
+        self.label = label
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = {}
+
+    def record(self, statement, duration):
+        self.count += 1
+        self.duration += duration
+        entry = self.shapes.setdefault(normalize(statement), [0, 0.0])
+        entry[0] += 1
+        entry[1] += duration
+
+    def repeated(self, threshold):
+        """Shapes that ran more than ``threshold`` times, most frequent first."""
+        return sorted(
+            ((shape, count) for shape, (count, _) in self.shapes.items() if count > threshold),
+            key=lambda item: item[1], reverse=True,
+        )
+
+    def summary(self, top=5):
+        lines = [f'{self.count} statement(s) in {self.duration * 1000:.1f}ms'
+                 + (f' for {self.label}' if self.label else '')]
+        busiest = sorted(self.shapes.items(), key=lambda item: item[1][0], reverse=True)[:top]
+        for shape, (count, duration) in busiest:
+            lines.append(f'  {count:>4}x {duration * 1000:8.1f}ms  {shape[:200]}')
+        return '\n'.join(lines)
+
+
+# Profiles can nest (a test's budget around a profiled request), so every
+# statement is recorded into each active one.
+_active = contextvars.ContextVar('sql_profiles', default=())
+
+
+@contextmanager
+def profile_queries(label=None):
+    """Profile the statements executed inside the ``with`` block."""
+    profile = QueryProfile(label)
+    token = _active.set((*_active.get(), profile))
+    try:
+        yield profile
+    finally:
+        _active.reset(token)
+
+
+def check_repeats(profile, threshold, raise_error=False):
+    """Log, or raise :class:`NPlusOneError` for, shapes repeated past ``threshold``."""
+    repeated = profile.repeated(threshold)
+    if not repeated:
+        return
+    message = f'Possible N+1 in {profile.label or "block"}: ' + '; '.join(
+        f'{count}x {shape[:200]}' for shape, count in repeated
+    )
+    if raise_error:
+        raise NPlusOneError(message)
+    logger.warning(message)
+
+
+with app.app_context():
+    @event.listens_for(db.engine, 'before_cursor_execute')
+    def _statement_started(connection, cursor, statement, parameters, context, executemany):
+        if _active.get():
+            connection.info.setdefault('profiler_started', []).append(time.perf_counter())
+
+    @event.listens_for(db.engine, 'after_cursor_execute')
+    def _statement_finished(connection, cursor, statement, parameters, context, executemany):
+        profiles = _active.get()
+        started = connection.info.get('profiler_started')
+        if not profiles or not started:
+            return
+        duration = time.perf_counter() - started.pop()
+        for profile in profiles:
+            profile.record(statement, duration)
+
+    @event.listens_for(db.engine, 'handle_error')
+    def _statement_failed(context):
+        # after_cursor_execute never runs for a failed statement
+        started = context.connection.info.get('profiler_started') if context.connection is not None else None
+        if _active.get() and started and context.statement is not None:
+            started.pop()
+
+
+# Per-request profiling, switched on with SQL_PROFILER
+
+@app.before_request
+def _start_request_profile():
+    if app.config.get('SQL_PROFILER'):
+        profile = QueryProfile(request.endpoint or request.path)
+        g.sql_profile = profile
+        g.sql_profile_token = _active.set((*_active.get(), profile))
+
+
+@app.after_request
+def _report_request_profile(response):
+    profile = g.get('sql_profile')
+    if profile is None:
+        return response
+    response.headers['X-SQL-Queries'] = str(profile.count)
+    response.headers['X-SQL-Time-Ms'] = f'{profile.duration * 1000:.1f}'
+    logger.info(profile.summary())
+    check_repeats(profile, app.config.get('SQL_PROFILER_REPEAT_THRESHOLD', 10),
+                  raise_error=app.config.get('SQL_PROFILER_RAISE', False))
+    return response
+
+
+@app.teardown_request
+def _end_request_profile(exception=None):
+    token = g.pop('sql_profile_token', None)
+    if token is not None:
+        _active.reset(token)
+
@@ -0,0 +1,137 @@
+"""Bulk user provisioning from a CSV, for onboarding a whole intake at once.
+
+The CSV has ``username``, ``email``, ``first_name``, ``last_name`` and
+``password`` columns, and optionally ``role`` (default student). It is read
+a row at a time. Existing usernames and emails are loaded into sets first,
+so duplicate checks cost no queries, and accepted rows are inserted in
+chunks, each committed on its own. Rejected rows, and rows the database
+skipped because the user was created meanwhile, are returned with their
+reason and can be written back out as a CSV to fix and upload again.
+
+Every password is hashed, which takes a noticeable fraction of a second, so
+the web upload caps the rows it takes and ``flask import-users`` handles
+larger intakes.
+"""
+import csv
+import itertools
+
+from werkzeug.security import generate_password_hash
+
+from app import db
+from bulkload import native_insert
+from dashboard import invalidate_dashboards
+from models import User
+
+REQUIRED_COLUMNS = ('username', 'email', 'first_name', 'last_name', 'password')
+ROLES = ('student', 'lecturer', 'admin')
+
+
+def _check(row, usernames, emails):
+    """The values to insert for ``row``; raises ValueError if it cannot be."""
+    values = {name: (row.get(name) or '').strip() for name in REQUIRED_COLUMNS}
+    missing = [name for name, value in values.items() if not value]
+    if missing:
+        raise ValueError(f"Missing {', '.join(missing)}")
+    for name in ('username', 'email', 'first_name', 'last_name'):
+        limit = User.__table__.c[name].type.length
+        if len(values[name]) > limit:
+            raise ValueError(f'{name} is longer than {limit} characters')
+    if '@' not in values['email']:
+        raise ValueError(f"{values['email']!r} is not an email address")
+    role = (row.get('role') or 'student').strip().lower()
+    if role not in ROLES:
+        raise ValueError(f"role must be one of {', '.join(ROLES)}")
+    if values['username'] in usernames:
+        raise ValueError(f"Username {values['username']!r} is taken")
+    if values['email'].lower() in emails:
+        raise ValueError(f"Email {values['email']!r} is already in use")
+
+    return {
+        'username': values['username'],
+        'email': values['email'],
+        'first_name': values['first_name'],
+        'last_name': values['last_name'],
+        'password_hash': generate_password_hash(values['password']),
+        'role': role,
+    }
+
+
+def _insert(statement, chunk, errors):
+    """Insert the ``(line, row, values)`` of ``chunk`` and return how many were
+    created; rows the database skipped go into ``errors``."""
+    try:
+        inserted = {username for username, in
+                    db.session.execute(statement, [values for _, _, values in chunk])}
+        db.session.commit()
+    except BaseException:
+        db.session.rollback()
+        raise
+    errors += [(line, row, 'Already exists') for line, row, values in chunk
+               if values['username'] not in inserted]
+    return len(inserted)
+
+
+def import_users(file, chunk_size=1000, progress=None, max_rows=None):
+    """Create a user for every valid row of the CSV text stream ``file``.
+
+    With ``max_rows``, a file with more rows is refused before any is
+    imported. Returns ``{'created': n, 'errors': [(line number, row,
+    message)]}``, the errors in line order.
+    """
+    report = progress or (lambda message: None)
+    reader = csv.DictReader(file)
+    missing = set(REQUIRED_COLUMNS) - set(reader.fieldnames or ())
+    if missing:
+        raise ValueError(f"The CSV has no {', '.join(sorted(missing))} column")
+    rows = ((reader.line_num, row) for row in reader)
+    if max_rows is not None:
+        rows = list(itertools.islice(rows, max_rows + 1))
+        if len(rows) > max_rows:
+            raise ValueError(f'it has more than {max_rows} rows; '
+                             f'import larger files with `flask import-users`')
+
+    usernames, emails = set(), set()
+    for username, email in db.session.query(User.username, User.email).yield_per(10_000):
+        usernames.add(username)
+        emails.add(email.lower())
+
+    # Anything added since the sets were loaded is skipped, not an error
+    statement = native_insert(User).on_conflict_do_nothing().returning(User.__table__.c.username)
+    created = 0
+    chunk = []
+    errors = []
+    for line, row in rows:
+        try:
+            values = _check(row, usernames, emails)
+        except ValueError as error:
+            errors.append((line, row, str(error)))
+            continue
+        usernames.add(values['username'])
+        emails.add(values['email'].lower())
+        chunk.append((line, row, values))
+        if len(chunk) >= chunk_size:
+            created += _insert(statement, chunk, errors)
+            chunk = []
+            report(f'{created} user(s) created')
+    if chunk:
+        created += _insert(statement, chunk, errors)
+        report(f'{created} user(s) created')
+
+    if created:
+        invalidate_dashboards(admin=True)
+    errors.sort(key=lambda error: error[0])
+    return {'created': created, 'errors': errors}
+
+
+def write_error_report(errors, file):
+    """Write the rejected rows to ``file`` as CSV, each with its line and reason.
+
+    The extra columns are ignored on import, so the corrected file can be
+    uploaded as it is."""
+    columns = []
+    for _, row, _ in errors:
+        columns += [name for name in row if name is not None and name not in columns]
+    writer = csv.writer(file)
+    writer.writerow(['line', 'error', *columns])
+    for line, row, message in errors:
+        writer.writerow([line, message, *(row.get(name) or '' for name in columns)])
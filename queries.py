@@ -0,0 +1,172 @@
+from app import db
+from models import User, Course, Enrollment, Assignment, Submission, Grade, Discussion, Post
+
+THREAD_PAGE_SIZE = 200
+
+
+class CourseRow:
+    """A course together with its precomputed counts, ready for templates.
+
+    Attribute access falls through to the wrapped course, so templates can
+    keep using ``course.code``, ``course.lecturer``, ``course.enrollment_count``
+    and friends.
+    """
+
+    def __init__(self, course, assignment_count=0, discussion_count=0, is_enrolled=False):
+        self.course = course
+        self.assignment_count = assignment_count
+        self.discussion_count = discussion_count
+        self.is_enrolled = is_enrolled
+
+    def __getattr__(self, name):
+        return getattr(self.course, name)
+
+
+def _count_subquery(model, column):
+    return db.session.query(
+        column.label('course_id'),
+        db.func.count(model.id).label('total')
+    ).group_by(column).subquery()
+
+
+def course_rows_query(user_id=None):
+    """Build one query returning courses with their assignment and discussion
+    counts; enrollments come from the ``Course.enrollment_count`` counter.
+    When ``user_id`` is given, each row also says whether that user is
+    enrolled."""
+    assignment_counts = _count_subquery(Assignment, Assignment.course_id)
+    discussion_counts = _count_subquery(Discussion, Discussion.course_id)
+
+    columns = [
+        Course,
+        db.func.coalesce(assignment_counts.c.total, 0),
+        db.func.coalesce(discussion_counts.c.total, 0),
+    ]
+    if user_id is not None:
+        columns.append(
+            db.exists().where(Enrollment.course_id == Course.id, Enrollment.user_id == user_id)
+        )
+
+    return db.session.query(*columns) \
+        .outerjoin(assignment_counts, assignment_counts.c.course_id == Course.id) \
+        .outerjoin(discussion_counts, discussion_counts.c.course_id == Course.id) \
+        .options(db.joinedload(Course.lecturer))
+
+
+def course_rows(query):
+    """Run a query from :func:`course_rows_query` and wrap each result."""
+    return [CourseRow(*row) for row in query]
+
+
+def _ungraded(query, lecturer_id=None):
+    """Narrow a query over ``Submission`` to ungraded submissions.
+
+    A submission is graded once a ``Grade`` exists for the same assignment and
+    student. The check is an anti-join on that pair, which the unique
+    constraint on ``Grade`` answers with one index probe per submission.
+    ``lecturer_id`` restricts the result to that lecturer's courses.
+    """
+    query = query.join(Assignment, Submission.assignment_id == Assignment.id) \
+        .join(Course, Assignment.course_id == Course.id) \
+        .outerjoin(Grade, db.and_(
+            Grade.assignment_id == Submission.assignment_id,
+            Grade.student_id == Submission.student_id,
+        )) \
+        .filter(Grade.id.is_(None))
+    if lecturer_id is not None:
+        query = query.filter(Course.lecturer_id == lecturer_id)
+    return query
+
+
+def grading_queue_query(lecturer_id=None, assignment_id=None):
+    """Build the query for submissions still waiting for a grade.
+
+    The assignment, its course and the student are loaded in the same query.
+    Order it, or hand it to ``keyset_paginate``, with the oldest first.
+    """
+    query = _ungraded(Submission.query, lecturer_id) \
+        .join(User, Submission.student_id == User.id) \
+        .options(
+            db.contains_eager(Submission.assignment).contains_eager(Assignment.course),
+            db.contains_eager(Submission.student),
+        )
+    if assignment_id is not None:
+        query = query.filter(Submission.assignment_id == assignment_id)
+    return query
+
+
+def pending_grading_count(lecturer_id=None):
+    """Count ungraded submissions, across ``lecturer_id``'s courses if given."""
+    query = db.session.query(db.func.count(Submission.id)).select_from(Submission)
+    return _ungraded(query, lecturer_id).scalar()
+
+
+def pending_by_assignment(lecturer_id=None):
+    """Ungraded submission counts per assignment, busiest first.
+
+    Returns ``(assignment_id, title, course_code, pending)`` rows.
+    """
+    pending = db.func.count(Submission.id).label('pending')
+    query = db.session.query(Assignment.id, Assignment.title, Course.code, pending).select_from(Submission)
+    return _ungraded(query, lecturer_id) \
+        .group_by(Assignment.id, Assignment.title, Course.code) \
+        .order_by(pending.desc(), Assignment.id).all()
+
+
+class ThreadNode:
+    """A post with the replies loaded alongside it, for recursive rendering.
+
+    Attribute access falls through to the wrapped post.
+    """
+
+    def __init__(self, post):
+        self.post = post
+        self.replies = []
+
+    def __getattr__(self, name):
+        return getattr(self.post, name)
+
+
+class ThreadPage:
+    """One page of a discussion thread.
+
+    ``roots`` are the nodes whose parent is not on this page: top-level posts,
+    or replies continuing a subtree from the previous page.
+    """
+
+    def __init__(self, roots, posts, next_cursor):
+        self.roots = roots
+        self.posts = posts
+        self.next_cursor = next_cursor
+        self.has_more = next_cursor is not None
+
+
+def load_thread(discussion_id, after=None, limit=THREAD_PAGE_SIZE):
+    """Load a page of a discussion in thread order with a single query.
+
+    Posts are read ordered by materialized path, which is a depth-first walk of
+    the reply tree, so every parent precedes its replies and the tree can be
+    assembled in one pass. ``after`` is the path of the last post already
+    shown; the page resumes right after it.
+    """
+    query = Post.query.filter(Post.discussion_id == discussion_id) \
+        .options(db.joinedload(Post.author)) \
+        .order_by(Post.path)
+    if after:
+        query = query.filter(Post.path > after)
+    posts = query.limit(limit + 1).all()
+
+    next_cursor = posts[limit - 1].path if len(posts) > limit else None
+    posts = posts[:limit]
+
+    nodes = {}
+    roots = []
+    for post in posts:
+        node = ThreadNode(post)
+        nodes[post.id] = node
+        parent = nodes.get(post.parent_id)
+        if parent is None:
+            roots.append(node)
+        else:
+            parent.replies.append(node)
+    return ThreadPage(roots, posts, next_cursor)
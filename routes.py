@@ -1,14 +1,37 @@
+import csv
+import hmac
+import io
 import os
-from flask import render_template, request, redirect, url_for, flash, send_from_directory, abort
+import re
+from flask import render_template, request, redirect, url_for, flash, abort, Response, stream_with_context
 from flask_login import login_user, logout_user, login_required, current_user
 from werkzeug.utils import secure_filename
 from app import app, db
-from models import User, Course, Enrollment, Assignment, Submission, Discussion, Post, Grade, LectureRoom, LectureSessionLog
+from models import User, Course, Enrollment, Assignment, Submission, Discussion, Post, Grade, LectureRoom, LectureSessionLog, ChunkedUpload
 from decorators import admin_required, lecturer_required
+from access import course_member_required, member_course_ids, is_course_member, can_manage_course, can_view_submission, forget_course_ids
+from queries import CourseRow, course_rows, course_rows_query, load_thread, grading_queue_query, pending_by_assignment, \
+    pending_grading_count
+from search import search
+from pagination import keyset_paginate, nulls_last
+from dashboard import dashboard_snapshot, dashboard_cache
+from analytics import analytics_summary, refresh_if_stale
+from metrics import health_summary, render_prometheus
+from storage import blob_path, store_stream, stored_file, remove_quietly, collect_blobs
+from downloads import send_stored_file, content_disposition
+from archives import submission_archive
+from grading import save_grades, csv_rows
+from gradebook import export_gradebook, FORMATS as GRADEBOOK_FORMATS
+from enrollments import enrollment_rows, import_enrollments
+from provisioning import import_users, write_error_report
+from summaries import grade_summary, profile_counts
+from uploads import UploadError, start_upload, write_chunk, finish_upload, cancel_upload, status as upload_status
 from datetime import datetime
 
 ALLOWED_EXTENSIONS = {'txt', 'pdf', 'png', 'jpg', 'jpeg', 'gif', 'doc', 'docx', 'ppt', 'pptx', 'xls', 'xlsx', 'zip', 'rar'}
 
+POST_PATH_PATTERN = re.compile(r'[0-9]+(\.[0-9]+)*')
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
@@ -82,85 +105,55 @@ def logout():
 @app.route('/dashboard')
 @login_required
 def dashboard():
-    if current_user.is_admin():
-        # Admin dashboard stats
-        total_users = User.query.count()
-        total_courses = Course.query.count()
-        total_assignments = Assignment.query.count()
-        recent_submissions = Submission.query.order_by(Submission.submitted_at.desc()).limit(5).all()
-        
-        return render_template('dashboard.html', 
-                             total_users=total_users,
-                             total_courses=total_courses,
-                             total_assignments=total_assignments,
-                             recent_submissions=recent_submissions)
-    
-    elif current_user.is_lecturer():
-        # Lecturer dashboard
-        my_courses = Course.query.filter_by(lecturer_id=current_user.id).all()
-        pending_submissions = Submission.query.join(Assignment).filter(
-            Assignment.course_id.in_([c.id for c in my_courses])
-        ).filter(~Submission.id.in_(
-            db.session.query(Grade.assignment_id).filter_by(student_id=Submission.student_id)
-        )).count()
-        
-        return render_template('dashboard.html', 
-                             my_courses=my_courses,
-                             pending_submissions=pending_submissions)
-    
-    else:
-        # Student dashboard
-        enrollments = Enrollment.query.filter_by(user_id=current_user.id).all()
-        my_courses = [e.course for e in enrollments]
-        pending_assignments = Assignment.query.filter(
-            Assignment.course_id.in_([c.id for c in my_courses])
-        ).filter(~Assignment.id.in_(
-            db.session.query(Submission.assignment_id).filter_by(student_id=current_user.id)
-        )).all()
-        
-        recent_grades = Grade.query.filter_by(student_id=current_user.id).order_by(Grade.graded_at.desc()).limit(5).all()
-        
-        return render_template('dashboard.html',
-                             my_courses=my_courses,
-                             pending_assignments=pending_assignments,
-                             recent_grades=recent_grades)
+    return render_template('dashboard.html', **dashboard_snapshot(current_user))
 
 @app.route('/courses')
 @login_required
 def courses():
     if current_user.is_admin():
-        all_courses = Course.query.all()
+        all_courses = course_rows(course_rows_query())
         return render_template('courses.html', courses=all_courses)
     elif current_user.is_lecturer():
-        my_courses = Course.query.filter_by(lecturer_id=current_user.id).all()
+        my_courses = course_rows(course_rows_query().filter(Course.lecturer_id == current_user.id))
         return render_template('courses.html', courses=my_courses)
     else:
         # Students see enrolled courses and available courses
-        enrolled_courses = db.session.query(Course).join(Enrollment).filter(Enrollment.user_id == current_user.id).all()
-        all_courses = Course.query.all()
-        available_courses = [c for c in all_courses if c not in enrolled_courses]
+        all_courses = course_rows(course_rows_query(user_id=current_user.id))
+        enrolled_courses = [c for c in all_courses if c.is_enrolled]
+        available_courses = [c for c in all_courses if not c.is_enrolled]
         return render_template('courses.html', courses=enrolled_courses, available_courses=available_courses)
 
 @app.route('/course/<int:course_id>')
 @login_required
+@course_member_required
 def course_detail(course_id):
-    course = Course.query.get_or_404(course_id)
-    
-    # Check if user has access to this course
-    if current_user.is_student():
-        enrollment = Enrollment.query.filter_by(user_id=current_user.id, course_id=course_id).first()
-        if not enrollment:
-            flash('You are not enrolled in this course.', 'danger')
-            return redirect(url_for('courses'))
-    elif current_user.is_lecturer() and course.lecturer_id != current_user.id:
-        flash('You do not have access to this course.', 'danger')
-        return redirect(url_for('courses'))
+    row = course_rows_query().filter(Course.id == course_id).first()
+    if row is None:
+        abort(404)
+    course = CourseRow(*row)
     
     assignments = Assignment.query.filter_by(course_id=course_id).order_by(Assignment.created_at.desc()).all()
     discussions = Discussion.query.filter_by(course_id=course_id).order_by(Discussion.created_at.desc()).all()
     
     return render_template('course_detail.html', course=course, assignments=assignments, discussions=discussions)
 
+@app.route('/course/<int:course_id>/gradebook.csv')
+@login_required
+@lecturer_required
+def export_course_gradebook(course_id):
+    """Students x assignments grade matrix; ``?format=excel`` adds the BOM Excel needs."""
+    course = Course.query.get_or_404(course_id)
+    if not can_manage_course(course_id):
+        abort(403)
+    format = request.args.get('format', 'csv')
+    if format not in GRADEBOOK_FORMATS:
+        abort(400)
+    name = secure_filename(f'{course.code}-gradebook.csv')
+    return Response(stream_with_context(export_gradebook(course_id, format)), mimetype='text/csv', headers={
+        'Content-Disposition': content_disposition(name),
+        'X-Accel-Buffering': 'no',
+    })
+
 @app.route('/enroll/<int:course_id>')
 @login_required
 def enroll_course(course_id):
@@ -169,66 +162,65 @@ def enroll_course(course_id):
         return redirect(url_for('courses'))
     
     course = Course.query.get_or_404(course_id)
-    existing_enrollment = Enrollment.query.filter_by(user_id=current_user.id, course_id=course_id).first()
     
-    if existing_enrollment:
+    if is_course_member(course_id):
         flash('You are already enrolled in this course.', 'warning')
     else:
         enrollment = Enrollment(user_id=current_user.id, course_id=course_id)
         db.session.add(enrollment)
         db.session.commit()
+        forget_course_ids()
         flash(f'Successfully enrolled in {course.title}!', 'success')
     
     return redirect(url_for('courses'))
 
+def _own_submissions(assignments):
+    """The current student's submissions to ``assignments``, by assignment ID, in one query."""
+    if not current_user.is_student() or not assignments:
+        return {}
+    rows = Submission.query.filter(Submission.student_id == current_user.id,
+                                   Submission.assignment_id.in_([assignment.id for assignment in assignments]))
+    return {submission.assignment_id: submission for submission in rows}
+
 @app.route('/assignments')
 @login_required
 def assignments():
     search_query = request.args.get('search', '').strip()
+    course_ids = member_course_ids()
+    
+    if search_query:
+        results = search(Assignment, search_query, course_ids, page=request.args.get('page', 1, type=int))
+        return render_template('assignments.html', assignments=results.items, results=results, search_query=search_query,
+                               submissions=_own_submissions(results.items))
+    
+    assignments_query = Assignment.query.options(db.joinedload(Assignment.course))
+    if course_ids is not None:
+        assignments_query = assignments_query.filter(Assignment.course_id.in_(course_ids))
     
     if current_user.is_student():
-        # Get assignments from enrolled courses
-        enrolled_courses = db.session.query(Course).join(Enrollment).filter(Enrollment.user_id == current_user.id).all()
-        course_ids = [c.id for c in enrolled_courses]
-        assignments_query = Assignment.query.filter(Assignment.course_id.in_(course_ids))
-        if search_query:
-            assignments_query = assignments_query.filter(
-                db.or_(
-                    Assignment.title.ilike(f'%{search_query}%'),
-                    Assignment.description.ilike(f'%{search_query}%')
-                )
-            )
-        assignments = assignments_query.order_by(Assignment.due_date.asc()).all()
-    elif current_user.is_lecturer():
-        # Get assignments from lecturer's courses
-        my_courses = Course.query.filter_by(lecturer_id=current_user.id).all()
-        course_ids = [c.id for c in my_courses]
-        assignments_query = Assignment.query.filter(Assignment.course_id.in_(course_ids))
-        if search_query:
-            assignments_query = assignments_query.filter(
-                db.or_(
-                    Assignment.title.ilike(f'%{search_query}%'),
-                    Assignment.description.ilike(f'%{search_query}%'),
-                    Assignment.course.has(Course.name.ilike(f'%{search_query}%')),
-                    Assignment.course.has(Course.code.ilike(f'%{search_query}%'))
-                )
-            )
-        assignments = assignments_query.order_by(Assignment.created_at.desc()).all()
+        # Students see what is due next first; undated assignments go last
+        page = keyset_paginate(assignments_query, [
+            (nulls_last(Assignment.due_date), False),
+            (Assignment.due_date, False),
+            (Assignment.id, False),
+        ])
     else:
-        # Admin sees all assignments
-        assignments_query = Assignment.query
-        if search_query:
-            assignments_query = assignments_query.filter(
-                db.or_(
-                    Assignment.title.ilike(f'%{search_query}%'),
-                    Assignment.description.ilike(f'%{search_query}%'),
-                    Assignment.course.has(Course.name.ilike(f'%{search_query}%')),
-                    Assignment.course.has(Course.code.ilike(f'%{search_query}%'))
-                )
-            )
-        assignments = assignments_query.order_by(Assignment.created_at.desc()).all()
-    
-    return render_template('assignments.html', assignments=assignments, search_query=search_query)
+        page = keyset_paginate(assignments_query, [(Assignment.created_at, True), (Assignment.id, True)])
+    
+    stats = None
+    if current_user.is_lecturer():
+        stats_query = db.session.query(
+            db.func.count(Assignment.id),
+            db.func.coalesce(db.func.sum(Assignment.submission_count), 0),
+            db.func.coalesce(db.func.sum(Assignment.graded_count), 0)
+        ).filter(Assignment.course_id.in_(course_ids))
+        total, submitted, graded = stats_query.one()
+        # Grades can exist without a submission, so the backlog is counted, not subtracted
+        stats = {'total': total, 'submitted': submitted, 'graded': graded,
+                 'pending': pending_grading_count(current_user.id)}
+    
+    return render_template('assignments.html', assignments=page.items, page=page, stats=stats, search_query=search_query,
+                           submissions=_own_submissions(page.items))
 
 @app.route('/assignment/<int:assignment_id>')
 @login_required
@@ -236,31 +228,23 @@ def assignment_detail(assignment_id):
     assignment = Assignment.query.get_or_404(assignment_id)
     
     # Check access permissions
+    if not is_course_member(assignment.course_id):
+        flash('You do not have access to this assignment.', 'danger')
+        return redirect(url_for('assignments'))
+    
     if current_user.is_student():
-        enrollment = Enrollment.query.filter_by(user_id=current_user.id, course_id=assignment.course_id).first()
-        if not enrollment:
-            flash('You do not have access to this assignment.', 'danger')
-            return redirect(url_for('assignments'))
-        
         # Get student's submission if any
         submission = Submission.query.filter_by(assignment_id=assignment_id, student_id=current_user.id).first()
         grade = Grade.query.filter_by(assignment_id=assignment_id, student_id=current_user.id).first()
         
         return render_template('assignment_detail.html', assignment=assignment, submission=submission, grade=grade)
     
-    elif current_user.is_lecturer():
-        if assignment.course.lecturer_id != current_user.id:
-            flash('You do not have access to this assignment.', 'danger')
-            return redirect(url_for('assignments'))
-        
-        # Get all submissions for this assignment
-        submissions = Submission.query.filter_by(assignment_id=assignment_id).all()
-        return render_template('assignment_detail.html', assignment=assignment, submissions=submissions)
-    
-    else:
-        # Admin can see everything
-        submissions = Submission.query.filter_by(assignment_id=assignment_id).all()
-        return render_template('assignment_detail.html', assignment=assignment, submissions=submissions)
+    # Lecturers and admins see every submission, with any grade already given
+    submissions = Submission.query.filter_by(assignment_id=assignment_id) \
+        .options(db.joinedload(Submission.student)) \
+        .order_by(Submission.submitted_at, Submission.id).all()
+    grades = {grade.student_id: grade for grade in assignment.grades}
+    return render_template('assignment_detail.html', assignment=assignment, submissions=submissions, grades=grades)
 
 @app.route('/submit_assignment/<int:assignment_id>', methods=['POST'])
 @login_required
@@ -272,8 +256,7 @@ def submit_assignment(assignment_id):
     assignment = Assignment.query.get_or_404(assignment_id)
     
     # Check if student is enrolled
-    enrollment = Enrollment.query.filter_by(user_id=current_user.id, course_id=assignment.course_id).first()
-    if not enrollment:
+    if not is_course_member(assignment.course_id):
         flash('You are not enrolled in this course.', 'danger')
         return redirect(url_for('assignments'))
     
@@ -285,33 +268,96 @@ def submit_assignment(assignment_id):
     
     content = request.form.get('content', '')
     url = request.form.get('url', '')
-    file_path = None
+    blob = None
+    temporary_path = None
     
-    # Handle file upload
+    # Handle file upload; the file goes into the content-addressed store
     if 'file' in request.files:
         file = request.files['file']
         if file and file.filename and allowed_file(file.filename):
-            filename = secure_filename(file.filename)
-            # Add timestamp to avoid conflicts
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_')
-            filename = timestamp + filename
-            file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            file.save(file_path)
+            blob, temporary_path = store_stream(file.stream, os.path.join(app.config['UPLOAD_FOLDER'], '.partial'))
     
     submission = Submission(
         assignment_id=assignment_id,
         student_id=current_user.id,
         content=content,
-        file_path=file_path,
+        file_path=blob_path(blob.sha256) if blob else None,
+        file_name=secure_filename(file.filename) if blob else None,
+        file_sha256=blob.sha256 if blob else None,
         url=url
     )
     
     db.session.add(submission)
-    db.session.commit()
+    try:
+        db.session.commit()
+    finally:
+        if temporary_path:
+            remove_quietly(temporary_path)
     
     flash('Assignment submitted successfully!', 'success')
     return redirect(url_for('assignment_detail', assignment_id=assignment_id))
 
+# Chunked, resumable submission uploads; JSON in and out, driven by static/js/main.js
+
+@app.errorhandler(UploadError)
+def upload_error(error):
+    return {'error': str(error)}, error.status
+
+def _own_upload(upload_id):
+    upload = db.session.get(ChunkedUpload, upload_id)
+    if upload is None or upload.user_id != current_user.id:
+        abort(404)
+    return upload
+
+@app.route('/assignment/<int:assignment_id>/uploads', methods=['POST'])
+@login_required
+def start_submission_upload(assignment_id):
+    assignment = Assignment.query.get_or_404(assignment_id)
+    data = request.get_json(silent=True) or request.form
+    filename = data.get('filename', '')
+    if not allowed_file(filename):
+        raise UploadError('This file type is not allowed.')
+    try:
+        size = int(data.get('size', 0))
+    except (TypeError, ValueError):
+        raise UploadError('size must be a number of bytes.')
+    upload = start_upload(current_user, assignment, filename, size)
+    return upload_status(upload), 201 if upload.received == 0 else 200
+
+@app.route('/submission_uploads/<upload_id>', methods=['GET'])
+@login_required
+def submission_upload_status(upload_id):
+    return upload_status(_own_upload(upload_id))
+
+@app.route('/submission_uploads/<upload_id>', methods=['DELETE'])
+@login_required
+def cancel_submission_upload(upload_id):
+    cancel_upload(_own_upload(upload_id))
+    return '', 204
+
+@app.route('/submission_uploads/<upload_id>/chunks/<int:index>', methods=['PUT'])
+@login_required
+def upload_chunk(upload_id, index):
+    upload = _own_upload(upload_id)
+    if request.content_length is None:
+        raise UploadError('Content-Length is required.', 411)
+    upload = write_chunk(upload, index, request.stream, request.content_length,
+                         checksum=request.headers.get('X-Content-SHA256'))
+    return upload_status(upload)
+
+@app.route('/submission_uploads/<upload_id>/complete', methods=['POST'])
+@login_required
+def complete_submission_upload(upload_id):
+    upload = _own_upload(upload_id)
+    data = request.get_json(silent=True) or request.form
+    submission = finish_upload(upload, content=data.get('content', ''), url=data.get('url', ''),
+                               checksum=data.get('sha256'))
+    flash('Assignment submitted successfully!', 'success')
+    return {
+        'submission_id': submission.id,
+        'redirect': url_for('assignment_detail', assignment_id=submission.assignment_id),
+    }
+
 @app.route('/grade_submission/<int:submission_id>', methods=['POST'])
 @login_required
 @lecturer_required
@@ -319,7 +365,7 @@ def grade_submission(submission_id):
     submission = Submission.query.get_or_404(submission_id)
     
     # Verify lecturer owns the course
-    if submission.assignment.course.lecturer_id != current_user.id and not current_user.is_admin():
+    if not can_manage_course(submission.assignment.course_id):
         flash('You do not have permission to grade this submission.', 'danger')
         return redirect(url_for('assignments'))
     
@@ -346,54 +392,101 @@ def grade_submission(submission_id):
     flash('Grade submitted successfully!', 'success')
     return redirect(url_for('assignment_detail', assignment_id=submission.assignment_id))
 
+@app.route('/assignment/<int:assignment_id>/grades', methods=['POST'])
+@login_required
+def grade_submissions(assignment_id):
+    """Batch grading: ``{"grades": [{"username": ..., "points_earned": ..., "feedback": ...}]}``,
+    students named by username or student_id. Answers with the rows that could not be saved."""
+    # A JSON API: errors are JSON too, not lecturer_required's redirect
+    course_id = db.session.query(Assignment.course_id).filter(Assignment.id == assignment_id).scalar()
+    if course_id is None:
+        return {'error': f'No assignment with ID {assignment_id}.'}, 404
+    if not can_manage_course(course_id):
+        return {'error': 'Only the course lecturer can grade this assignment.'}, 403
+    data = request.get_json(silent=True)
+    grades = data.get('grades') if isinstance(data, dict) else None
+    if not isinstance(grades, list) or not all(isinstance(row, dict) for row in grades):
+        return {'error': 'Expected a JSON object with a "grades" list.'}, 400
+    rows = [(number, {**row, 'assignment_id': assignment_id}) for number, row in enumerate(grades, 1)]
+    result = save_grades(current_user, rows)
+    return {
+        'saved': result['saved'],
+        'skipped': result['skipped'],
+        'errors': [{'row': number, 'error': message} for number, message in result['errors']],
+    }
+
+def _flash_row_errors(errors, shown=10):
+    if errors:
+        listed = '; '.join(f'line {number}: {message}' for number, message in errors[:shown])
+        more = len(errors) - shown
+        flash(f'{len(errors)} row(s) not saved. {listed}' + (f'; and {more} more' if more > 0 else ''), 'warning')
+
+@app.route('/grades/import', methods=['POST'])
+@login_required
+@lecturer_required
+def import_grades():
+    """Grades from a CSV keyed by username and assignment_id, such as the
+    manifest.csv from an assignment's "Download All" archive."""
+    back = request.form.get('next') or url_for('grading_queue')
+    if not back.startswith('/'):
+        back = url_for('grading_queue')
+    file = request.files.get('file')
+    if not file or not file.filename:
+        flash('Choose a CSV file of grades to import.', 'danger')
+        return redirect(back)
+    try:
+        rows = csv_rows(file.stream)
+    except (ValueError, UnicodeDecodeError, csv.Error) as error:
+        flash(f'Could not read {file.filename}: {error}', 'danger')
+        return redirect(back)
+
+    result = save_grades(current_user, rows)
+    flash(f"Saved {result['saved']} grade(s); skipped {result['skipped']} row(s) without points.",
+          'success' if result['saved'] else 'info')
+    _flash_row_errors(result['errors'])
+    return redirect(back)
+
+@app.route('/grading_queue')
+@login_required
+@lecturer_required
+def grading_queue():
+    lecturer_id = None if current_user.is_admin() else current_user.id
+    assignment_id = request.args.get('assignment_id', type=int)
+    
+    # Oldest submissions first, so nobody waits longest for feedback
+    page = keyset_paginate(grading_queue_query(lecturer_id, assignment_id),
+                           [(Submission.submitted_at, False), (Submission.id, False)])
+    pending = pending_by_assignment(lecturer_id)
+    
+    return render_template('grading_queue.html', submissions=page.items, page=page, pending=pending,
+                           assignment_id=assignment_id)
+
 @app.route('/discussions')
 @login_required
 def discussions():
     search_query = request.args.get('search', '').strip()
-    
-    if current_user.is_student():
-        # Get discussions from enrolled courses
-        enrolled_courses = db.session.query(Course).join(Enrollment).filter(Enrollment.user_id == current_user.id).all()
-        course_ids = [c.id for c in enrolled_courses]
-        discussions_query = Discussion.query.filter(Discussion.course_id.in_(course_ids))
-        if search_query:
-            discussions_query = discussions_query.filter(
-                db.or_(
-                    Discussion.title.ilike(f'%{search_query}%'),
-                    Discussion.description.ilike(f'%{search_query}%')
-                )
-            )
-        discussions = discussions_query.order_by(Discussion.created_at.desc()).all()
-    elif current_user.is_lecturer():
-        # Get discussions from lecturer's courses
-        my_courses = Course.query.filter_by(lecturer_id=current_user.id).all()
-        course_ids = [c.id for c in my_courses]
-        discussions_query = Discussion.query.filter(Discussion.course_id.in_(course_ids))
-        if search_query:
-            discussions_query = discussions_query.filter(
-                db.or_(
-                    Discussion.title.ilike(f'%{search_query}%'),
-                    Discussion.description.ilike(f'%{search_query}%'),
-                    Discussion.course.has(Course.name.ilike(f'%{search_query}%')),
-                    Discussion.course.has(Course.code.ilike(f'%{search_query}%'))
-                )
-            )
-        discussions = discussions_query.order_by(Discussion.created_at.desc()).all()
-    else:
-        # Admin sees all discussions
-        discussions_query = Discussion.query
-        if search_query:
-            discussions_query = discussions_query.filter(
-                db.or_(
-                    Discussion.title.ilike(f'%{search_query}%'),
-                    Discussion.description.ilike(f'%{search_query}%'),
-                    Discussion.course.has(Course.name.ilike(f'%{search_query}%')),
-                    Discussion.course.has(Course.code.ilike(f'%{search_query}%'))
-                )
-            )
-        discussions = discussions_query.order_by(Discussion.created_at.desc()).all()
-    
-    return render_template('discussions.html', discussions=discussions, search_query=search_query)
+    course_ids = member_course_ids()
+    
+    if search_query:
+        results = search(Discussion, search_query, course_ids, page=request.args.get('page', 1, type=int))
+        return render_template('discussions.html', discussions=results.items, results=results, search_query=search_query)
+    
+    discussions_query = Discussion.query.options(db.joinedload(Discussion.course))
+    if course_ids is not None:
+        discussions_query = discussions_query.filter(Discussion.course_id.in_(course_ids))
+    page = keyset_paginate(discussions_query, [(Discussion.created_at, True), (Discussion.id, True)])
+    
+    stats = None
+    if current_user.is_lecturer():
+        stats_query = db.session.query(
+            db.func.count(Discussion.id),
+            db.func.coalesce(db.func.sum(Discussion.post_count), 0),
+            db.func.count(Discussion.id).filter(Discussion.post_count > 0)
+        ).filter(Discussion.course_id.in_(course_ids))
+        total, posts, active = stats_query.one()
+        stats = {'total': total, 'posts': posts, 'active': active}
+    
+    return render_template('discussions.html', discussions=page.items, page=page, stats=stats, search_query=search_query)
 
 @app.route('/discussion/<int:discussion_id>')
 @login_required
@@ -401,40 +494,45 @@ def discussion_detail(discussion_id):
     discussion = Discussion.query.get_or_404(discussion_id)
     
     # Check access permissions
-    if current_user.is_student():
-        enrollment = Enrollment.query.filter_by(user_id=current_user.id, course_id=discussion.course_id).first()
-        if not enrollment:
-            flash('You do not have access to this discussion.', 'danger')
-            return redirect(url_for('discussions'))
-    elif current_user.is_lecturer() and discussion.course.lecturer_id != current_user.id:
+    if not is_course_member(discussion.course_id):
         flash('You do not have access to this discussion.', 'danger')
         return redirect(url_for('discussions'))
     
-    posts = Post.query.filter_by(discussion_id=discussion_id, parent_id=None).order_by(Post.created_at.asc()).all()
-    return render_template('discussion_detail.html', discussion=discussion, posts=posts)
+    # Resume the thread after the last post of the previous page, if any
+    after = request.args.get('after', '')
+    if not POST_PATH_PATTERN.fullmatch(after):
+        after = None
+    
+    thread = load_thread(discussion_id, after=after)
+    last_activity = db.session.query(db.func.max(Post.created_at)).filter(Post.discussion_id == discussion_id).scalar()
+    return render_template('discussion_detail.html', discussion=discussion, thread=thread, last_activity=last_activity)
 
 @app.route('/add_post/<int:discussion_id>', methods=['POST'])
 @login_required
 def add_post(discussion_id):
     discussion = Discussion.query.get_or_404(discussion_id)
     content = request.form['content']
-    parent_id = request.form.get('parent_id')
+    parent_id = request.form.get('parent_id', type=int)
     
     # Verify access
-    if current_user.is_student():
-        enrollment = Enrollment.query.filter_by(user_id=current_user.id, course_id=discussion.course_id).first()
-        if not enrollment:
-            flash('You do not have access to this discussion.', 'danger')
-            return redirect(url_for('discussions'))
-    elif current_user.is_lecturer() and discussion.course.lecturer_id != current_user.id:
+    if not is_course_member(discussion.course_id):
         flash('You do not have access to this discussion.', 'danger')
         return redirect(url_for('discussions'))
     
+    if parent_id:
+        parent = Post.query.filter_by(id=parent_id, discussion_id=discussion_id).first()
+        if not parent:
+            flash('The post you replied to could not be found.', 'danger')
+            return redirect(url_for('discussion_detail', discussion_id=discussion_id))
+        # Past the nesting limit, replies join the parent's own reply list
+        if (parent.depth or 0) >= Post.MAX_DEPTH:
+            parent_id = parent.parent_id
+    
     post = Post(
         content=content,
         discussion_id=discussion_id,
         author_id=current_user.id,
-        parent_id=int(parent_id) if parent_id else None
+        parent_id=parent_id
     )
     
     db.session.add(post)
@@ -447,8 +545,11 @@ def add_post(discussion_id):
 @login_required
 def grades():
     if current_user.is_student():
-        grades = Grade.query.filter_by(student_id=current_user.id).order_by(Grade.graded_at.desc()).all()
-        return render_template('grades.html', grades=grades)
+        grades_query = Grade.query.filter_by(student_id=current_user.id) \
+            .options(db.joinedload(Grade.assignment).joinedload(Assignment.course))
+        page = keyset_paginate(grades_query, [(Grade.graded_at, True), (Grade.id, True)])
+        # The summary panels cover every grade, not just the current page
+        return render_template('grades.html', summary=grade_summary(current_user.id), page=page)
     else:
         flash('Only students can view grades.', 'danger')
         return redirect(url_for('dashboard'))
@@ -456,15 +557,17 @@ def grades():
 @app.route('/profile')
 @login_required
 def profile():
-    return render_template('profile.html')
+    summary = grade_summary(current_user.id) if current_user.is_student() else None
+    return render_template('profile.html', counts=profile_counts(current_user), summary=summary)
 
 @app.route('/update_profile', methods=['POST'])
 @login_required
 def update_profile():
-    current_user.first_name = request.form['first_name']
-    current_user.last_name = request.form['last_name']
-    current_user.email = request.form['email']
-    
+    user = current_user.user
+    user.first_name = request.form['first_name']
+    user.last_name = request.form['last_name']
+    user.email = request.form['email']
+
     db.session.commit()
     flash('Profile updated successfully!', 'success')
     return redirect(url_for('profile'))
@@ -473,39 +576,29 @@ def update_profile():
 @login_required
 @admin_required
 def admin_users():
-    users = User.query.order_by(User.created_at.desc()).all()
-    return render_template('admin/users.html', users=users)
+    page = keyset_paginate(User.query, [(User.created_at, True), (User.id, True)])
+    return render_template('admin/users.html', users=page.items, page=page)
 
 @app.route('/admin/courses')
 @login_required
 @admin_required
 def admin_courses():
-    courses = Course.query.order_by(Course.created_at.desc()).all()
+    page = keyset_paginate(course_rows_query(), [(Course.created_at, True), (Course.id, True)])
+    courses = [CourseRow(*row) for row in page.items]
     lecturers = User.query.filter_by(role='lecturer').all()
-    return render_template('admin/courses.html', courses=courses, lecturers=lecturers)
+    return render_template('admin/courses.html', courses=courses, lecturers=lecturers, page=page)
 
 @app.route('/admin/analytics')
 @login_required
 @admin_required
 def admin_analytics():
-    # Calculate comprehensive metrics
-    total_users = User.query.count()
-    student_count = User.query.filter_by(role='student').count()
-    lecturer_count = User.query.filter_by(role='lecturer').count()
-    admin_count = User.query.filter_by(role='admin').count()
-    
-    total_courses = Course.query.count()
-    total_assignments = Assignment.query.count()
-    total_submissions = Submission.query.count()
-    total_discussions = Discussion.query.count()
-    
-    # Calculate averages
-    avg_enrollment = round(Enrollment.query.count() / max(total_courses, 1), 1)
-    submission_rate = round((total_submissions / max(total_assignments * student_count, 1)) * 100, 1)
-    
-    # Get recent activities (simulated for demo)
+    refreshed_at = refresh_if_stale()
+    metrics = analytics_summary()
+    
     recent_activities = []
-    recent_submissions = Submission.query.order_by(Submission.submitted_at.desc()).limit(5).all()
+    recent_submissions = Submission.query.options(
+        db.joinedload(Submission.student), db.joinedload(Submission.assignment)
+    ).order_by(Submission.submitted_at.desc()).limit(5).all()
     for submission in recent_submissions:
         recent_activities.append({
             'user': submission.student,
@@ -513,53 +606,29 @@ def admin_analytics():
             'created_at': submission.submitted_at
         })
     
-    # Top performing courses (simulated data)
-    top_courses = []
-    courses = Course.query.all()
-    for course in courses[:4]:
-        top_courses.append({
-            'code': course.code,
-            'title': course.title,
-            'avg_grade': 85 + (hash(course.code) % 15)  # Simulated grade
-        })
-    
-    metrics = {
-        'total_users': total_users,
-        'student_count': student_count,
-        'lecturer_count': lecturer_count,
-        'admin_count': admin_count,
-        'new_users_this_month': 5,  # Simulated
-        'active_courses': total_courses,
-        'avg_enrollment': avg_enrollment,
-        'total_assignments': total_assignments,
-        'submission_rate': submission_rate,
-        'avg_grade': 87,  # Simulated
-        'grade_improvement': '+3%',  # Simulated
-        'active_users_today': 25  # Simulated
-    }
-    
     return render_template('admin/analytics.html', 
                          metrics=metrics, 
                          recent_activities=recent_activities,
-                         top_courses=top_courses)
+                         top_courses=metrics['top_courses'],
+                         refreshed_at=refreshed_at)
 
 @app.route('/admin/system_health')
 @login_required
 @admin_required
 def admin_system_health():
-    # System health metrics
-    health_data = {
-        'database_status': 'Healthy',
-        'server_uptime': '7 days, 12 hours',
-        'memory_usage': '68%',
-        'disk_usage': '42%',
-        'active_sessions': 23,
-        'error_rate': '0.02%',
-        'response_time': '145ms'
-    }
+    health_data = health_summary()
+    health_data['dashboard_cache'] = dashboard_cache.stats()
     
     return render_template('admin/system_health.html', health=health_data)
 
+@app.route('/metrics')
+def prometheus_metrics():
+    token = app.config.get('METRICS_TOKEN')
+    authorized = token and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+    if not authorized and not (current_user.is_authenticated and current_user.is_admin()):
+        abort(403)
+    return Response(render_prometheus(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/admin/add_user', methods=['POST'])
 @login_required
 @admin_required
@@ -592,6 +661,32 @@ def admin_add_user():
     flash(f'User {username} created successfully!', 'success')
     return redirect(url_for('admin_users'))
 
+@app.route('/admin/import_users', methods=['POST'])
+@login_required
+@admin_required
+def admin_import_users():
+    """Create users from a CSV; rows that fail come back as a CSV to fix."""
+    file = request.files.get('file')
+    if not file or not file.filename:
+        flash('Choose a CSV file of users to import.', 'danger')
+        return redirect(url_for('admin_users'))
+    try:
+        result = import_users(io.TextIOWrapper(file.stream, encoding='utf-8-sig', newline=''),
+                              max_rows=app.config['IMPORT_USERS_MAX_ROWS'])
+    except (ValueError, UnicodeDecodeError, csv.Error) as error:
+        flash(f'Could not read {file.filename}: {error}', 'danger')
+        return redirect(url_for('admin_users'))
+
+    flash(f"Created {result['created']} user(s).", 'success' if result['created'] else 'info')
+    if not result['errors']:
+        return redirect(url_for('admin_users'))
+    flash(f"{len(result['errors'])} row(s) were not imported; see the downloaded error report.", 'warning')
+    report = io.StringIO()
+    write_error_report(result['errors'], report)
+    name = secure_filename(f'{file.filename.rsplit(".", 1)[0]}-errors.csv')
+    return Response(report.getvalue(), mimetype='text/csv',
+                    headers={'Content-Disposition': content_disposition(name)})
+
 @app.route('/admin/edit_user/<int:user_id>', methods=['POST'])
 @login_required
 @admin_required
@@ -653,6 +748,26 @@ def admin_add_course():
     flash(f'Course {code} created successfully!', 'success')
     return redirect(url_for('admin_courses'))
 
+@app.route('/admin/import_enrollments', methods=['POST'])
+@login_required
+@admin_required
+def admin_import_enrollments():
+    file = request.files.get('file')
+    if not file or not file.filename:
+        flash('Choose a CSV or JSON file of enrollments to import.', 'danger')
+        return redirect(url_for('admin_courses'))
+    try:
+        rows = enrollment_rows(file.stream, file.filename)
+    except (ValueError, UnicodeDecodeError, csv.Error) as error:
+        flash(f'Could not read {file.filename}: {error}', 'danger')
+        return redirect(url_for('admin_courses'))
+
+    result = import_enrollments(rows)
+    flash(f"Enrolled {result['enrolled']} student(s); {result['existing']} were already enrolled.",
+          'success' if result['enrolled'] else 'info')
+    _flash_row_errors(result['errors'])
+    return redirect(url_for('admin_courses'))
+
 @app.route('/admin/edit_course/<int:course_id>', methods=['POST'])
 @login_required
 @admin_required
@@ -676,6 +791,8 @@ def admin_delete_course(course_id):
     
     db.session.delete(course)
     db.session.commit()
+    # Deleting the submissions released their files; drop any nobody else uses
+    collect_blobs()
     flash(f'Course {course.code} deleted successfully!', 'success')
     return redirect(url_for('admin_courses'))
 
@@ -686,7 +803,7 @@ def create_assignment(course_id):
     course = Course.query.get_or_404(course_id)
     
     # Verify lecturer owns this course
-    if course.lecturer_id != current_user.id:
+    if not can_manage_course(course_id):
         flash('You do not have permission to create assignments for this course.', 'danger')
         return redirect(url_for('courses'))
     
@@ -720,10 +837,49 @@ def create_assignment(course_id):
     
     return render_template('create_assignment.html', course=course)
 
+def _send_submission_file(submission):
+    relative_path, name = stored_file(submission)
+    return send_stored_file(relative_path, name, etag=submission.file_sha256)
+
 @app.route('/uploads/<filename>')
 @login_required
 def uploaded_file(filename):
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    """Old download links: a file named <timestamp>_<name>, or a blob's hash."""
+    candidates = Submission.query.filter(db.or_(
+        Submission.file_sha256 == filename,
+        Submission.legacy_file_name == filename,
+        Submission.file_path == filename,
+        Submission.file_path.endswith('/' + filename, autoescape=True),
+    )).all()
+    for submission in candidates:
+        if can_view_submission(submission):
+            return _send_submission_file(submission)
+    abort(403 if candidates else 404)
+
+@app.route('/assignment/<int:assignment_id>/submissions.zip')
+@login_required
+@lecturer_required
+def download_submissions(assignment_id):
+    """Every submission to the assignment as one ZIP, streamed as it is built."""
+    assignment = Assignment.query.get_or_404(assignment_id)
+    if not can_manage_course(assignment.course_id):
+        abort(403)
+    name = secure_filename(f'{assignment.course.code}-{assignment.title}-submissions.zip')
+    return Response(stream_with_context(submission_archive(assignment)), mimetype='application/zip', headers={
+        'Content-Disposition': content_disposition(name),
+        # Let nginx pass each piece on as it arrives
+        'X-Accel-Buffering': 'no',
+    })
+
+@app.route('/submission/<int:submission_id>/file')
+@login_required
+def submission_file(submission_id):
+    submission = Submission.query.get_or_404(submission_id)
+    if not submission.file_path:
+        abort(404)
+    if not can_view_submission(submission):
+        abort(403)
+    return _send_submission_file(submission)
 
 # Video Conferencing Routes
 
@@ -731,25 +887,18 @@ def uploaded_file(filename):
 @login_required
 def video_conferences():
     """Display all video conferences based on user role"""
+    rooms_query = LectureRoom.query.options(db.joinedload(LectureRoom.course), db.joinedload(LectureRoom.lecturer))
+    
     if current_user.is_admin():
         # Admins can see all lecture rooms
-        lecture_rooms = LectureRoom.query.order_by(LectureRoom.created_at.desc()).all()
-        return render_template('video_conferences.html', lecture_rooms=lecture_rooms, title="All Video Conferences")
+        title = "All Video Conferences"
+    else:
+        # Lecturers see the rooms of courses they teach, students those of courses they're enrolled in
+        rooms_query = rooms_query.filter(LectureRoom.course_id.in_(member_course_ids()))
+        title = "My Lecture Rooms" if current_user.is_lecturer() else "Available Lectures"
     
-    elif current_user.is_lecturer():
-        # Lecturers see their own lecture rooms
-        lecture_rooms = LectureRoom.query.filter_by(lecturer_id=current_user.id).order_by(LectureRoom.created_at.desc()).all()
-        return render_template('video_conferences.html', lecture_rooms=lecture_rooms, title="My Lecture Rooms")
-    
-    else:  # Student
-        # Students see lecture rooms for courses they're enrolled in
-        enrolled_courses = db.session.query(Course).join(Enrollment).filter(Enrollment.user_id == current_user.id).all()
-        course_ids = [course.id for course in enrolled_courses]
-        if course_ids:
-            lecture_rooms = LectureRoom.query.filter(LectureRoom.course_id.in_(course_ids)).order_by(LectureRoom.created_at.desc()).all()
-        else:
-            lecture_rooms = []
-        return render_template('video_conferences.html', lecture_rooms=lecture_rooms, title="Available Lectures")
+    page = keyset_paginate(rooms_query, [(LectureRoom.created_at, True), (LectureRoom.id, True)])
+    return render_template('video_conferences.html', lecture_rooms=page.items, page=page, title=title)
 
 @app.route('/create_lecture_room/<int:course_id>', methods=['GET', 'POST'])
 @login_required
@@ -759,7 +908,7 @@ def create_lecture_room(course_id):
     course = Course.query.get_or_404(course_id)
     
     # Verify lecturer owns this course
-    if course.lecturer_id != current_user.id:
+    if not can_manage_course(course_id):
         flash('You do not have permission to create lecture rooms for this course.', 'danger')
         return redirect(url_for('courses'))
     
@@ -800,7 +949,7 @@ def create_lecture_room(course_id):
         lecture_room = LectureRoom(
             room_name=room_name,
             course_id=course_id,
-            lecturer_id=current_user.id,
+            lecturer_id=course.lecturer_id,
             title=title,
             description=description,
             scheduled_start=scheduled_start,
@@ -824,14 +973,13 @@ def lecture_room_detail(room_id):
     # Check permissions
     if current_user.is_student():
         # Students can only access rooms for courses they're enrolled in
-        enrollment = Enrollment.query.filter_by(user_id=current_user.id, course_id=lecture_room.course_id).first()
-        if not enrollment:
+        if not is_course_member(lecture_room.course_id):
             flash('You are not enrolled in this course.', 'danger')
             return redirect(url_for('video_conferences'))
     
     elif current_user.is_lecturer():
-        # Lecturers can only access their own rooms
-        if lecture_room.lecturer_id != current_user.id:
+        # Lecturers can only access rooms of courses they teach
+        if not can_manage_course(lecture_room.course_id):
             flash('You do not have permission to access this lecture room.', 'danger')
             return redirect(url_for('video_conferences'))
     
@@ -854,16 +1002,15 @@ def join_lecture(room_id):
     if current_user.is_admin():
         can_join = True
     elif current_user.is_lecturer():
-        # Lecturers can only join their own rooms or rooms in courses they teach
-        if lecture_room.lecturer_id == current_user.id:
+        # Lecturers can only join rooms in courses they teach
+        if can_manage_course(lecture_room.course_id):
             can_join = True
         else:
             flash('You do not have permission to join this lecture room.', 'danger')
             return redirect(url_for('video_conferences'))
     elif current_user.is_student():
         # Students can only join rooms for courses they're enrolled in
-        enrollment = Enrollment.query.filter_by(user_id=current_user.id, course_id=lecture_room.course_id).first()
-        if enrollment:
+        if is_course_member(lecture_room.course_id):
             can_join = True
         else:
             flash('You are not enrolled in this course and cannot join this lecture.', 'danger')
@@ -889,7 +1036,7 @@ def join_lecture(room_id):
         db.session.add(session_log)
     
     # If lecturer is joining, ensure the session is started
-    if current_user.is_lecturer() and lecture_room.lecturer_id == current_user.id:
+    if current_user.is_lecturer() and can_manage_course(lecture_room.course_id):
         if not lecture_room.is_active:
             lecture_room.start_session()
     
@@ -904,8 +1051,8 @@ def start_lecture(room_id):
     """Start a lecture session (lecturer only)"""
     lecture_room = LectureRoom.query.get_or_404(room_id)
     
-    # Verify lecturer owns this room
-    if lecture_room.lecturer_id != current_user.id:
+    # Verify lecturer teaches this room's course
+    if not can_manage_course(lecture_room.course_id):
         flash('You do not have permission to start this lecture.', 'danger')
         return redirect(url_for('video_conferences'))
     
@@ -922,8 +1069,8 @@ def end_lecture(room_id):
     """End a lecture session (lecturer only)"""
     lecture_room = LectureRoom.query.get_or_404(room_id)
     
-    # Verify lecturer owns this room
-    if lecture_room.lecturer_id != current_user.id:
+    # Verify lecturer teaches this room's course
+    if not can_manage_course(lecture_room.course_id):
         flash('You do not have permission to end this lecture.', 'danger')
         return redirect(url_for('video_conferences'))
     
@@ -944,15 +1091,20 @@ def end_lecture(room_id):
 @admin_required
 def lecture_sessions():
     """View all lecture session logs (admin only)"""
-    page = request.args.get('page', 1, type=int)
-    
     # Get filter parameters
     course_filter = request.args.get('course')
     lecturer_filter = request.args.get('lecturer')
     date_filter = request.args.get('date')
     
     # Build query
-    query = LectureSessionLog.query.join(LectureRoom).join(Course).join(User)
+    query = LectureSessionLog.query \
+        .join(LectureSessionLog.lecture_room) \
+        .join(LectureRoom.course) \
+        .join(LectureSessionLog.participant) \
+        .options(
+            db.contains_eager(LectureSessionLog.lecture_room).contains_eager(LectureRoom.course),
+            db.contains_eager(LectureSessionLog.participant),
+        )
     
     if course_filter:
         query = query.filter(Course.id == course_filter)
@@ -967,9 +1119,7 @@ def lecture_sessions():
         except ValueError:
             flash('Invalid date format.', 'danger')
     
-    session_logs = query.order_by(LectureSessionLog.joined_at.desc()).paginate(
-        page=page, per_page=20, error_out=False
-    )
+    session_logs = keyset_paginate(query, [(LectureSessionLog.joined_at, True), (LectureSessionLog.id, True)])
     
     # Get filter options
     courses = Course.query.all()
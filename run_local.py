@@ -6,7 +6,9 @@ Run this script to start the application locally with SQLite database
 
 import os
 import sys
-from app import app, db
+from app import create_app
+
+app = create_app()
 
 def setup_local_environment():
     """Configure the application for local development"""
@@ -20,20 +22,11 @@ def setup_local_environment():
     # Ensure uploads directory exists
     os.makedirs('uploads', exist_ok=True)
     
-    # Create database tables
+    # Create database tables and sample data
     with app.app_context():
         print("Creating database tables...")
-        db.create_all()
-        
-        # Check if we need to initialize data
-        from models import User
-        if User.query.count() == 0:
-            print("Initializing sample data...")
-            from init_data import init_sample_data
-            init_sample_data()
-            print("Sample data initialized successfully!")
-        else:
-            print("Database already contains data.")
+        from commands import bootstrap
+        bootstrap()
 
 def main():
     """Main function to run the local server"""
@@ -0,0 +1,208 @@
+import re
+
+from markupsafe import Markup, escape
+from sqlalchemy import DDL, event
+
+from app import db
+from models import Assignment, Discussion
+
+# Models with a full-text index over (title, description). On SQLite the index
+# is an external-content FTS5 table maintained by triggers; on PostgreSQL it is
+# a generated tsvector column with a GIN index. Both live in the database, so
+# rows written outside the ORM stay searchable too.
+SEARCHABLE_MODELS = (Assignment, Discussion)
+
+# Highlight markers used inside the database; they are swapped for <mark> tags
+# only after the surrounding text has been HTML-escaped.
+_HIGHLIGHT_START = '\x02'
+_HIGHLIGHT_END = '\x03'
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+_MAX_PER_PAGE = 50
+
+
+def _sqlite_ddl(table):
+    fts = f'{table}_fts'
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+        f"title, description, content='{table}', content_rowid='id', "
+        f"tokenize='unicode61 remove_diacritics 2')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {fts}(rowid, title, description) VALUES (new.id, new.title, new.description); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, title, description) VALUES ('delete', old.id, old.title, old.description); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF title, description ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, title, description) VALUES ('delete', old.id, old.title, old.description); "
+        f"INSERT INTO {fts}(rowid, title, description) VALUES (new.id, new.title, new.description); END",
+    ]
+
+
+def _postgresql_ddl(table):
+    return [
+        f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ("
+        f"setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+        f"setweight(to_tsvector('simple', coalesce(description, '')), 'B')) STORED",
+        f"CREATE INDEX IF NOT EXISTS ix_{table}_search_vector ON {table} USING GIN (search_vector)",
+    ]
+
+
+def _register_search_ddl(model):
+    table = model.__table__
+    for statement in _sqlite_ddl(table.name):
+        event.listen(table, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+    for statement in _postgresql_ddl(table.name):
+        event.listen(table, 'after_create', DDL(statement).execute_if(dialect='postgresql'))
+    event.listen(table, 'after_drop',
+                 DDL(f'DROP TABLE IF EXISTS {table.name}_fts').execute_if(dialect='sqlite'))
+
+for _model in SEARCHABLE_MODELS:
+    _register_search_ddl(_model)
+
+
+def rebuild_search_index():
+    """Create the search structures on an existing database and reindex.
+
+    New databases get them from ``db.create_all()``; this covers databases
+    created before search existed, and repairs a drifted FTS5 index.
+    """
+    dialect = db.engine.dialect.name
+    for model in SEARCHABLE_MODELS:
+        table = model.__table__.name
+        if dialect == 'sqlite':
+            for statement in _sqlite_ddl(table):
+                db.session.execute(db.text(statement))
+            db.session.execute(db.text(f"INSERT INTO {table}_fts({table}_fts) VALUES ('rebuild')"))
+        elif dialect == 'postgresql':
+            for statement in _postgresql_ddl(table):
+                db.session.execute(db.text(statement))
+    db.session.commit()
+
+
+
+def ensure_search_index():
+    """Build the search index with ``rebuild_search_index`` if any table lacks it.
+
+    Returns whether it had to. Cheap when the index exists, so it is safe to
+    run on every deploy.
+    """
+    inspector = db.inspect(db.engine)
+    dialect = db.engine.dialect.name
+    for model in SEARCHABLE_MODELS:
+        table = model.__table__.name
+        if dialect == 'sqlite':
+            missing = not inspector.has_table(f'{table}_fts')
+        elif dialect == 'postgresql':
+            missing = 'search_vector' not in {column['name'] for column in inspector.get_columns(table)}
+        else:
+            missing = False
+        if missing:
+            rebuild_search_index()
+            return True
+    return False
+
+class SearchHit:
+    """One ranked search result with an HTML-safe highlighted snippet."""
+
+    def __init__(self, item, rank, snippet):
+        self.item = item
+        self.rank = rank
+        self.snippet = snippet
+
+
+class SearchPage:
+    """A page of search hits in rank order."""
+
+    def __init__(self, hits, page, per_page, has_next):
+        self.hits = hits
+        self.page = page
+        self.per_page = per_page
+        self.has_next = has_next
+        self.has_prev = page > 1
+        self.prev_num = page - 1 if self.has_prev else None
+        self.next_num = page + 1 if has_next else None
+        self.items = [hit.item for hit in hits]
+        self.snippets = {hit.item.id: hit.snippet for hit in hits}
+
+
+def _terms(query_text):
+    return _TOKEN_RE.findall(query_text.lower())[:8]
+
+
+def _highlight(text):
+    if not text:
+        return None
+    return Markup(str(escape(text))
+                  .replace(_HIGHLIGHT_START, Markup('<mark>'))
+                  .replace(_HIGHLIGHT_END, Markup('</mark>')))
+
+
+def _sqlite_search(model, terms):
+    fts = db.literal_column(f'{model.__table__.name}_fts')
+    fts_table = db.table(f'{model.__table__.name}_fts', db.column('rowid'))
+    # Every term must match; the last one is a prefix so results update while typing
+    match = ' '.join(f'"{term}"' for term in terms[:-1])
+    match = f'{match} "{terms[-1]}"*'.strip()
+    rank = db.func.bm25(fts, 10.0, 1.0)
+    snippet = db.func.snippet(fts, -1, _HIGHLIGHT_START, _HIGHLIGHT_END, '…', 16)
+    return db.session.query(model, rank, snippet) \
+        .select_from(fts_table) \
+        .join(model, model.id == fts_table.c.rowid) \
+        .filter(fts.match(match)) \
+        .order_by(rank, model.id)
+
+
+def _postgresql_search(model, terms):
+    vector = db.literal_column(f'{model.__table__.name}.search_vector')
+    tsquery = db.func.to_tsquery('simple', ' & '.join(f'{term}:*' for term in terms))
+    rank = db.func.ts_rank(vector, tsquery)
+    snippet = db.func.ts_headline(
+        'simple', db.func.coalesce(model.description, model.title), tsquery,
+        f'StartSel={_HIGHLIGHT_START}, StopSel={_HIGHLIGHT_END}, MaxWords=20, MinWords=8'
+    )
+    return db.session.query(model, rank, snippet) \
+        .filter(vector.op('@@')(tsquery)) \
+        .order_by(rank.desc(), model.id)
+
+
+def _fallback_search(model, terms):
+    conditions = [
+        db.or_(model.title.ilike(f'%{term}%'), model.description.ilike(f'%{term}%'))
+        for term in terms
+    ]
+    return db.session.query(model, db.literal(0), db.literal(None)) \
+        .filter(*conditions) \
+        .order_by(model.created_at.desc(), model.id)
+
+
+def search(model, query_text, visible_course_ids=None, page=1, per_page=20):
+    """Full-text search ``model`` (Assignment or Discussion) by title and
+    description, best matches first.
+
+    ``visible_course_ids`` holds the IDs of the courses the caller may see,
+    as from ``access.member_course_ids``; it is applied inside the search
+    query. ``None`` means no restriction.
+    """
+    page = max(page, 1)
+    per_page = min(max(per_page, 1), _MAX_PER_PAGE)
+    terms = _terms(query_text)
+    if not terms:
+        return SearchPage([], page, per_page, False)
+
+    dialect = db.engine.dialect.name
+    if dialect == 'sqlite':
+        query = _sqlite_search(model, terms)
+    elif dialect == 'postgresql':
+        query = _postgresql_search(model, terms)
+    else:
+        query = _fallback_search(model, terms)
+
+    if visible_course_ids is not None:
+        query = query.filter(model.course_id.in_(visible_course_ids))
+
+    rows = query.options(db.joinedload(model.course)) \
+        .limit(per_page + 1) \
+        .offset((page - 1) * per_page) \
+        .all()
+    hits = [SearchHit(item, rank, _highlight(snippet)) for item, rank, snippet in rows[:per_page]]
+    return SearchPage(hits, page, per_page, len(rows) > per_page)
@@ -0,0 +1,25 @@
+"""Cells for CSV exports that are opened in a spreadsheet.
+
+Excel, LibreOffice and Google Sheets run text starting with ``=``, ``+``,
+``-`` or ``@`` as a formula, so names, titles and feedback written by users
+could run on the machine of whoever opens an export. Such text is written
+with a leading apostrophe, which the spreadsheet shows as plain text, and
+imports of those exports strip it again.
+"""
+
+# Spreadsheets treat text starting with these as a formula
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def safe_cell(value):
+    """``value`` as written to an exported CSV: None as blank, formulas as text."""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return '' if value is None else value
+
+
+def read_cell(value):
+    """A cell of a CSV written with :func:`safe_cell`, as it was before escaping."""
+    if isinstance(value, str) and value.startswith("'") and value[1:].startswith(FORMULA_PREFIXES):
+        return value[1:]
+    return value
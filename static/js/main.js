@@ -11,6 +11,9 @@ document.addEventListener('DOMContentLoaded', function() {
     // Initialize file upload preview
     initializeFileUpload();
     
+    // Initialize resumable submission uploads
+    initializeChunkedUploads();
+    
     // Initialize form validation
     initializeFormValidation();
     
@@ -75,10 +78,10 @@ function initializeFileUpload() {
                 `;
                 document.getElementById(input.id + '_preview').innerHTML = fileInfo;
                 
-                // Validate file size (16MB limit)
-                const maxSize = 16 * 1024 * 1024; // 16MB
+                // Validate file size (16MB unless the input sets data-max-size)
+                const maxSize = parseInt(input.dataset.maxSize, 10) || 16 * 1024 * 1024;
                 if (file.size > maxSize) {
-                    showAlert('File size exceeds 16MB limit. Please choose a smaller file.', 'warning');
+                    showAlert(`File size exceeds ${formatFileSize(maxSize)} limit. Please choose a smaller file.`, 'warning');
                     input.value = '';
                     removeFilePreview(input.id);
                 }
@@ -98,6 +101,120 @@ function removeFilePreview(inputId) {
     if (preview) preview.remove();
 }
 
+/**
+ * Send submission files in resumable chunks (see uploads.py), so a dropped
+ * connection only costs the chunk in flight. Forms opt in with
+ * data-chunked-upload set to the URL that starts an upload; without a file,
+ * or without fetch, the form posts normally.
+ */
+function initializeChunkedUploads() {
+    const forms = document.querySelectorAll('form[data-chunked-upload]');
+    
+    forms.forEach(form => {
+        form.addEventListener('submit', async function(e) {
+            const input = form.querySelector('input[type="file"]');
+            const file = input && input.files[0];
+            if (!file || !window.fetch) return;
+            e.preventDefault();
+            
+            const submitBtn = form.querySelector('button[type="submit"]');
+            const showProgress = uploadProgress(input);
+            try {
+                let upload = await uploadRequest(form.dataset.chunkedUpload, {
+                    method: 'POST',
+                    headers: {'Content-Type': 'application/json'},
+                    body: JSON.stringify({filename: file.name, size: file.size})
+                });
+                while (upload.received < upload.size) {
+                    showProgress(upload.received / upload.size);
+                    const start = upload.next_chunk * upload.chunk_size;
+                    const chunk = file.slice(start, Math.min(start + upload.chunk_size, file.size));
+                    const headers = {'Content-Type': 'application/octet-stream'};
+                    const checksum = await sha256Hex(chunk);
+                    if (checksum) headers['X-Content-SHA256'] = checksum;
+                    try {
+                        upload = await uploadRequest(`/submission_uploads/${upload.upload_id}/chunks/${upload.next_chunk}`, {
+                            method: 'PUT', headers: headers, body: chunk
+                        });
+                    } catch (error) {
+                        if (error.status !== 409) throw error;
+                        // Out of step with the server; ask where to carry on
+                        upload = await uploadRequest(`/submission_uploads/${upload.upload_id}`, {method: 'GET'});
+                    }
+                }
+                showProgress(1);
+                const result = await uploadRequest(`/submission_uploads/${upload.upload_id}/complete`, {
+                    method: 'POST',
+                    headers: {'Content-Type': 'application/json'},
+                    body: JSON.stringify({content: form.elements.content.value, url: form.elements.url.value})
+                });
+                window.location = result.redirect;
+            } catch (error) {
+                showAlert(`${error.message} Submit again to resume the upload.`, 'danger', true);
+                if (submitBtn) {
+                    submitBtn.classList.remove('loading');
+                    submitBtn.disabled = false;
+                }
+            }
+        });
+    });
+}
+
+/**
+ * JSON request that retries network failures and server errors with backoff
+ */
+async function uploadRequest(url, options, attempts = 6) {
+    for (let attempt = 0; ; attempt++) {
+        let response;
+        try {
+            response = await fetch(url, options);
+        } catch (networkError) {
+            if (attempt + 1 >= attempts) throw new Error('The connection was lost.');
+            await new Promise(resolve => setTimeout(resolve, 1000 * 2 ** attempt));
+            continue;
+        }
+        if (response.status >= 500 && attempt + 1 < attempts) {
+            await new Promise(resolve => setTimeout(resolve, 1000 * 2 ** attempt));
+            continue;
+        }
+        const result = await response.json().catch(() => ({}));
+        if (!response.ok) {
+            const error = new Error(result.error || 'The upload failed.');
+            error.status = response.status;
+            throw error;
+        }
+        return result;
+    }
+}
+
+/**
+ * Hex SHA-256 of a blob, or null where Web Crypto is unavailable (plain HTTP)
+ */
+async function sha256Hex(blob) {
+    if (!window.crypto || !window.crypto.subtle) return null;
+    const digest = await window.crypto.subtle.digest('SHA-256', await blob.arrayBuffer());
+    return [...new Uint8Array(digest)].map(byte => byte.toString(16).padStart(2, '0')).join('');
+}
+
+/**
+ * Progress bar under a file input; returns a function taking a 0-1 fraction
+ */
+function uploadProgress(input) {
+    let bar = document.getElementById(input.id + '_progress');
+    if (!bar) {
+        const wrapper = document.createElement('div');
+        wrapper.className = 'progress mt-2';
+        wrapper.innerHTML = `<div class="progress-bar" id="${input.id}_progress" role="progressbar" style="width: 0%"></div>`;
+        input.parentNode.appendChild(wrapper);
+        bar = document.getElementById(input.id + '_progress');
+    }
+    return fraction => {
+        const percent = Math.round(fraction * 100);
+        bar.style.width = percent + '%';
+        bar.textContent = percent + '%';
+    };
+}
+
 /**
  * Format file size for display
  */
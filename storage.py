@@ -0,0 +1,201 @@
+"""Content-addressed store for uploaded files.
+
+Each distinct file is kept once, under UPLOAD_FOLDER/blobs/ab/cd/<sha256>,
+where ab and cd are the first two byte pairs of its SHA-256, so no directory
+grows past a few thousand entries. A ``Blob`` row per file counts the
+submissions that use it (maintained like the other counters in models.py);
+``collect_blobs`` deletes blobs nothing refers to any more.
+"""
+import hashlib
+import os
+import re
+import secrets
+import shutil
+import time
+
+from sqlalchemy.exc import IntegrityError
+
+from app import app, db
+from models import Blob, Submission
+
+STORE_DIR = 'blobs'
+
+# Bytes read per hash update
+READ_SIZE = 1024 * 1024
+
+# Files in the store with no Blob row are left this long, in case the
+# upload that wrote them has not committed yet
+ORPHAN_GRACE_SECONDS = 3600
+
+
+def blob_path(sha256):
+    """Where the blob for ``sha256`` lives, relative to UPLOAD_FOLDER."""
+    return os.path.join(STORE_DIR, sha256[:2], sha256[2:4], sha256)
+
+
+def absolute_path(relative_path):
+    return os.path.join(app.config['UPLOAD_FOLDER'], relative_path)
+
+
+def stored_file(submission):
+    """``(path relative to UPLOAD_FOLDER, download name)`` of a submission's file."""
+    if submission.file_sha256:
+        return submission.file_path, submission.file_name or submission.file_sha256
+    # Not yet moved into the store by `flask migrate-uploads`
+    name = os.path.basename(submission.file_path)
+    return name, submission.file_name or name
+
+
+def hash_file(path):
+    """``(sha256 hex digest, size)`` of the file at ``path``."""
+    hasher = hashlib.sha256()
+    size = 0
+    with open(path, 'rb') as file:
+        while block := file.read(READ_SIZE):
+            hasher.update(block)
+            size += len(block)
+    return hasher.hexdigest(), size
+
+
+def _place(source, target):
+    """Put a copy of ``source`` at ``target`` without disturbing ``source``,
+    so the caller can still retry if its transaction fails."""
+    if os.path.exists(target):
+        return
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    try:
+        os.link(source, target)
+    except FileExistsError:
+        pass
+    except OSError:
+        # No hard links across filesystems (or on this one): copy, then rename into place
+        temporary = f'{target}.{secrets.token_hex(4)}.tmp'
+        shutil.copyfile(source, temporary)
+        os.replace(temporary, target)
+
+
+def store_file(source, sha256=None, size=None):
+    """Add the file at ``source`` to the store and return its ``Blob``.
+
+    The blob row is added to the session but not committed; the reference
+    count goes up when a submission pointing at it is inserted. ``source``
+    is left in place for the caller to remove once it has committed.
+    """
+    if sha256 is None:
+        sha256, size = hash_file(source)
+    _place(source, absolute_path(blob_path(sha256)))
+    blob = db.session.get(Blob, sha256)
+    if blob is None:
+        try:
+            with db.session.begin_nested():
+                blob = Blob(sha256=sha256, size=size)
+                db.session.add(blob)
+        except IntegrityError:
+            # Stored by a concurrent upload of the same file
+            blob = db.session.get(Blob, sha256)
+    return blob
+
+
+def store_stream(stream, directory):
+    """Write ``stream`` to a temporary file in ``directory`` while hashing it,
+    add it to the store and return ``(blob, temporary path)``."""
+    os.makedirs(directory, exist_ok=True)
+    temporary = os.path.join(directory, f'{secrets.token_hex(16)}.part')
+    hasher = hashlib.sha256()
+    size = 0
+    with open(temporary, 'wb') as file:
+        while block := stream.read(READ_SIZE):
+            file.write(block)
+            hasher.update(block)
+            size += len(block)
+    return store_file(temporary, hasher.hexdigest(), size), temporary
+
+
+def remove_quietly(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def collect_blobs(sweep_files=False):
+    """Delete unreferenced blobs and return how many files were removed.
+
+    With ``sweep_files``, also walk the store for files that have no Blob
+    row (left by uploads whose transaction failed).
+    """
+    removed = 0
+    for (sha256,) in db.session.query(Blob.sha256).filter(Blob.ref_count <= 0).all():
+        # Only delete if it is still unreferenced once the row is locked
+        deleted = db.session.query(Blob).filter(Blob.sha256 == sha256, Blob.ref_count <= 0) \
+            .delete(synchronize_session=False)
+        db.session.commit()
+        if deleted:
+            remove_quietly(absolute_path(blob_path(sha256)))
+            removed += 1
+
+    if sweep_files:
+        root = absolute_path(STORE_DIR)
+        cutoff = time.time() - ORPHAN_GRACE_SECONDS
+        for directory, _, names in os.walk(root):
+            stored = set(name for name in names if len(name) == 64)
+            if not stored:
+                continue
+            known = {sha256 for (sha256,) in db.session.query(Blob.sha256).filter(Blob.sha256.in_(stored))}
+            for name in stored - known:
+                path = os.path.join(directory, name)
+                if os.path.getmtime(path) < cutoff:
+                    remove_quietly(path)
+                    removed += 1
+    return removed
+
+
+# Uploads saved before the store existed: UPLOAD_FOLDER/<timestamp>_<name>
+
+_TIMESTAMP_PREFIX = re.compile(r'^\d{8}_\d{6}_')
+
+
+def _legacy_file(file_path):
+    for candidate in (file_path, absolute_path(os.path.basename(file_path))):
+        if os.path.isfile(candidate):
+            return candidate
+    return None
+
+
+def migrate_uploads(keep_originals=False, batch_size=100, progress=None):
+    """Hash every submission file that predates the store, move it in, and
+    point the submission at its blob. Returns counts of migrated files,
+    files that could not be found, and files no submission refers to."""
+    report = progress or (lambda message: None)
+    counts = {'migrated': 0, 'missing': 0, 'unreferenced': 0}
+    ids = [id for (id,) in db.session.query(Submission.id)
+           .filter(Submission.file_path.isnot(None), Submission.file_sha256.is_(None))
+           .order_by(Submission.id)]
+    for start in range(0, len(ids), batch_size):
+        originals = []
+        for submission in Submission.query.filter(Submission.id.in_(ids[start:start + batch_size])):
+            source = _legacy_file(submission.file_path)
+            if source is None:
+                report(f'Submission {submission.id}: {submission.file_path} not found')
+                counts['missing'] += 1
+                continue
+            blob = store_file(source)
+            submission.legacy_file_name = os.path.basename(submission.file_path)
+            submission.file_name = _TIMESTAMP_PREFIX.sub('', os.path.basename(source))
+            submission.file_path = blob_path(blob.sha256)
+            # The counter hook adds the reference to the blob
+            submission.file_sha256 = blob.sha256
+            originals.append(source)
+            counts['migrated'] += 1
+        db.session.commit()
+        if not keep_originals:
+            for source in originals:
+                remove_quietly(source)
+        report(f'{counts["migrated"]} file(s) migrated')
+
+    folder = app.config['UPLOAD_FOLDER']
+    for name in os.listdir(folder):
+        if os.path.isfile(os.path.join(folder, name)) and not name.startswith('.'):
+            report(f'No submission uses {name}; left in place')
+            counts['unreferenced'] += 1
+    return counts
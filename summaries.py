@@ -0,0 +1,102 @@
+"""Precomputed summaries for the grades and profile pages.
+
+Both pages used to walk ``current_user.grades`` in the template, calling
+``Grade.get_percentage()`` (and so lazy-loading each assignment) several
+times per grade. Here the numbers come from aggregate queries instead, and
+templates get plain dicts.
+"""
+from app import db
+from models import Assignment, Course, Enrollment, Grade, Post, Submission
+
+# Lowest percentage for each letter, best first; anything lower is an F
+LETTER_GRADES = [('A', 90), ('B', 80), ('C', 70), ('D', 60)]
+
+# Grades at or above this percentage count as excellent
+EXCELLENT_PERCENTAGE = 80
+
+
+def _course_summary(count, earned, possible, percentage_total, excellent, letters, **course):
+    return {
+        **course,
+        'count': count,
+        'points_earned': earned or 0,
+        'points_possible': possible or 0,
+        # Points earned over points possible, as in the gradebook
+        'percentage': (earned or 0) * 100 / possible if possible else None,
+        # Mean of the individual grades' percentages
+        'average': percentage_total / count if count else None,
+        'excellent': excellent,
+        'letters': letters,
+    }
+
+
+def grade_summary(student_id):
+    """Per-course and overall grade statistics for one student.
+
+    One query groups the student's grades by course, joined to each
+    assignment's max_points. The overall figures are sums of the course
+    rows, so they need no second pass over the grades.
+    """
+    percentage = db.case(
+        (Assignment.max_points > 0, Grade.points_earned * 100.0 / Assignment.max_points), else_=0.0,
+    )
+    buckets = []
+    upper = None
+    for _, minimum in LETTER_GRADES:
+        band = percentage >= minimum if upper is None else db.and_(percentage >= minimum, percentage < upper)
+        buckets.append(db.func.sum(db.case((band, 1), else_=0)))
+        upper = minimum
+    buckets.append(db.func.sum(db.case((percentage < upper, 1), else_=0)))
+
+    rows = db.session.query(
+        Course.id, Course.code, Course.title,
+        db.func.count(Grade.id),
+        db.func.sum(Grade.points_earned),
+        db.func.sum(Assignment.max_points),
+        db.func.sum(percentage),
+        db.func.sum(db.case((percentage >= EXCELLENT_PERCENTAGE, 1), else_=0)),
+        *buckets,
+    ).select_from(Grade) \
+        .join(Assignment, Grade.assignment_id == Assignment.id) \
+        .join(Course, Assignment.course_id == Course.id) \
+        .filter(Grade.student_id == student_id) \
+        .group_by(Course.id, Course.code, Course.title) \
+        .order_by(Course.code).all()
+
+    letter_names = [letter for letter, _ in LETTER_GRADES] + ['F']
+    courses = []
+    for id, code, title, count, earned, possible, percentage_total, excellent, *letters in rows:
+        courses.append(_course_summary(count, earned, possible, percentage_total or 0, excellent or 0,
+                                       dict(zip(letter_names, map(int, letters))),
+                                       id=id, code=code, title=title))
+
+    overall = _course_summary(
+        sum(course['count'] for course in courses),
+        sum(course['points_earned'] for course in courses),
+        sum(course['points_possible'] for course in courses),
+        sum(course['average'] * course['count'] for course in courses),
+        sum(course['excellent'] for course in courses),
+        {letter: sum(course['letters'][letter] for course in courses) for letter in letter_names},
+    )
+    return {**overall, 'courses': courses}
+
+
+def profile_counts(user):
+    """The activity counts shown on ``user``'s profile, in one query."""
+    def count(model, column):
+        return db.select(db.func.count(model.id)).where(column == user.id).scalar_subquery()
+
+    enrollments, submissions, grades, taught_courses, posts = db.session.execute(db.select(
+        count(Enrollment, Enrollment.user_id),
+        count(Submission, Submission.student_id),
+        count(Grade, Grade.student_id),
+        count(Course, Course.lecturer_id),
+        count(Post, Post.author_id),
+    )).one()
+    return {
+        'enrollments': enrollments,
+        'submissions': submissions,
+        'grades': grades,
+        'taught_courses': taught_courses,
+        'posts': posts,
+    }
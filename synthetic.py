@@ -0,0 +1,220 @@
+"""Deterministic synthetic data at university scale, for load testing.
+
+Rows are written by the bulk loader with explicit IDs, so the ORM hooks
+that maintain counters, post paths and analytics do not run; the generator
+fills in post paths itself, and ``flask generate-data`` rebuilds the rest.
+"""
+import random
+from datetime import datetime, timedelta
+
+from werkzeug.security import generate_password_hash
+
+from app import db
+from bulkload import bulk_load, reset_sequences
+from models import (User, Course, Enrollment, Assignment, Submission, Grade, Discussion, Post,
+                    LectureRoom, LectureSessionLog)
+
+# Row counts at scale 1.0
+UNIVERSITY = {
+    'lecturers': 1_000,
+    'students': 50_000,
+    'courses': 2_000,
+    'assignments': 20_000,
+    'submissions': 1_000_000,
+    'discussions': 10_000,
+    'posts': 2_000_000,
+    'lecture_rooms': 2_000,
+    'session_logs': 100_000,
+}
+ENROLLMENTS_PER_STUDENT = 6
+GRADED_FRACTION = 0.7
+REPLY_FRACTION = 0.6
+
+# Fixed, so the same seed always produces the same rows
+TERM_START = datetime(2025, 1, 6)
+TERM_DAYS = 120
+
+FIRST_NAMES = ['Ama', 'Kwame', 'Fatou', 'Ibrahim', 'Grace', 'Kofi', 'Aisha', 'Sekou', 'Adama', 'Mariama',
+               'John', 'Mary', 'Robert', 'Sarah', 'Yaw', 'Awa', 'Moussa', 'Esi', 'Kojo', 'Binta']
+LAST_NAMES = ['Koffi', 'Asante', 'Diallo', 'Traore', 'Mensah', 'Owusu', 'Bah', 'Kone', 'Sankara', 'Barry',
+              'Smith', 'Johnson', 'Brown', 'Davis', 'Camara', 'Boateng', 'Sow', 'Ndiaye', 'Keita', 'Ouedraogo']
+SUBJECTS = ['Computer Science', 'Calculus', 'Academic Writing', 'Business Management', 'West African History',
+            'Economics', 'Organic Chemistry', 'Physics', 'Statistics', 'Public Health', 'Linguistics',
+            'Civil Engineering', 'Philosophy', 'Agronomy', 'Accounting']
+WORK = ['Problem Set', 'Essay', 'Lab Report', 'Case Study', 'Midterm Project', 'Reading Response',
+        'Group Presentation', 'Research Proposal', 'Quiz Review', 'Final Project']
+TOPICS = ['Course Introduction', 'Key Concepts', 'Study Group Formation', 'Q&A for Upcoming Assignment',
+          'Course Resources', 'Exam Preparation', 'Lecture Follow-up', 'Project Ideas']
+WORDS = ['analysis', 'method', 'result', 'question', 'example', 'theory', 'data', 'model', 'evidence',
+         'argument', 'solution', 'approach', 'reading', 'lecture', 'deadline', 'feedback', 'chapter', 'review']
+
+
+def sizes(scale=1.0):
+    """Row counts for ``scale`` times the university dataset, at least one of each."""
+    return {name: max(1, int(count * scale)) for name, count in UNIVERSITY.items()}
+
+
+def _next_id(model):
+    return (db.session.query(db.func.max(model.id)).scalar() or 0) + 1
+
+
+def _sentence(rng, words=12):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize() + '.'
+
+
+def _moment(rng, start=TERM_START, days=TERM_DAYS):
+    return start + timedelta(seconds=rng.randrange(days * 86400))
+
+
+def generate(scale=1.0, seed=42, batch_size=10_000, progress=None):
+    """Add a synthetic university to the database and return rows written per table.
+
+    The same ``scale`` and ``seed`` against the same starting database always
+    produce the same rows, apart from the salt of the shared password hash.
+    ``progress`` is called with a message per stage.
+    """
+    rng = random.Random(seed)
+    counts = sizes(scale)
+    report = progress or (lambda message: None)
+    with bulk_load(batch_size) as writer:
+        _generate(writer, rng, counts, report)
+    reset_sequences()
+    return writer.written
+
+
+def _generate(writer, rng, counts, report):
+    # People; every synthetic account's password is "password123", hashed once and shared
+    report('users')
+    password_hash = generate_password_hash('password123')
+    user_id = _next_id(User)
+    lecturer_ids = list(range(user_id, user_id + counts['lecturers']))
+    student_ids = list(range(lecturer_ids[-1] + 1, lecturer_ids[-1] + 1 + counts['students']))
+    for role, ids in [('lecturer', lecturer_ids), ('student', student_ids)]:
+        for id in ids:
+            writer.add(User, {
+                'id': id, 'username': f'syn{role[0]}{id}', 'email': f'syn{role[0]}{id}@synthetic.wauu.edu.bj',
+                'password_hash': password_hash, 'first_name': rng.choice(FIRST_NAMES),
+                'last_name': rng.choice(LAST_NAMES), 'role': role,
+                'created_at': _moment(rng, TERM_START - timedelta(days=365), 365),
+            })
+    writer.flush()
+
+    report('courses')
+    course_id = _next_id(Course)
+    course_ids = list(range(course_id, course_id + counts['courses']))
+    course_lecturer = {}
+    for id in course_ids:
+        course_lecturer[id] = rng.choice(lecturer_ids)
+        writer.add(Course, {
+            'id': id, 'code': f'SYN{id}', 'title': f'{rng.choice(SUBJECTS)} {rng.randrange(100, 500)}',
+            'description': _sentence(rng, 20), 'lecturer_id': course_lecturer[id],
+            'created_at': _moment(rng, TERM_START - timedelta(days=30), 30),
+        })
+    writer.flush()
+
+    report('enrollments')
+    course_students = {id: [] for id in course_ids}
+    enrollment_id = _next_id(Enrollment)
+    for student in student_ids:
+        for course in rng.sample(course_ids, min(ENROLLMENTS_PER_STUDENT, len(course_ids))):
+            course_students[course].append(student)
+            writer.add(Enrollment, {
+                'id': enrollment_id, 'user_id': student, 'course_id': course,
+                'enrolled_at': _moment(rng, TERM_START - timedelta(days=14), 14),
+            })
+            enrollment_id += 1
+    writer.flush()
+
+    report('assignments, submissions and grades')
+    assignment_id = _next_id(Assignment)
+    submission_id = _next_id(Submission)
+    grade_id = _next_id(Grade)
+    per_assignment = counts['submissions'] / counts['assignments']
+    for id in range(assignment_id, assignment_id + counts['assignments']):
+        course = rng.choice(course_ids)
+        created_at = _moment(rng, TERM_START, TERM_DAYS - 14)
+        due_date = created_at + timedelta(days=rng.randrange(3, 14))
+        max_points = rng.choice([20, 50, 100, 150])
+        writer.add(Assignment, {
+            'id': id, 'title': f'{rng.choice(WORK)} {rng.randrange(1, 12)}', 'description': _sentence(rng, 30),
+            'course_id': course, 'max_points': max_points, 'due_date': due_date, 'created_at': created_at,
+        })
+        students = course_students[course]
+        target = min(len(students), max(0, int(rng.gauss(per_assignment, per_assignment / 4))))
+        for student in rng.sample(students, target):
+            submitted_at = due_date - timedelta(hours=rng.randrange(-24, 96))
+            writer.add(Submission, {
+                'id': submission_id, 'assignment_id': id, 'student_id': student,
+                'content': _sentence(rng, 40), 'submitted_at': submitted_at,
+            })
+            submission_id += 1
+            if rng.random() < GRADED_FRACTION:
+                writer.add(Grade, {
+                    'id': grade_id, 'assignment_id': id, 'student_id': student,
+                    'points_earned': round(rng.uniform(0.4, 1.0) * max_points, 1),
+                    'feedback': _sentence(rng, 10),
+                    'graded_at': submitted_at + timedelta(hours=rng.randrange(1, 240)),
+                })
+                grade_id += 1
+    writer.flush()
+
+    report('discussions and posts')
+    discussion_id = _next_id(Discussion)
+    post_id = _next_id(Post)
+    per_discussion = counts['posts'] / counts['discussions']
+    for id in range(discussion_id, discussion_id + counts['discussions']):
+        course = rng.choice(course_ids)
+        created_at = _moment(rng)
+        writer.add(Discussion, {
+            'id': id, 'title': f'{rng.choice(TOPICS)} ({rng.choice(SUBJECTS)})', 'description': _sentence(rng, 20),
+            'course_id': course, 'created_at': created_at,
+        })
+        authors = course_students[course] or [course_lecturer[course]]
+        thread = []
+        moment = created_at
+        for _ in range(max(1, int(rng.gauss(per_discussion, per_discussion / 4)))):
+            moment += timedelta(minutes=rng.randrange(1, 600))
+            parent = None
+            if thread and rng.random() < REPLY_FRACTION:
+                # Replies favour recent posts, as real threads do
+                parent = thread[max(0, len(thread) - 1 - int(rng.expovariate(0.2)))]
+                if parent[2] >= Post.MAX_DEPTH:
+                    parent = None
+            segment = Post.path_segment(post_id)
+            path, depth = (f'{parent[1]}.{segment}', parent[2] + 1) if parent else (segment, 0)
+            writer.add(Post, {
+                'id': post_id, 'content': _sentence(rng, 25), 'discussion_id': id,
+                'author_id': rng.choice(authors), 'parent_id': parent[0] if parent else None,
+                'created_at': moment, 'path': path, 'depth': depth,
+            })
+            thread.append((post_id, path, depth))
+            post_id += 1
+    writer.flush()
+
+    report('lecture rooms and session logs')
+    room_id = _next_id(LectureRoom)
+    room_ids = list(range(room_id, room_id + counts['lecture_rooms']))
+    room_course = {}
+    for id in room_ids:
+        course = room_course[id] = rng.choice(course_ids)
+        scheduled_start = _moment(rng)
+        writer.add(LectureRoom, {
+            'id': id, 'room_name': f'SYN{id}room', 'course_id': course, 'lecturer_id': course_lecturer[course],
+            'title': f'{rng.choice(TOPICS)} live session', 'description': _sentence(rng, 15),
+            'scheduled_start': scheduled_start, 'scheduled_end': scheduled_start + timedelta(hours=2),
+            'actual_start': scheduled_start, 'actual_end': scheduled_start + timedelta(hours=2),
+            'is_active': False, 'created_at': scheduled_start - timedelta(days=2),
+        })
+    writer.flush()
+    log_id = _next_id(LectureSessionLog)
+    for id in range(log_id, log_id + counts['session_logs']):
+        room = rng.choice(room_ids)
+        participants = course_students[room_course[room]] or [course_lecturer[room_course[room]]]
+        joined_at = _moment(rng)
+        duration = rng.randrange(5, 120)
+        writer.add(LectureSessionLog, {
+            'id': id, 'lecture_room_id': room, 'participant_id': rng.choice(participants),
+            'joined_at': joined_at, 'left_at': joined_at + timedelta(minutes=duration),
+            'duration_minutes': duration,
+        })
+    writer.flush()
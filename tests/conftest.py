@@ -0,0 +1,90 @@
+"""Shared fixtures: the app on a throwaway SQLite database, and query budgets.
+
+The database location is set before ``app`` is imported, since the app reads
+its configuration at import time.
+"""
+import os
+import tempfile
+from contextlib import contextmanager
+
+import pytest
+
+_scratch = tempfile.mkdtemp(prefix='wauu-tests-')
+# Tests drop and recreate every table; point TEST_DATABASE_URL at a scratch
+# PostgreSQL database to run them there instead of on SQLite
+if os.environ.get('TEST_DATABASE_URL'):
+    os.environ['DATABASE_URL'] = os.environ['TEST_DATABASE_URL']
+else:
+    os.environ.pop('DATABASE_URL', None)
+os.environ['DB_PATH'] = os.path.join(_scratch, 'test.db')
+os.environ['UPLOAD_FOLDER'] = os.path.join(_scratch, 'uploads')
+
+from app import create_app, db  # noqa: E402
+from profiler import NPlusOneError, check_repeats, profile_queries  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def app():
+    return create_app()
+
+
+@pytest.fixture
+def database(app):
+    """An empty schema, rebuilt for each test.
+
+    No app context is left active: the test client would reuse it, and so
+    ``g`` (with the logged-in user), for every request. Seed and inspect the
+    database inside ``with app.app_context():``.
+    """
+    from dashboard import dashboard_cache
+    from identity import identity_cache
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+    # IDs are reused once the tables are recreated
+    identity_cache.clear()
+    dashboard_cache.clear()
+    return db
+
+
+@pytest.fixture
+def client(app, database):
+    return app.test_client()
+
+
+@pytest.fixture
+def login(app):
+    """Log a fresh test client in and return it."""
+    def log_in(username, password):
+        client = app.test_client()
+        response = client.post('/login', data={'username': username, 'password': password})
+        assert response.status_code == 302, f'could not log in as {username}'
+        return client
+    return log_in
+
+
+@pytest.fixture
+def query_budget(app):
+    """Fail the test when a block runs more statements than its budget, or
+    repeats one statement shape more than ``repeat_threshold`` times::
+
+        def test_courses_page(client, query_budget):
+            with query_budget(5):
+                client.get('/courses')
+
+    Statements run in the test itself need an app context.
+    """
+    @contextmanager
+    def budget(limit, repeat_threshold=None):
+        with profile_queries('budgeted block') as profile:
+            yield profile
+        if profile.count > limit:
+            pytest.fail(f'Query budget of {limit} exceeded: {profile.summary()}', pytrace=False)
+        threshold = repeat_threshold if repeat_threshold is not None \
+            else app.config.get('SQL_PROFILER_REPEAT_THRESHOLD', 10)
+        try:
+            check_repeats(profile, threshold, raise_error=True)
+        except NPlusOneError as error:
+            pytest.fail(str(error), pytrace=False)
+    return budget
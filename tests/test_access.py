@@ -0,0 +1,101 @@
+"""Course membership decides who may see and manage each course's pages."""
+import pytest
+
+from app import db
+from models import Assignment, Course, Discussion, Enrollment, LectureRoom, User
+from profiler import profile_queries
+
+
+def _user(username, role):
+    user = User(username=username, email=f'{username}@wauu.edu.bj', first_name=username.title(),
+                last_name='Test', role=role)
+    user.set_password('secret')
+    db.session.add(user)
+    return user
+
+
+@pytest.fixture
+def campus(app, database):
+    """Two courses by different lecturers; the student is enrolled in the first only."""
+    with app.app_context():
+        _user('admin', 'admin')
+        lecturers = [_user('drsmith', 'lecturer'), _user('drjones', 'lecturer')]
+        student = _user('student001', 'student')
+        db.session.flush()
+        ids = {}
+        for name, lecturer in zip(('enrolled', 'other'), lecturers):
+            course = Course(code=name.upper(), title=name.title(), description='About it', lecturer_id=lecturer.id)
+            db.session.add(course)
+            db.session.flush()
+            assignment = Assignment(title='Essay', description='Write', course_id=course.id, max_points=100)
+            discussion = Discussion(title='Hello', description='Say hi', course_id=course.id)
+            room = LectureRoom(room_name=f'{name}room', course_id=course.id, lecturer_id=lecturer.id, title='Week 1',
+                               description='')
+            db.session.add_all([assignment, discussion, room])
+            db.session.flush()
+            ids[name] = {'course': course.id, 'assignment': assignment.id, 'discussion': discussion.id,
+                         'room': room.id}
+        db.session.add(Enrollment(user_id=student.id, course_id=ids['enrolled']['course']))
+        db.session.commit()
+    return ids
+
+
+def _pages(ids):
+    return [
+        f"/course/{ids['course']}",
+        f"/assignment/{ids['assignment']}",
+        f"/discussion/{ids['discussion']}",
+        f"/lecture_room/{ids['room']}",
+        f"/join_lecture/{ids['room']}",
+    ]
+
+
+@pytest.mark.parametrize('username, allowed', [
+    ('student001', {'enrolled'}),
+    ('drsmith', {'enrolled'}),
+    ('drjones', {'other'}),
+    ('admin', {'enrolled', 'other'}),
+])
+def test_members_see_course_pages(campus, login, username, allowed):
+    client = login(username, 'secret')
+    for name, ids in campus.items():
+        for url in _pages(ids):
+            status = client.get(url).status_code
+            assert status == (200 if name in allowed else 302), (username, url)
+
+
+
+@pytest.mark.parametrize('username', ['student001', 'drsmith', 'admin'])
+def test_missing_course_is_not_found_for_everyone(campus, login, username):
+    assert login(username, 'secret').get('/course/9999').status_code == 404
+
+
+@pytest.mark.parametrize('username, allowed', [
+    ('student001', set()),
+    ('drsmith', {'enrolled'}),
+    ('admin', {'enrolled', 'other'}),
+])
+def test_only_lecturer_and_admin_manage_a_course(campus, login, username, allowed):
+    client = login(username, 'secret')
+    for name, ids in campus.items():
+        response = client.get(f"/course/{ids['course']}/create_assignment")
+        assert response.status_code == (200 if name in allowed else 302), (username, name)
+        response = client.get(f"/course/{ids['course']}/gradebook.csv")
+        assert response.status_code == (200 if name in allowed else 302 if username == 'student001' else 403)
+
+
+def test_uploads_need_enrollment(campus, login):
+    client = login('student001', 'secret')
+    for name, status in (('enrolled', 201), ('other', 403)):
+        response = client.post(f"/assignment/{campus[name]['assignment']}/uploads",
+                               json={'filename': 'essay.pdf', 'size': 10})
+        assert response.status_code == status, name
+
+
+def test_enrollment_is_read_once_per_request(campus, login):
+    client = login('student001', 'secret')
+    client.get('/courses')  # warm the identity cache
+    with profile_queries() as profile:
+        client.get(f"/lecture_room/{campus['enrolled']['room']}")
+    enrollment_reads = [shape for shape in profile.shapes if 'FROM enrollment' in shape]
+    assert len(enrollment_reads) == 1
@@ -0,0 +1,72 @@
+"""Submission archives keep every file when names collide, and a safe manifest."""
+import csv
+import io
+import os
+import zipfile
+
+from app import db
+from archives import submission_archive
+from grading import csv_rows
+from models import Assignment, Course, Grade, Submission, User
+
+
+def test_upload_named_like_the_text_answer_is_kept(app, database):
+    with app.app_context():
+        lecturer = User(username='drsmith', email='drsmith@wauu.edu.bj', first_name='Dr', last_name='Smith',
+                        role='lecturer')
+        student = User(username='student001', email='student001@wauu.edu.bj', first_name='Ama', last_name='Koffi',
+                       role='student')
+        for user in (lecturer, student):
+            user.set_password('secret')
+        db.session.add_all([lecturer, student])
+        db.session.flush()
+        course = Course(code='CS101', title='Programming', description='About it', lecturer_id=lecturer.id)
+        db.session.add(course)
+        db.session.flush()
+        assignment = Assignment(title='Essay', description='Write', course_id=course.id, max_points=100)
+        db.session.add(assignment)
+        db.session.flush()
+
+        os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+        with open(os.path.join(app.config['UPLOAD_FOLDER'], 'upload-1'), 'wb') as file:
+            file.write(b'uploaded')
+        db.session.add(Submission(assignment_id=assignment.id, student_id=student.id, content='typed',
+                                  file_path='upload-1', file_name='submission.txt'))
+        db.session.commit()
+
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(submission_archive(assignment))))
+
+    assert archive.read('student001/submission.txt') == b'typed'
+    assert archive.read('student001/submission (2).txt') == b'uploaded'
+    assert 'student001/submission (2).txt' in archive.read('manifest.csv').decode()
+
+
+def test_manifest_cells_cannot_run_as_formulas(app, database):
+    with app.app_context():
+        lecturer = User(username='drsmith', email='drsmith@wauu.edu.bj', first_name='Dr', last_name='Smith',
+                        role='lecturer')
+        student = User(username='student001', email='student001@wauu.edu.bj', first_name='=HYPERLINK("x")',
+                       last_name='Koffi', role='student')
+        db.session.add_all([lecturer, student])
+        db.session.flush()
+        course = Course(code='CS101', title='Programming', description='About it', lecturer_id=lecturer.id)
+        db.session.add(course)
+        db.session.flush()
+        assignment = Assignment(title='Essay', description='Write', course_id=course.id, max_points=100)
+        db.session.add(assignment)
+        db.session.flush()
+        db.session.add_all([
+            Submission(assignment_id=assignment.id, student_id=student.id, content='typed'),
+            Grade(assignment_id=assignment.id, student_id=student.id, points_earned=70, feedback='-5 for lateness'),
+        ])
+        db.session.commit()
+
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(submission_archive(assignment))))
+
+    manifest = archive.read('manifest.csv')
+    row = next(csv.DictReader(io.StringIO(manifest.decode())))
+    assert row['student'] == '\'=HYPERLINK("x") Koffi'
+    assert row['feedback'] == "'-5 for lateness"
+    # Importing the manifest as grades reads the cells back as they were
+    (_, imported), = csv_rows(io.BytesIO(manifest))
+    assert imported['feedback'] == '-5 for lateness'
@@ -0,0 +1,32 @@
+"""The lecturer's assignment statistics."""
+import re
+
+from app import db
+from models import Assignment, Course, Grade, Submission, User
+
+
+def test_pending_grading_ignores_grades_without_a_submission(app, database, login):
+    with app.app_context():
+        users = [User(username=name, email=f'{name}@wauu.edu.bj', first_name=name.title(), last_name='Test', role=role)
+                 for name, role in [('drsmith', 'lecturer'), ('ama', 'student'), ('kofi', 'student')]]
+        for user in users:
+            user.set_password('secret')
+        db.session.add_all(users)
+        db.session.flush()
+        lecturer, ama, kofi = users
+        course = Course(code='CS101', title='Programming', description='About it', lecturer_id=lecturer.id)
+        db.session.add(course)
+        db.session.flush()
+        assignment = Assignment(title='Essay', description='Write', course_id=course.id, max_points=100)
+        db.session.add(assignment)
+        db.session.flush()
+        # Ama submitted and waits for a grade; Kofi was graded without submitting
+        db.session.add_all([
+            Submission(assignment_id=assignment.id, student_id=ama.id, content='typed'),
+            Grade(assignment_id=assignment.id, student_id=kofi.id, points_earned=50),
+        ])
+        db.session.commit()
+
+    page = login('drsmith', 'secret').get('/assignments').get_data(as_text=True)
+    pending = re.search(r'<h4 class="text-info">\s*(-?\d+)\s*</h4>\s*<p class="text-muted">Pending Grading', page)
+    assert pending.group(1) == '1'
@@ -0,0 +1,72 @@
+"""Denormalized counters follow inserts and deletes of their child rows."""
+import pytest
+
+from app import db
+from models import Assignment, Course, Discussion, Enrollment, Grade, Post, Submission, User, recount
+
+
+@pytest.fixture
+def course(app, database):
+    with app.app_context():
+        lecturer = User(username='drsmith', email='drsmith@wauu.edu.bj', first_name='Dr', last_name='Smith',
+                        role='lecturer')
+        students = [User(username=f'student{n}', email=f'student{n}@wauu.edu.bj', first_name='Student',
+                         last_name=str(n), role='student') for n in range(3)]
+        db.session.add_all([lecturer, *students])
+        db.session.flush()
+        course = Course(code='CS101', title='Programming', description='About it', lecturer_id=lecturer.id)
+        db.session.add(course)
+        db.session.flush()
+        assignment = Assignment(title='Essay', description='Write', course_id=course.id, max_points=100)
+        discussion = Discussion(title='Hello', description='Say hi', course_id=course.id)
+        db.session.add_all([assignment, discussion])
+        db.session.commit()
+        return {'course': course.id, 'assignment': assignment.id, 'discussion': discussion.id,
+                'students': [student.id for student in students]}
+
+
+def _counts(ids):
+    course = db.session.get(Course, ids['course'])
+    assignment = db.session.get(Assignment, ids['assignment'])
+    discussion = db.session.get(Discussion, ids['discussion'])
+    db.session.refresh(course)
+    db.session.refresh(assignment)
+    db.session.refresh(discussion)
+    return {'enrollments': course.enrollment_count, 'submissions': assignment.submission_count,
+            'graded': assignment.graded_count, 'posts': discussion.post_count}
+
+
+def test_counters_follow_inserts_and_deletes(app, course):
+    with app.app_context():
+        rows = []
+        for student_id in course['students']:
+            rows += [
+                Enrollment(user_id=student_id, course_id=course['course']),
+                Submission(assignment_id=course['assignment'], student_id=student_id, content='typed'),
+                Grade(assignment_id=course['assignment'], student_id=student_id, points_earned=80),
+                Post(discussion_id=course['discussion'], author_id=student_id, content='Hi'),
+            ]
+        db.session.add_all(rows)
+        db.session.commit()
+        assert _counts(course) == {'enrollments': 3, 'submissions': 3, 'graded': 3, 'posts': 3}
+
+        db.session.delete(Submission.query.first())
+        db.session.delete(Grade.query.first())
+        db.session.delete(Post.query.first())
+        db.session.commit()
+        assert _counts(course) == {'enrollments': 3, 'submissions': 2, 'graded': 2, 'posts': 2}
+
+
+def test_counters_agree_with_a_recount(app, course):
+    with app.app_context():
+        for student_id in course['students'][:2]:
+            db.session.add(Submission(assignment_id=course['assignment'], student_id=student_id, content='typed'))
+            db.session.commit()
+        db.session.delete(Submission.query.first())
+        db.session.commit()
+        counted = _counts(course)
+
+        recount(Assignment.submission_count)
+        db.session.commit()
+        assert _counts(course) == counted
+        assert counted['submissions'] == 1
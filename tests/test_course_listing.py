@@ -0,0 +1,68 @@
+"""Course pages must cost the same number of statements however many courses exist."""
+import pytest
+
+from app import db
+from models import Assignment, Course, Discussion, Enrollment, User
+from profiler import profile_queries
+
+PAGES = [
+    ('admin', '/courses'),
+    ('admin', '/admin/courses'),
+    ('admin', '/course/1'),
+    ('drsmith', '/courses'),
+    ('drsmith', '/course/1'),
+    ('student001', '/courses'),
+    ('student001', '/course/1'),
+]
+
+
+def _user(username, role):
+    user = User(username=username, email=f'{username}@wauu.edu.bj', first_name=username.title(),
+                last_name='Test', role=role)
+    user.set_password('secret')
+    db.session.add(user)
+    return user
+
+
+def _add_courses(count, lecturer, students):
+    start = db.session.query(db.func.count(Course.id)).scalar()
+    for number in range(start, start + count):
+        course = Course(code=f'C{number:04d}', title=f'Course {number}', description='About the course',
+                        lecturer_id=lecturer.id)
+        db.session.add(course)
+        db.session.flush()
+        for title in ('Essay', 'Problem Set'):
+            db.session.add(Assignment(title=title, description='Do it', course_id=course.id, max_points=100))
+        db.session.add(Discussion(title='Introductions', description='Say hello', course_id=course.id))
+        for student in students[:number % len(students) + 1]:
+            db.session.add(Enrollment(user_id=student.id, course_id=course.id))
+    db.session.commit()
+
+
+def _statement_counts(clients):
+    counts = {}
+    for username, url in PAGES:
+        with profile_queries() as profile:
+            response = clients[username].get(url)
+        assert response.status_code == 200, (username, url)
+        counts[username, url] = profile.count
+    return counts
+
+
+@pytest.mark.parametrize('courses', [3, 12])
+def test_course_pages_cost_the_same_for_ten_times_the_courses(app, database, login, courses):
+    with app.app_context():
+        _user('admin', 'admin')
+        lecturer = _user('drsmith', 'lecturer')
+        students = [_user(f'student{number:03d}', 'student') for number in range(1, 6)]
+        db.session.flush()
+        _add_courses(courses, lecturer, students)
+    clients = {username: login(username, 'secret') for username in {username for username, _ in PAGES}}
+    _statement_counts(clients)  # warm the identity cache
+
+    small = _statement_counts(clients)
+    with app.app_context():
+        lecturer = User.query.filter_by(username='drsmith').one()
+        students = User.query.filter_by(role='student').order_by(User.id).all()
+        _add_courses(courses * 9, lecturer, students)
+    assert _statement_counts(clients) == small
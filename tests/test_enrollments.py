@@ -0,0 +1,41 @@
+"""Bulk enrollment import skips duplicates and reports what it cannot resolve."""
+import io
+
+from app import db
+from enrollments import enrollment_rows, import_enrollments
+from models import Course, Enrollment, User
+
+
+def test_import_counts_enrolled_existing_and_unknown(app, database):
+    with app.app_context():
+        lecturer = User(username='drsmith', email='drsmith@wauu.edu.bj', first_name='Dr', last_name='Smith',
+                        role='lecturer')
+        students = [User(username=name, email=f'{name}@wauu.edu.bj', first_name=name.title(), last_name='Test',
+                         role='student') for name in ('ama', 'kofi')]
+        db.session.add_all([lecturer, *students])
+        db.session.flush()
+        course = Course(code='CS101', title='Programming', description='About it', lecturer_id=lecturer.id)
+        db.session.add(course)
+        db.session.flush()
+        db.session.add(Enrollment(user_id=students[1].id, course_id=course.id))
+        db.session.commit()
+
+        csv_text = ('username,course_code\n'
+                    'ama,CS101\n'
+                    'ama,CS101\n'       # repeated
+                    'kofi,CS101\n'      # already enrolled
+                    'nobody,CS101\n'
+                    'ama,NOPE\n'
+                    'drsmith,CS101\n')
+        rows = enrollment_rows(io.BytesIO(csv_text.encode()), 'enrollments.csv')
+        result = import_enrollments(rows, batch_size=1)
+
+        assert result['enrolled'] == 1
+        assert result['existing'] == 2
+        assert result['errors'] == [
+            (5, "No user 'nobody'"),
+            (6, "No course 'NOPE'"),
+            (7, 'drsmith is not a student'),
+        ]
+        assert Enrollment.query.count() == 2
+        assert db.session.get(Course, course.id).enrollment_count == 2
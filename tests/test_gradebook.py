@@ -0,0 +1,29 @@
+"""Gradebook exports cannot smuggle spreadsheet formulas."""
+from app import db
+from gradebook import gradebook_rows
+from models import Assignment, Course, Enrollment, User
+
+
+def test_formula_titles_are_escaped_in_the_header(app, database):
+    with app.app_context():
+        lecturer = User(username='drsmith', email='drsmith@wauu.edu.bj', first_name='Dr', last_name='Smith',
+                        role='lecturer')
+        student = User(username='student001', email='student001@wauu.edu.bj', first_name='=cmd', last_name='Koffi',
+                       role='student')
+        for user in (lecturer, student):
+            user.set_password('secret')
+        db.session.add_all([lecturer, student])
+        db.session.flush()
+        course = Course(code='CS101', title='Programming', description='About it', lecturer_id=lecturer.id)
+        db.session.add(course)
+        db.session.flush()
+        db.session.add_all([
+            Assignment(title='=HYPERLINK("http://evil")', description='Write', course_id=course.id, max_points=100),
+            Enrollment(user_id=student.id, course_id=course.id),
+        ])
+        db.session.commit()
+
+        header, row = gradebook_rows(course.id)
+
+    assert header[4:6] == ['\'=HYPERLINK("http://evil") (100)', '\'=HYPERLINK("http://evil") late']
+    assert row[2] == "'=cmd"
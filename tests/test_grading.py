@@ -0,0 +1,52 @@
+"""Batch grading upserts: regrading replaces the grade instead of adding one."""
+import pytest
+
+from app import db
+from models import Assignment, Course, Enrollment, Grade, Submission, User
+
+
+@pytest.fixture
+def submitted(app, database):
+    """A course whose one student has submitted its one assignment."""
+    with app.app_context():
+        users = [User(username=name, email=f'{name}@wauu.edu.bj', first_name=name.title(), last_name='Test', role=role)
+                 for name, role in [('drsmith', 'lecturer'), ('drjones', 'lecturer'), ('ama', 'student')]]
+        for user in users:
+            user.set_password('secret')
+        db.session.add_all(users)
+        db.session.flush()
+        lecturer, _, student = users
+        course = Course(code='CS101', title='Programming', description='About it', lecturer_id=lecturer.id)
+        db.session.add(course)
+        db.session.flush()
+        assignment = Assignment(title='Essay', description='Write', course_id=course.id, max_points=100)
+        db.session.add_all([assignment, Enrollment(user_id=student.id, course_id=course.id)])
+        db.session.flush()
+        db.session.add(Submission(assignment_id=assignment.id, student_id=student.id, content='typed'))
+        db.session.commit()
+        return assignment.id
+
+
+def test_regrading_keeps_one_grade_and_the_counts(app, submitted, login):
+    client = login('drsmith', 'secret')
+    for points, feedback in [(60, 'Good start'), (85, None)]:
+        response = client.post(f'/assignment/{submitted}/grades', json={
+            'grades': [{'username': 'ama', 'points_earned': points, 'feedback': feedback}],
+        })
+        assert response.get_json() == {'saved': 1, 'skipped': 0, 'errors': []}
+
+    with app.app_context():
+        grade = Grade.query.one()
+        assert (grade.points_earned, grade.feedback) == (85, 'Good start')
+        assignment = db.session.get(Assignment, submitted)
+        assert (assignment.submission_count, assignment.graded_count) == (1, 1)
+
+
+def test_outsiders_get_json_errors(app, submitted, login):
+    for username in ('drjones', 'ama'):
+        response = login(username, 'secret').post(f'/assignment/{submitted}/grades', json={'grades': []})
+        assert response.status_code == 403
+        assert 'error' in response.get_json()
+    response = login('drsmith', 'secret').post('/assignment/9999/grades', json={'grades': []})
+    assert response.status_code == 404
+    assert 'error' in response.get_json()
@@ -0,0 +1,45 @@
+"""Cached identities follow changes made through other workers."""
+from app import db
+from identity import identity_cache
+from models import User
+
+
+def _admin_with_stale_copy(app, login, change):
+    """Log an admin in, apply ``change`` to their row, then put back the
+    principal cached before it, as another worker would still hold it."""
+    with app.app_context():
+        admin = User(username='admin', email='admin@wauu.edu.bj', first_name='Ad', last_name='Min', role='admin')
+        admin.set_password('secret')
+        db.session.add(admin)
+        db.session.commit()
+        admin_id = admin.id
+    client = login('admin', 'secret')
+    assert client.get('/admin/users').status_code == 200
+    stale = identity_cache.get(admin_id)
+    assert stale is not None
+    with app.app_context():
+        change(db.session.get(User, admin_id))
+        db.session.commit()
+    identity_cache.set(admin_id, stale)
+    return client
+
+
+def test_demoted_admin_loses_access_on_every_worker(app, database, login):
+    client = _admin_with_stale_copy(app, login, lambda user: setattr(user, 'role', 'student'))
+    response = client.get('/admin/users')
+    assert response.status_code == 302
+    assert '/admin' not in response.location
+
+
+def test_deleted_user_is_logged_out_on_every_worker(app, database, login):
+    client = _admin_with_stale_copy(app, login, db.session.delete)
+    response = client.get('/admin/users')
+    assert response.status_code == 302
+    assert '/login' in response.location
+
+
+def test_unrelated_changes_keep_the_cached_identity(app, database, login):
+    client = _admin_with_stale_copy(app, login, lambda user: setattr(user, 'email', 'root@wauu.edu.bj'))
+    with app.app_context():
+        assert db.session.get(User, 1).identity_version == 0
+    assert client.get('/admin/users').status_code == 200
@@ -0,0 +1,66 @@
+import pytest
+
+from app import db
+from models import Course, User
+from profiler import normalize, profile_queries
+
+
+def _user(username, role):
+    user = User(username=username, email=f'{username}@wauu.edu.bj', first_name=username.title(),
+                last_name='Test', role=role)
+    user.set_password('secret')
+    db.session.add(user)
+    return user
+
+
+def test_normalize_ignores_values():
+    assert normalize("SELECT * FROM post WHERE id = 7 AND title = 'x'") \
+        == normalize('SELECT * FROM post WHERE id = 12 AND title = ?')
+    assert normalize('SELECT * FROM post WHERE id IN (?, ?, ?)') == 'SELECT * FROM post WHERE id IN (?)'
+
+
+def test_profile_counts_statements(app, database):
+    with app.app_context():
+        with profile_queries() as profile:
+            db.session.execute(db.text('SELECT 1'))
+            db.session.execute(db.text('SELECT 2'))
+    assert profile.count == 2
+    assert profile.repeated(1) == [('SELECT ?', 2)]
+
+
+def test_query_budget_passes_within_budget(app, database, query_budget):
+    with app.app_context():
+        with query_budget(2) as profile:
+            db.session.execute(db.text('SELECT 1'))
+    assert profile.count == 1
+
+
+def test_query_budget_fails_when_exceeded(app, database, query_budget):
+    with app.app_context():
+        with pytest.raises(pytest.fail.Exception, match='Query budget of 1 exceeded'):
+            with query_budget(1):
+                db.session.execute(db.text('SELECT 1'))
+                db.session.execute(db.text('SELECT 2'))
+
+
+def test_query_budget_fails_on_repeated_statements(app, database, query_budget):
+    with app.app_context():
+        with pytest.raises(pytest.fail.Exception, match='Possible N\\+1'):
+            with query_budget(100, repeat_threshold=3):
+                for number in range(5):
+                    db.session.execute(db.text('SELECT :number'), {'number': number})
+
+
+def test_courses_page_within_budget(app, database, login, query_budget):
+    with app.app_context():
+        lecturer = _user('lecturer', 'lecturer')
+        _user('student', 'student')
+        db.session.flush()
+        for number in range(20):
+            db.session.add(Course(code=f'C{number}', title=f'Course {number}', description='About it',
+                                  lecturer_id=lecturer.id))
+        db.session.commit()
+
+    client = login('student', 'secret')
+    with query_budget(5, repeat_threshold=1):
+        assert client.get('/courses').status_code == 200
@@ -0,0 +1,42 @@
+"""Bulk user import: hashed passwords, the row cap, and the error report."""
+import io
+
+import pytest
+
+from app import db
+from models import User
+from provisioning import import_users
+
+HEADER = 'username,email,first_name,last_name,password\n'
+
+
+def test_imported_users_can_log_in(app, database, login):
+    with app.app_context():
+        result = import_users(io.StringIO(HEADER + 'ama,ama@wauu.edu.bj,Ama,Koffi,secret\n'))
+        assert result == {'created': 1, 'errors': []}
+        assert User.query.one().password_hash != 'secret'
+    login('ama', 'secret')
+
+
+def test_rows_the_database_skips_are_reported(app, database):
+    csv_text = HEADER + 'ama,ama@wauu.edu.bj,Ama,Koffi,secret\nkofi,kofi@wauu.edu.bj,Kofi,Mensah,secret\n'
+
+    def create_kofi_meanwhile(message):
+        if not User.query.filter_by(username='kofi').count():
+            db.session.add(User(username='kofi', email='kofi@elsewhere.bj', first_name='Kofi', last_name='Mensah'))
+            db.session.commit()
+
+    with app.app_context():
+        result = import_users(io.StringIO(csv_text), chunk_size=1, progress=create_kofi_meanwhile)
+
+    assert result['created'] == 1
+    assert [(line, row['username'], message) for line, row, message in result['errors']] == \
+        [(3, 'kofi', 'Already exists')]
+
+
+def test_files_over_the_row_cap_are_refused_whole(app, database):
+    csv_text = HEADER + ''.join(f'user{n},user{n}@wauu.edu.bj,User,{n},secret\n' for n in range(3))
+    with app.app_context():
+        with pytest.raises(ValueError, match='flask import-users'):
+            import_users(io.StringIO(csv_text), max_rows=2)
+        assert User.query.count() == 0
@@ -0,0 +1,90 @@
+"""The main query of each indexed route must be answered from an index.
+
+Each query is EXPLAINed against the real schema; a full scan of one of the
+large tables fails the test. On SQLite that is a ``SCAN`` line of EXPLAIN
+QUERY PLAN. On PostgreSQL (``TEST_DATABASE_URL``) sequential scans are
+priced out first, so a ``Seq Scan`` in the plan means no index applies.
+"""
+import pytest
+
+from app import db
+from gradebook import matrix_query
+from models import (Assignment, Blob, ChunkedUpload, Course, Discussion, Enrollment, Grade,
+                    LectureRoom, LectureSessionLog, Post, Submission)
+from queries import grading_queue_query
+
+# Tables that grow with the number of students
+LARGE_TABLES = {
+    'enrollment', 'assignment', 'submission', 'grade', 'discussion', 'post',
+    'lecture_room', 'lecture_session_log', 'blob', 'chunked_upload',
+}
+
+
+ROUTE_QUERIES = {
+    'access: enrolled course IDs': lambda: db.select(Enrollment.course_id).where(Enrollment.user_id == 1),
+    'access: taught course IDs': lambda: db.select(Course.id).where(Course.lecturer_id == 1),
+    'course_detail: assignments': lambda: db.select(Assignment)
+        .where(Assignment.course_id == 1).order_by(Assignment.created_at.desc()),
+    'course_detail: discussions': lambda: db.select(Discussion)
+        .where(Discussion.course_id == 1).order_by(Discussion.created_at.desc()),
+    'assignments: student assignments': lambda: db.select(Assignment)
+        .where(Assignment.course_id.in_([1, 2, 3])),
+    'assignment_detail: own submission': lambda: db.select(Submission)
+        .where(Submission.assignment_id == 1, Submission.student_id == 1),
+    'assignment_detail: own grade': lambda: db.select(Grade)
+        .where(Grade.assignment_id == 1, Grade.student_id == 1),
+    'assignment_detail: all submissions': lambda: db.select(Submission)
+        .where(Submission.assignment_id == 1).order_by(Submission.submitted_at, Submission.id),
+    'gradebook: roster': lambda: db.select(Enrollment.user_id).where(Enrollment.course_id == 1),
+    'gradebook: matrix': lambda: matrix_query(1).statement,
+    'grades: student grades': lambda: db.select(Grade)
+        .where(Grade.student_id == 1).order_by(Grade.graded_at.desc()),
+    'grading_queue: one assignment': lambda: grading_queue_query(1, 1).statement,
+    'discussion_detail: thread': lambda: db.select(Post)
+        .where(Post.discussion_id == 1).order_by(Post.path).limit(201),
+    'video_conferences: course rooms': lambda: db.select(LectureRoom)
+        .where(LectureRoom.course_id == 1).order_by(LectureRoom.created_at.desc()),
+    'video_conferences: lecturer rooms': lambda: db.select(LectureRoom)
+        .where(LectureRoom.lecturer_id == 1).order_by(LectureRoom.created_at.desc()),
+    'lecture_room_detail: session logs': lambda: db.select(LectureSessionLog)
+        .where(LectureSessionLog.lecture_room_id == 1).order_by(LectureSessionLog.joined_at.desc()),
+    'join_lecture: open session': lambda: db.select(LectureSessionLog)
+        .where(LectureSessionLog.lecture_room_id == 1, LectureSessionLog.participant_id == 1,
+               LectureSessionLog.left_at.is_(None)),
+    'end_lecture: open sessions': lambda: db.select(LectureSessionLog)
+        .where(LectureSessionLog.lecture_room_id == 1, LectureSessionLog.left_at.is_(None)),
+    'uploads: resumable upload': lambda: db.select(ChunkedUpload)
+        .where(ChunkedUpload.user_id == 1, ChunkedUpload.assignment_id == 1),
+    'collect-blobs: unreferenced blobs': lambda: db.select(Blob.sha256).where(Blob.ref_count <= 0),
+}
+
+
+def _plan(statement):
+    connection = db.session.connection()
+    compiled = statement.compile(dialect=connection.dialect, compile_kwargs={'render_postcompile': True})
+    if compiled.positional:
+        parameters = tuple(compiled.params[name] for name in compiled.positiontup)
+    else:
+        parameters = compiled.params
+    if connection.dialect.name == 'postgresql':
+        connection.exec_driver_sql('SET LOCAL enable_seqscan = off')
+        return [row[0] for row in connection.exec_driver_sql(f'EXPLAIN {compiled}', parameters)]
+    return [row[-1] for row in connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {compiled}', parameters)]
+
+
+def _full_scans(plan):
+    scans = []
+    for line in plan:
+        words = line.replace('Seq Scan on', 'SCAN').split()
+        for position, word in enumerate(words[:-1]):
+            if word == 'SCAN' and words[position + 1] in LARGE_TABLES:
+                scans.append(line.strip())
+    return scans
+
+
+@pytest.mark.parametrize('name', ROUTE_QUERIES)
+def test_route_query_uses_an_index(app, database, name):
+    with app.app_context():
+        plan = _plan(ROUTE_QUERIES[name]())
+        db.session.rollback()
+    assert not _full_scans(plan), f'{name} scans a whole table:\n' + '\n'.join(plan)
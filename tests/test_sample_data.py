@@ -0,0 +1,18 @@
+"""The bulk-loaded demo data is complete and usable."""
+from app import db
+from init_data import init_sample_data
+from models import Course, Discussion, Enrollment, Post, User
+
+
+def test_sample_data_loads_with_counters_and_logins(app, database, login):
+    with app.app_context():
+        init_sample_data()
+        assert User.query.count() == 15
+        assert sum(course.enrollment_count for course in Course.query) == Enrollment.query.count() == 30
+        assert sum(discussion.post_count for discussion in Discussion.query) == Post.query.count() == 15
+        assert db.session.query(Post.id).filter(Post.path.is_(None)).count() == 0
+        # A second run finds the users and adds nothing
+        init_sample_data()
+        assert User.query.count() == 15
+    for username, password in [('admin', 'admin123'), ('drsmith', 'password123'), ('student001', 'student123')]:
+        assert login(username, password).get('/dashboard').status_code == 200
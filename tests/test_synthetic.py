@@ -0,0 +1,11 @@
+"""Synthetic accounts can log in, so logged-in pages can be benchmarked."""
+from models import User
+from synthetic import generate
+
+
+def test_synthetic_users_log_in_with_the_documented_password(app, database, login):
+    with app.app_context():
+        generate(scale=0.0002)
+        username = User.query.filter_by(role='student').first().username
+    response = login(username, 'password123').get('/dashboard')
+    assert response.status_code == 200
@@ -0,0 +1,46 @@
+"""Chunked uploads survive losing the in-memory running hash."""
+import hashlib
+
+from app import db
+from models import Assignment, Course, Enrollment, Submission, User
+import uploads
+
+
+def _setup(app):
+    with app.app_context():
+        lecturer = User(username='drsmith', email='drsmith@wauu.edu.bj', first_name='Dr', last_name='Smith',
+                        role='lecturer')
+        student = User(username='student001', email='student001@wauu.edu.bj', first_name='Ama', last_name='Koffi',
+                       role='student')
+        for user in (lecturer, student):
+            user.set_password('secret')
+        db.session.add_all([lecturer, student])
+        db.session.flush()
+        course = Course(code='CS101', title='Programming', description='About it', lecturer_id=lecturer.id)
+        db.session.add(course)
+        db.session.flush()
+        assignment = Assignment(title='Essay', description='Write', course_id=course.id, max_points=100)
+        db.session.add_all([assignment, Enrollment(user_id=student.id, course_id=course.id)])
+        db.session.commit()
+        return assignment.id
+
+
+def test_upload_completes_after_its_hash_is_evicted(app, database, login, monkeypatch):
+    assignment_id = _setup(app)
+    monkeypatch.setitem(app.config, 'UPLOAD_CHUNK_SIZE', 4)
+    data = b'0123456789'
+    client = login('student001', 'secret')
+
+    started = client.post(f'/assignment/{assignment_id}/uploads', json={'filename': 'notes.txt', 'size': len(data)})
+    upload_id = started.get_json()['upload_id']
+    for index in range(3):
+        chunk = data[index * 4:index * 4 + 4]
+        response = client.put(f'/submission_uploads/{upload_id}/chunks/{index}', data=chunk)
+        assert response.status_code == 200
+        uploads._hashers.clear()  # as if the next chunk reached another worker
+
+    response = client.post(f'/submission_uploads/{upload_id}/complete',
+                           json={'checksum': hashlib.sha256(data).hexdigest()})
+    assert response.status_code == 200
+    with app.app_context():
+        assert Submission.query.one().file_sha256 == hashlib.sha256(data).hexdigest()
@@ -0,0 +1,217 @@
+"""Resumable, chunked uploads for assignment submissions.
+
+A client starts an upload with the file's name and size, then PUTs fixed-size
+chunks in order. Each chunk streams from the request straight into a part
+file under UPLOAD_FOLDER/.partial while the file's SHA-256 is updated, so a
+worker never holds more than one read buffer of it. After a dropped
+connection the client asks how much arrived and carries on from there.
+Completing the upload adds the file to the content-addressed store and
+creates the Submission in one transaction.
+"""
+import hashlib
+import hmac
+import logging
+import os
+import secrets
+from datetime import datetime, timedelta
+
+from werkzeug.utils import secure_filename
+
+from access import is_course_member
+from app import app, db
+from cache import LRUCache
+from models import ChunkedUpload, Submission
+from storage import blob_path, remove_quietly, store_file
+
+logger = logging.getLogger(__name__)
+
+# Bytes read from the request per write
+READ_SIZE = 64 * 1024
+
+
+class UploadError(ValueError):
+    """An upload request that cannot be honoured, with the HTTP status to answer."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def _partial_dir():
+    return os.path.join(app.config['UPLOAD_FOLDER'], '.partial')
+
+
+def part_path(upload):
+    return os.path.join(_partial_dir(), f'{upload.id}.part')
+
+
+# Running SHA-256 per upload, as (bytes hashed, hash object). hashlib state
+# cannot be stored, so when a chunk lands on another worker, after a restart,
+# or once an idle upload's entry has been evicted, the hash is rebuilt from
+# the part file instead. Bounded, so abandoned uploads do not pile up.
+_hashers = LRUCache(maxsize=256, ttl=3600)
+
+
+def _hasher(upload):
+    cached = _hashers.get(upload.id)
+    if cached is not None and cached[0] == upload.received:
+        return cached[1].copy()
+    hasher = hashlib.sha256()
+    remaining = upload.received
+    with open(part_path(upload), 'rb') as part:
+        while remaining:
+            block = part.read(min(READ_SIZE, remaining))
+            if not block:
+                raise UploadError('Upload data is missing; please start again.', 410)
+            hasher.update(block)
+            remaining -= len(block)
+    return hasher
+
+
+def _forget(upload_id):
+    _hashers.delete(upload_id)
+
+
+def status(upload):
+    return {
+        'upload_id': upload.id,
+        'filename': upload.filename,
+        'size': upload.size,
+        'chunk_size': upload.chunk_size,
+        'received': upload.received,
+        'next_chunk': upload.received // upload.chunk_size,
+        'chunk_count': upload.chunk_count(),
+    }
+
+
+def start_upload(user, assignment, filename, size):
+    """Begin an upload of ``filename`` for ``assignment``, or resume the one
+    ``user`` (the current user) already started for the same file. The caller
+    checks the file type."""
+    if not user.is_student():
+        raise UploadError('Only students can submit assignments.', 403)
+    if not is_course_member(assignment.course_id):
+        raise UploadError('You are not enrolled in this course.', 403)
+    if Submission.query.filter_by(assignment_id=assignment.id, student_id=user.id).first():
+        raise UploadError('You have already submitted this assignment.', 409)
+    if size <= 0:
+        raise UploadError('The file is empty.')
+    if size > app.config['MAX_UPLOAD_SIZE']:
+        raise UploadError(f"Files can be at most {app.config['MAX_UPLOAD_SIZE'] // (1024 * 1024)}MB.", 413)
+
+    upload = ChunkedUpload.query.filter_by(user_id=user.id, assignment_id=assignment.id,
+                                           filename=filename, size=size).first()
+    if upload is not None and os.path.exists(part_path(upload)):
+        return upload
+
+    upload = ChunkedUpload(id=secrets.token_hex(16), user_id=user.id, assignment_id=assignment.id,
+                           filename=filename, size=size, chunk_size=app.config['UPLOAD_CHUNK_SIZE'])
+    os.makedirs(_partial_dir(), exist_ok=True)
+    open(part_path(upload), 'wb').close()
+    db.session.add(upload)
+    db.session.commit()
+    return upload
+
+
+def write_chunk(upload, index, stream, length, checksum=None):
+    """Stream chunk ``index`` of ``upload`` from ``stream`` to disk.
+
+    Chunks must arrive in order. Resending one that was already stored
+    changes nothing, so a client that lost the response can simply retry.
+    ``checksum``, if given, is the hex SHA-256 the chunk must have.
+    """
+    received = upload.received
+    expected = received // upload.chunk_size
+    if received == upload.size or index < expected:
+        return upload
+    if index > expected:
+        raise UploadError(f'Expected chunk {expected}.', 409)
+    chunk_length = min(upload.chunk_size, upload.size - received)
+    if length != chunk_length:
+        raise UploadError(f'Chunk {index} must be {chunk_length} bytes.')
+
+    hasher = _hasher(upload)
+    chunk_hasher = hashlib.sha256()
+    written = 0
+    with open(part_path(upload), 'r+b') as part:
+        part.seek(received)
+        while written < chunk_length:
+            block = stream.read(min(READ_SIZE, chunk_length - written))
+            if not block:
+                break
+            part.write(block)
+            hasher.update(block)
+            chunk_hasher.update(block)
+            written += len(block)
+        corrupted = checksum and not hmac.compare_digest(chunk_hasher.hexdigest(), checksum.lower())
+        if written != chunk_length or corrupted:
+            # Drop whatever arrived so the retry starts from a clean boundary
+            part.truncate(received)
+            raise UploadError(f'Chunk {index} arrived incomplete or corrupted; please resend it.')
+        part.truncate()
+
+    # Only one request can advance the upload past ``received``
+    advanced = ChunkedUpload.query.filter_by(id=upload.id, received=received).update(
+        {'received': received + chunk_length, 'updated_at': datetime.utcnow()}
+    )
+    db.session.commit()
+    if not advanced:
+        _forget(upload.id)
+        raise UploadError('Chunk was sent twice at once; check the upload status.', 409)
+    _hashers.set(upload.id, (received + chunk_length, hasher))
+    db.session.refresh(upload)
+    return upload
+
+
+def finish_upload(upload, content='', url='', checksum=None):
+    """Turn a fully received upload into the student's submission and return it.
+
+    ``checksum``, if given, is the hex SHA-256 the whole file must have;
+    on a mismatch the upload is discarded.
+    """
+    upload_id = upload.id
+    if upload.received != upload.size:
+        raise UploadError(f'{upload.size - upload.received} byte(s) still to send.', 409)
+    if Submission.query.filter_by(assignment_id=upload.assignment_id, student_id=upload.user_id).first():
+        cancel_upload(upload)
+        raise UploadError('You have already submitted this assignment.', 409)
+
+    digest = _hasher(upload).hexdigest()
+    if checksum and not hmac.compare_digest(digest, checksum.lower()):
+        cancel_upload(upload)
+        raise UploadError('The uploaded file does not match its checksum; please upload it again.', 422)
+
+    source = part_path(upload)
+    with open(source, 'rb') as part:
+        os.fsync(part.fileno())
+
+    # The part file stays until the submission is committed, so a failed
+    # commit leaves the upload intact for another try
+    blob = store_file(source, digest, upload.size)
+    submission = Submission(assignment_id=upload.assignment_id, student_id=upload.user_id,
+                            content=content, file_path=blob_path(blob.sha256),
+                            file_name=secure_filename(upload.filename), file_sha256=blob.sha256, url=url)
+    db.session.add(submission)
+    db.session.delete(upload)
+    db.session.commit()
+    remove_quietly(source)
+    _forget(upload_id)
+    logger.info('Upload %s stored as blob %s', upload_id, digest)
+    return submission
+
+
+def cancel_upload(upload):
+    """Discard ``upload`` and whatever of it reached the disk."""
+    _forget(upload.id)
+    remove_quietly(part_path(upload))
+    db.session.delete(upload)
+    db.session.commit()
+
+
+def purge_stale_uploads(max_age=None):
+    """Delete uploads untouched for ``max_age`` (default UPLOAD_EXPIRY_HOURS); return how many."""
+    max_age = max_age or timedelta(hours=app.config['UPLOAD_EXPIRY_HOURS'])
+    stale = ChunkedUpload.query.filter(ChunkedUpload.updated_at < datetime.utcnow() - max_age).all()
+    for upload in stale:
+        cancel_upload(upload)
+    return len(stale)